@@ -0,0 +1,158 @@
+"""Density-based clustering of positions (DBSCAN).
+
+DBSCAN groups together positions that are packed closely, and marks
+positions in sparse areas as noise. For a distance `eps` and a count
+`min_points`:
+
+  - A *core* position has at least `min_points` positions (counting
+    itself) within `eps` of it.
+
+  - Core positions within `eps` of each other are in the same cluster.
+
+  - A non-core position within `eps` of some core position is a
+    *border* position, and joins the cluster of the lowest-numbered
+    such core position.
+
+  - Everything else is noise.
+
+Finding the positions within `eps` of each position naively would
+compare every pair. Instead we sort the positions into a grid of cells
+`eps` wide, so that each position is compared only with those in the
+neighbouring cells. Clusters are then joined with a union–find forest
+that is updated with array operations, a batch of positions at a time.
+"""
+
+from typing import Iterable, Iterator, Tuple, Union
+
+import numpy as np
+
+from broad_phase import PointGrid, BATCH_SIZE
+from geometry import Metric, Position, PositionArray, distance, \
+    manhattan_distance, sqr
+
+
+# The label given to noise.
+NOISE = -1
+
+
+def dbscan(positions: Union[PositionArray, Iterable[Position]], eps: float,
+           min_points: int, metric: Metric = distance) -> np.ndarray:
+    """Clusters the given positions, where `metric` is either `distance`
+    or `manhattan_distance`. Returns an array with a label for each
+    position: `NOISE`, or the number of its cluster. Clusters are
+    numbered from 0 in order of their first position.
+
+    >>> ps = [Position(0, 0), Position(0, 1), Position(1, 0),
+    ...       Position(10, 10), Position(10, 11), Position(11, 10),
+    ...       Position(5, 5)]
+    >>> dbscan(ps, 1.5, 3).tolist()
+    [0, 0, 0, 1, 1, 1, -1]
+    >>> dbscan(ps, 1.5, 3, manhattan_distance).tolist()
+    [0, 0, 0, 1, 1, 1, -1]
+    >>> dbscan(ps, 1, 4).tolist()
+    [-1, -1, -1, -1, -1, -1, -1]
+    """
+    if metric not in (distance, manhattan_distance):
+        raise ValueError('metric must be distance or manhattan_distance')
+    if not eps > 0:
+        raise ValueError('eps must be positive')
+    if not isinstance(positions, PositionArray):
+        positions = PositionArray.from_positions(positions)
+    n = len(positions)
+    if n == 0:
+        return np.empty(0, dtype=np.int32)
+    # Work on a copy of the positions sorted by cell, so that neighbours
+    # are close together in memory; `order` maps back to the original
+    # numbering.
+    order = PointGrid(positions, eps).order
+    grid = PointGrid(positions[order], eps)
+
+    # First pass: which positions are core positions?
+    counts = np.zeros(n, dtype=np.int64)
+    for i, _ in _neighbour_pairs(grid, eps, metric):
+        counts += np.bincount(i, minlength=n)
+    core = counts >= min_points
+
+    # Second pass: join neighbouring core positions into clusters, and
+    # find each border position's lowest-numbered core neighbour.
+    parent = np.arange(n)
+    border_of = np.full(n, n)
+    for i, j in _neighbour_pairs(grid, eps, metric):
+        both_core = core[i] & core[j] & (i < j)
+        _union(parent, i[both_core], j[both_core])
+        to_border = ~core[i] & core[j]
+        np.minimum.at(border_of, i[to_border], order[j[to_border]])
+
+    sorted_roots = _find(parent, np.arange(n))
+    is_border = ~core & (border_of < n)
+    # Back to the original numbering.
+    roots = np.empty(n, dtype=np.int64)
+    roots[order] = order[sorted_roots]
+    clustered = np.empty(n, dtype=bool)
+    clustered[order] = core | is_border
+    border = order[is_border]
+    roots[border] = roots[border_of[is_border]]
+
+    # Number the clusters in order of their first position.
+    labels = np.full(n, NOISE, dtype=np.int32)
+    unique_roots, first, inverse = np.unique(roots[clustered],
+                                             return_index=True,
+                                             return_inverse=True)
+    rank = np.empty(len(unique_roots), dtype=np.int32)
+    rank[np.argsort(first, kind='stable')] = np.arange(len(unique_roots))
+    labels[clustered] = rank[inverse.ravel()]
+    return labels
+
+
+def _neighbour_pairs(grid: PointGrid, eps: float, metric: Metric
+                     ) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """Generates, a batch at a time, every pair (i, j) of positions in
+    the grid within `eps` of each other, including each position paired
+    with itself."""
+    ps = grid.positions
+    for start in range(0, len(ps), BATCH_SIZE * 16):
+        batch = ps[start:start + BATCH_SIZE * 16]
+        i, j = grid.box_candidates(batch.x - eps, batch.y - eps,
+                                   batch.x + eps, batch.y + eps)
+        i += start
+        dx = ps.x[i] - ps.x[j]
+        dy = ps.y[i] - ps.y[j]
+        if metric is distance:
+            d = np.sqrt(sqr(dx) + sqr(dy))
+        else:
+            d = np.abs(dx) + np.abs(dy)
+        close = d <= eps
+        yield i[close], j[close]
+
+
+def _find(parent: np.ndarray, x: np.ndarray) -> np.ndarray:
+    """Finds the root of each element of `x` in the union–find forest
+    `parent`."""
+    roots = parent[x]
+    while True:
+        next_roots = parent[roots]
+        if (next_roots == roots).all():
+            return roots
+        roots = next_roots
+
+
+def _union(parent: np.ndarray, a: np.ndarray, b: np.ndarray) -> None:
+    """Joins the trees containing `a[k]` and `b[k]` for every k, in
+    place. Each tree's root is always its smallest element.
+
+    >>> parent = np.arange(5)
+    >>> _union(parent, np.array([4, 1]), np.array([3, 3]))
+    >>> _find(parent, np.arange(5)).tolist()
+    [0, 1, 2, 1, 1]
+    """
+    while True:
+        root_a = _find(parent, a)
+        root_b = _find(parent, b)
+        differ = root_a != root_b
+        if not differ.any():
+            break
+        low = np.minimum(root_a[differ], root_b[differ])
+        high = np.maximum(root_a[differ], root_b[differ])
+        np.minimum.at(parent, high, low)
+        # Flatten the forest so that the finds stay quick.
+        parent[:] = _find(parent, np.arange(len(parent)))
@@ -3,9 +3,27 @@
 circle.
 
 No error handling, so crashes on bad input.
+
+Run with `--batch` to classify a whole stream of candidates without
+prompting, for example when piping in a sensor feed:
+
+    ./collisions.py --batch < candidates.txt > results.txt
+
+In batch mode the input is the circle's center, its radius, and then
+the candidate positions, all as whitespace-separated numbers. The
+output is one line of "Hit!" or "Miss!" per candidate, or with
+`--bitmap` one bit per candidate (1 for a hit), packed eight to a byte
+with the first candidate in the most significant bit.
 """
 
-from geometry import Circle, Position
+import argparse
+import sys
+import time
+from typing import BinaryIO, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from geometry import Circle, Position, PositionArray
 
 
 def input_position(prompt: str) -> Position:
@@ -27,7 +45,7 @@ def input_circle() -> Circle:
     return Circle(center, radius)
 
 
-def main():
+def interactive_main() -> None:
     target = input_circle()
     while True:
         candidate = input_position("Enter a candidate position: ")
@@ -37,6 +55,163 @@ def main():
             print("Miss!")
 
 
+# How many bytes batch mode reads from its input at a time.
+CHUNK_SIZE = 1 << 20
+
+# The text output for a miss and a hit, indexed by the result.
+_TEXT_RESULTS = (b'Miss!\n', b'Hit!\n')
+
+
+def read_number_blocks(source: BinaryIO,
+                       chunk_size: int = CHUNK_SIZE) -> Iterator[np.ndarray]:
+    """Reads whitespace-separated numbers from a binary stream, in
+    blocks of roughly `chunk_size` bytes at a time.
+
+    >>> from io import BytesIO
+    >>> blocks = read_number_blocks(BytesIO(b'1 2.5\\n-3 4 5'), chunk_size=4)
+    >>> [block.tolist() for block in blocks]
+    [[1.0], [2.5], [-3.0, 4.0], [5.0]]
+    """
+    leftover = b''
+    while True:
+        chunk = source.read(chunk_size)
+        if not chunk:
+            break
+        chunk = leftover + chunk
+        # A number might continue into the next chunk, so hold back
+        # everything after the last whitespace.
+        cut = max(chunk.rfind(space) for space in b' \t\r\n')
+        leftover = chunk[cut + 1:]
+        numbers = chunk[:cut + 1].split()
+        if numbers:
+            yield np.array(numbers, dtype=np.float64)
+    if leftover.strip():
+        yield np.array(leftover.split(), dtype=np.float64)
+
+
+def read_candidate_blocks(numbers: Iterator[np.ndarray]
+                          ) -> Iterator[PositionArray]:
+    """Pairs up a stream of numbers into blocks of positions."""
+    odd = np.empty(0)
+    for block in numbers:
+        if len(odd):
+            block = np.concatenate([odd, block])
+        even_len = len(block) - len(block) % 2
+        odd = block[even_len:]
+        if even_len:
+            yield PositionArray(block[0:even_len:2], block[1:even_len:2])
+    if len(odd):
+        raise ValueError('odd number of coordinates in input')
+
+
+def read_batch_input(source: BinaryIO, chunk_size: int = CHUNK_SIZE
+                     ) -> Tuple[Circle, Iterator[PositionArray]]:
+    """Reads the target circle from the start of a binary stream, and
+    returns it along with blocks of the candidate positions that follow.
+
+    >>> from io import BytesIO
+    >>> target, blocks = read_batch_input(BytesIO(b'0 0\\n2\\n1 0\\n3 0\\n'))
+    >>> target
+    Circle(center=Position(x=0.0, y=0.0), radius=2.0)
+    >>> [block.to_positions() for block in blocks]
+    [[Position(x=1.0, y=0.0), Position(x=3.0, y=0.0)]]
+    """
+    numbers = read_number_blocks(source, chunk_size)
+    header: List[float] = []
+    rest = np.empty(0)
+    for block in numbers:
+        needed = 3 - len(header)
+        header.extend(block[:needed].tolist())
+        rest = block[needed:]
+        if len(header) == 3:
+            break
+    if len(header) < 3:
+        raise ValueError('input ended before the target circle')
+    x, y, radius = header
+
+    def all_numbers() -> Iterator[np.ndarray]:
+        yield rest
+        yield from numbers
+
+    return Circle(Position(x, y), radius), read_candidate_blocks(all_numbers())
+
+
+def batch_main(source: BinaryIO, sink: BinaryIO, bitmap: bool = False,
+               chunk_size: int = CHUNK_SIZE) -> Tuple[int, int]:
+    """Classifies every candidate in `source` against the target circle
+    at its start, writing the results to `sink`. Returns the number of
+    hits and of misses.
+
+    >>> from io import BytesIO
+    >>> out = BytesIO()
+    >>> batch_main(BytesIO(b'0 0 2  1 0  3 0  0 1.5'), out)
+    (2, 1)
+    >>> print(out.getvalue().decode(), end='')
+    Hit!
+    Miss!
+    Hit!
+    >>> out = BytesIO()
+    >>> batch_main(BytesIO(b'0 0 2  1 0  3 0  0 1.5'), out, bitmap=True)
+    (2, 1)
+    >>> out.getvalue()
+    b'\\xa0'
+    """
+    target, blocks = read_batch_input(source, chunk_size)
+    hits = misses = 0
+    pending_bits = np.empty(0, dtype=bool)
+    for block in blocks:
+        results = target.contains_many(block)
+        block_hits = int(np.count_nonzero(results))
+        hits += block_hits
+        misses += len(results) - block_hits
+        if bitmap:
+            pending_bits = np.concatenate([pending_bits, results])
+            whole_bytes = len(pending_bits) - len(pending_bits) % 8
+            sink.write(np.packbits(pending_bits[:whole_bytes]).tobytes())
+            pending_bits = pending_bits[whole_bytes:]
+        else:
+            sink.write(b''.join([_TEXT_RESULTS[hit]
+                                 for hit in results.tolist()]))
+    if len(pending_bits):
+        sink.write(np.packbits(pending_bits).tobytes())
+    return hits, misses
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description='Detects which positions are inside a target circle.')
+    parser.add_argument('--batch', action='store_true',
+                        help='read the circle and candidates without '
+                             'prompting, and classify them in bulk')
+    parser.add_argument('--bitmap', action='store_true',
+                        help='in batch mode, write a packed bitmap '
+                             'instead of text')
+    parser.add_argument('--input', metavar='FILE',
+                        help='in batch mode, read from FILE instead of '
+                             'the standard input')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                        help='in batch mode, bytes to read at a time')
+    args = parser.parse_args(argv)
+
+    if not args.batch:
+        interactive_main()
+        return
+
+    start = time.perf_counter()
+    if args.input is None:
+        hits, misses = batch_main(sys.stdin.buffer, sys.stdout.buffer,
+                                  args.bitmap, args.chunk_size)
+    else:
+        with open(args.input, 'rb') as source:
+            hits, misses = batch_main(source, sys.stdout.buffer,
+                                      args.bitmap, args.chunk_size)
+    sys.stdout.flush()
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    print('{} hits ({:.0f}/s), {} misses ({:.0f}/s) in {:.3f}s'
+          .format(hits, hits / elapsed, misses, misses / elapsed, elapsed),
+          file=sys.stderr)
+
+
 # This tells Python to call our main function when someone runs this
 # file directly, but not when they load it, say, for testing.
 if __name__ == '__main__':
@@ -5,7 +5,10 @@ thereupon.
 """
 
 from math import pi, sqrt
-from typing import NamedTuple
+from typing import (Callable, Iterable, Iterator, List, NamedTuple,
+                    Optional, Union)
+
+import numpy as np
 
 
 def sqr(x: float) -> float:
@@ -91,3 +94,406 @@ class Circle(NamedTuple):
         """
         return distance(self.center, p) < self.radius
 
+    def contains_many(self, ps: 'PositionArray') -> np.ndarray:
+        """Determines, for each of many positions, whether this circle
+        contains it. Gives the same answers as `contains`.
+
+        >>> target = Circle(Position(0, 0), 2)
+        >>> ps = PositionArray([1, 3, 0], [0, 0, -1.5])
+        >>> target.contains_many(ps).tolist()
+        [True, False, True]
+        """
+        return _inside(self.center.x, self.center.y, self.radius, ps.x, ps.y)
+
+
+# Struct-of-arrays versions of `Position` and `Circle`. Instead of one
+# object per position, these keep all the x coordinates in one NumPy
+# array and all the y coordinates in another, so that an operation on
+# every position is a handful of array operations rather than a Python
+# function call per position.
+
+
+class PositionArray:
+    """Represents many 2-D positions as parallel arrays of coordinates.
+
+    >>> ps = PositionArray.from_positions([Position(0, 0), Position(3, 4)])
+    >>> len(ps)
+    2
+    >>> ps[1]
+    Position(x=3.0, y=4.0)
+    >>> ps.to_positions()
+    [Position(x=0.0, y=0.0), Position(x=3.0, y=4.0)]
+    """
+
+    def __init__(self, x: Iterable[float], y: Iterable[float]) -> None:
+        self.x = np.asarray(x, dtype=np.float64)
+        self.y = np.asarray(y, dtype=np.float64)
+        if self.x.ndim != 1 or self.x.shape != self.y.shape:
+            raise ValueError('x and y must be 1-D arrays of the same length')
+
+    @classmethod
+    def from_positions(cls, positions: Iterable[Position]) -> 'PositionArray':
+        """Packs a collection of `Position`s into a `PositionArray`.
+
+        >>> len(PositionArray.from_positions([]))
+        0
+        """
+        positions = list(positions)
+        return cls([p.x for p in positions], [p.y for p in positions])
+
+    def to_positions(self) -> List[Position]:
+        """Unpacks this array into a list of `Position`s."""
+        return [Position(x, y)
+                for x, y in zip(self.x.tolist(), self.y.tolist())]
+
+    def __len__(self) -> int:
+        return len(self.x)
+
+    def __iter__(self) -> Iterator[Position]:
+        return iter(self.to_positions())
+
+    def __getitem__(self, index):
+        """Returns the `Position` at an integer index, or a new
+        `PositionArray` for a slice, mask or array of indices.
+
+        >>> ps = PositionArray([0, 1, 2], [5, 6, 7])
+        >>> ps[-1]
+        Position(x=2.0, y=7.0)
+        >>> ps[1:].to_positions()
+        [Position(x=1.0, y=6.0), Position(x=2.0, y=7.0)]
+        """
+        if isinstance(index, (int, np.integer)):
+            return Position(float(self.x[index]), float(self.y[index]))
+        return PositionArray(self.x[index], self.y[index])
+
+    def __repr__(self) -> str:
+        return 'PositionArray({!r}, {!r})'.format(self.x.tolist(),
+                                                 self.y.tolist())
+
+    def distance(self, q: Union[Position, 'PositionArray']) -> np.ndarray:
+        """Computes the Euclidean distance from each of these positions
+        to `q`, which is either one `Position` or a `PositionArray` of
+        the same length.
+
+        >>> PositionArray([0, 3], [0, 4]).distance(Position(0, 0)).tolist()
+        [0.0, 5.0]
+        """
+        return np.sqrt(self.squared_distance(q))
+
+    def squared_distance(self,
+                         q: Union[Position, 'PositionArray']) -> np.ndarray:
+        """Like `distance`, but skips the square root.
+
+        >>> PositionArray([0, 3], [0, 4]).squared_distance(Position(0, 0))
+        array([ 0., 25.])
+        """
+        return sqr(self.x - q.x) + sqr(self.y - q.y)
+
+    def manhattan_distance(self,
+                           q: Union[Position, 'PositionArray']) -> np.ndarray:
+        """Computes the Manhattan distance from each of these positions
+        to `q`, which is either one `Position` or a `PositionArray` of
+        the same length.
+
+        >>> ps = PositionArray([0, 3], [0, 4])
+        >>> ps.manhattan_distance(PositionArray([0, 0], [0, 0])).tolist()
+        [0.0, 7.0]
+        """
+        return np.abs(self.x - q.x) + np.abs(self.y - q.y)
+
+
+class CircleArray:
+    """Represents many circles as an array of centers and an array of
+    radii.
+
+    >>> cs = CircleArray.from_circles([Circle(Position(0, 0), 1),
+    ...                                Circle(Position(5, 5), 2)])
+    >>> len(cs)
+    2
+    >>> cs[1]
+    Circle(center=Position(x=5.0, y=5.0), radius=2.0)
+    """
+
+    def __init__(self, centers: PositionArray,
+                 radii: Iterable[float]) -> None:
+        self.centers = centers
+        self.radii = np.asarray(radii, dtype=np.float64)
+        if self.radii.shape != centers.x.shape:
+            raise ValueError('need exactly one radius per center')
+
+    @classmethod
+    def from_circles(cls, circles: Iterable[Circle]) -> 'CircleArray':
+        """Packs a collection of `Circle`s into a `CircleArray`."""
+        circles = list(circles)
+        return cls(PositionArray.from_positions(c.center for c in circles),
+                   [c.radius for c in circles])
+
+    def to_circles(self) -> List[Circle]:
+        """Unpacks this array into a list of `Circle`s.
+
+        >>> CircleArray(PositionArray([1], [2]), [3]).to_circles()
+        [Circle(center=Position(x=1.0, y=2.0), radius=3.0)]
+        """
+        return [Circle(center, radius)
+                for center, radius in zip(self.centers.to_positions(),
+                                          self.radii.tolist())]
+
+    def __len__(self) -> int:
+        return len(self.radii)
+
+    def __iter__(self) -> Iterator[Circle]:
+        return iter(self.to_circles())
+
+    def __getitem__(self, index):
+        """Returns the `Circle` at an integer index, or a new
+        `CircleArray` for a slice, mask or array of indices."""
+        if isinstance(index, (int, np.integer)):
+            return Circle(self.centers[index], float(self.radii[index]))
+        return CircleArray(self.centers[index], self.radii[index])
+
+    def __repr__(self) -> str:
+        return 'CircleArray({!r}, {!r})'.format(self.centers,
+                                                self.radii.tolist())
+
+    def area(self) -> np.ndarray:
+        """Computes the area of each circle.
+
+        >>> cs = CircleArray(PositionArray([0, 0], [0, 0]), [1, 3])
+        >>> cs.area().tolist() == [pi, 9 * pi]
+        True
+        """
+        return pi * sqr(self.radii)
+
+    def circumference(self) -> np.ndarray:
+        """Computes the circumference of each circle.
+
+        >>> cs = CircleArray(PositionArray([0, 0], [0, 0]), [1, 3])
+        >>> cs.circumference().tolist() == [2 * pi, 6 * pi]
+        True
+        """
+        return 2 * pi * self.radii
+
+    def contains_many(self, ps: Union[Position, PositionArray]) -> np.ndarray:
+        """Determines whether each circle contains a position. Given one
+        `Position`, checks it against every circle; given a
+        `PositionArray` of the same length, checks each circle against
+        the position at the same index.
+
+        >>> cs = CircleArray(PositionArray([0, 10], [0, 0]), [2, 2])
+        >>> cs.contains_many(Position(1, 0)).tolist()
+        [True, False]
+        >>> cs.contains_many(PositionArray([1, 11], [0, 0])).tolist()
+        [True, True]
+        """
+        return _inside(self.centers.x, self.centers.y, self.radii,
+                       ps.x, ps.y)
+
+
+# A metric is a distance function such as `distance` or
+# `manhattan_distance`.
+Metric = Callable[[Position, Position], float]
+
+# Called with the row and column where a tile of distances starts, and
+# the tile itself.
+TileCallback = Callable[[int, int, np.ndarray], None]
+
+# The default number of rows and columns in one tile of
+# `pairwise_distances`. A 256 × 256 tile of float64 is 512 KiB, which
+# fits comfortably in a typical L2 cache.
+TILE_SIZE = 256
+
+
+def pairwise_distances(a: Union[PositionArray, Iterable[Position]],
+                       b: Union[PositionArray, Iterable[Position]],
+                       metric: Metric = distance,
+                       callback: Optional[TileCallback] = None,
+                       out: Optional[str] = None,
+                       dtype=np.float64,
+                       tile_size: int = TILE_SIZE) -> Optional[np.ndarray]:
+    """Computes the distance from every position in `a` to every
+    position in `b`, where `metric` is either `distance` or
+    `manhattan_distance`.
+
+    The distances are computed one square tile at a time, so that
+    memory use does not depend on the sizes of `a` and `b`:
+
+      - If `callback` is given, it is called with the first row, the
+        first column and the tile for each tile, and nothing is
+        returned unless `out` is also given.
+
+      - If `out` is given, the full matrix is written to a memory-mapped
+        `.npy` file at that path, which is returned. Reopen it later
+        with `np.load(out, mmap_mode='r')`.
+
+      - Otherwise the full matrix is returned as an ordinary array.
+
+    The result is stored as `dtype`, so `np.float32` halves the memory
+    or disk space needed.
+
+    >>> a = [Position(0, 0), Position(3, 4)]
+    >>> pairwise_distances(a, a).tolist()
+    [[0.0, 5.0], [5.0, 0.0]]
+    >>> pairwise_distances(a, [Position(1, 1)], manhattan_distance).tolist()
+    [[2.0], [5.0]]
+    >>> def show(row, col, tile):
+    ...     print(row, col, tile.tolist())
+    >>> pairwise_distances(a, a, callback=show, tile_size=1)
+    0 0 [[0.0]]
+    0 1 [[5.0]]
+    1 0 [[5.0]]
+    1 1 [[0.0]]
+    """
+    if metric not in _TILE_KERNELS:
+        raise ValueError('metric must be distance or manhattan_distance')
+    kernel = _TILE_KERNELS[metric]
+    if not isinstance(a, PositionArray):
+        a = PositionArray.from_positions(a)
+    if not isinstance(b, PositionArray):
+        b = PositionArray.from_positions(b)
+
+    shape = (len(a), len(b))
+    result = None
+    if out is not None:
+        result = np.lib.format.open_memmap(out, mode='w+', dtype=dtype,
+                                           shape=shape)
+    elif callback is None:
+        result = np.empty(shape, dtype=dtype)
+
+    for row in range(0, len(a), tile_size):
+        a_x = a.x[row:row + tile_size, np.newaxis]
+        a_y = a.y[row:row + tile_size, np.newaxis]
+        for col in range(0, len(b), tile_size):
+            tile = kernel(a_x - b.x[col:col + tile_size],
+                          a_y - b.y[col:col + tile_size]).astype(dtype)
+            if callback is not None:
+                callback(row, col, tile)
+            if result is not None:
+                result[row:row + tile_size, col:col + tile_size] = tile
+
+    if isinstance(result, np.memmap):
+        result.flush()
+    return result
+
+
+# For each metric, how to compute a tile of distances from a tile of
+# coordinate differences.
+_TILE_KERNELS = {
+    distance: lambda dx, dy: np.sqrt(sqr(dx) + sqr(dy)),
+    manhattan_distance: lambda dx, dy: np.abs(dx) + np.abs(dy),
+}
+
+
+def union_area(circles: Union[CircleArray, Iterable[Circle]]) -> float:
+    """Computes the area covered by at least one of the given circles.
+
+    This uses Green's theorem: the area of a region is an integral
+    around its boundary, and the boundary of a union of circles is made
+    of the arcs of each circle that no other circle covers. For each
+    circle, we find the arcs covered by its neighbours, sort them, and
+    integrate over the gaps between them. That takes O(n² log n) time in
+    the worst case, but only circles whose x ranges overlap are compared,
+    so it is much faster when the circles are spread out.
+
+    >>> union_area([Circle(Position(0, 0), 1)]) - pi
+    0.0
+    >>> round(union_area([Circle(Position(0, 0), 1),
+    ...                   Circle(Position(5, 5), 2)]) / pi, 10)
+    5.0
+    >>> round(union_area([Circle(Position(0, 0), 2),
+    ...                   Circle(Position(0.5, 0), 1)]) / pi, 10)
+    4.0
+    >>> round(union_area([Circle(Position(0, 0), 1),
+    ...                   Circle(Position(1, 0), 1)]), 10)
+    5.0548156086
+    """
+    if not isinstance(circles, CircleArray):
+        circles = CircleArray.from_circles(circles)
+    circles = circles[circles.radii > 0]
+    if len(circles) == 0:
+        return 0.0
+
+    # Sort by x, so each circle's possible neighbours are a contiguous
+    # window, and move the origin to the middle of the circles to keep
+    # the terms of the integral small.
+    order = np.argsort(circles.centers.x, kind='stable')
+    x = circles.centers.x[order]
+    y = circles.centers.y[order]
+    x = x - x.mean()
+    y = y - y.mean()
+    r = circles.radii[order]
+    max_r = r.max()
+    window_lo = np.searchsorted(x, x - r - max_r, side='left')
+    window_hi = np.searchsorted(x, x + r + max_r, side='right')
+
+    total = 0.0
+    for i in range(len(r)):
+        xi, yi, ri = x[i], y[i], r[i]
+        j = np.arange(window_lo[i], window_hi[i])
+        j = j[j != i]
+        dx = x[j] - xi
+        dy = y[j] - yi
+        d = np.sqrt(sqr(dx) + sqr(dy))
+        rj = r[j]
+
+        # Skip circles inside another circle; of identical circles, only
+        # the first counts.
+        covered = (d + ri <= rj) & ~((d == 0) & (rj == ri) & (j > i))
+        if covered.any():
+            continue
+
+        # The neighbours that cross this circle's boundary each cover
+        # one arc of it, centered on the direction to the neighbour.
+        crossing = (d < ri + rj) & (d + rj > ri)
+        if not crossing.any():
+            total += pi * sqr(ri)
+            continue
+        dx, dy, d, rj = dx[crossing], dy[crossing], d[crossing], rj[crossing]
+        direction = np.arctan2(dy, dx)
+        half_width = np.arccos(np.clip((sqr(ri) + sqr(d) - sqr(rj))
+                                       / (2 * ri * d), -1, 1))
+        starts = np.mod(direction - half_width, 2 * pi)
+        ends = starts + 2 * half_width
+        # Split arcs that wrap past angle 2π.
+        wraps = ends > 2 * pi
+        starts = np.concatenate([starts, np.zeros(np.count_nonzero(wraps))])
+        ends = np.concatenate([np.minimum(ends, 2 * pi),
+                               ends[wraps] - 2 * pi])
+
+        by_start = np.argsort(starts)
+        starts = starts[by_start]
+        covered_to = np.maximum.accumulate(ends[by_start])
+        gap_starts = np.concatenate([[0.0], covered_to])
+        gap_ends = np.concatenate([starts, [2 * pi]])
+        open_gaps = gap_ends > gap_starts
+        a = gap_starts[open_gaps]
+        b = gap_ends[open_gaps]
+        total += 0.5 * np.sum(sqr(ri) * (b - a)
+                              + xi * ri * (np.sin(b) - np.sin(a))
+                              - yi * ri * (np.cos(b) - np.cos(a)))
+    return float(total)
+
+
+# Squared distances near the squared radius can round to the other side
+# of it, so `_inside` re-checks those few with a square root to agree
+# exactly with `Circle.contains`.
+_CLOSE = 4 * np.finfo(np.float64).eps
+_TINY = np.finfo(np.float64).tiny
+
+
+def _inside(center_x, center_y, radius, x, y) -> np.ndarray:
+    """Determines whether the positions (`x`, `y`) are strictly inside
+    the circles (`center_x`, `center_y`, `radius`), broadcasting the
+    arguments against each other.
+
+    >>> _inside(0, 0, 5, np.array([3, 2.9]), np.array([4, 3.9])).tolist()
+    [False, True]
+    """
+    center_x, center_y, radius, x, y = np.broadcast_arrays(
+        center_x, center_y, radius, x, y)
+    d2 = np.asarray(sqr(x - center_x) + sqr(y - center_y))
+    r2 = sqr(radius)
+    result = np.asarray(d2 < r2)
+    close = np.asarray(np.abs(d2 - r2) <= r2 * _CLOSE + _TINY)
+    if close.any():
+        result[close] = np.sqrt(d2[close]) < radius[close]
+    return result & (radius > 0)
@@ -0,0 +1,443 @@
+#!/usr/bin/env python3
+"""A network service that checks positions against a set of target
+circles.
+
+The targets are loaded once, when the server starts. Clients connect
+over TCP or a Unix socket and send one query per line:
+
+  - `contains X Y` is answered with `hit` followed by the indices of
+    the target circles that contain (X, Y), or with `miss`.
+
+  - `distance X Y` is answered with the index of the target circle whose
+    center is nearest (X, Y), and the distance to that center.
+
+  - `stats` is answered with the server's latency counters.
+
+Anything else, including a line that isn't UTF-8 or is too long, is
+answered with a line starting `error`. Answers come back in the same
+order as the queries on each connection.
+
+Answering each query on its own would spend most of the time on
+per-query overhead, so the server gathers queries from all connections
+into batches and answers each batch with array operations. A batch is
+closed when it reaches `max_batch` queries, or `max_wait_us`
+microseconds after its first query arrived, whichever comes first.
+
+Run with `serve` to start a server for a point file of circles (see
+`point_file.py`), or with `load` to generate load against one.
+"""
+
+import argparse
+import asyncio
+import collections
+import random
+import time
+from typing import Deque, List, NamedTuple, Optional, Set, Tuple
+
+import numpy as np
+
+from broad_phase import PointGrid
+from geometry import CircleArray, PositionArray, pairwise_distances
+from point_file import read_circles
+
+
+# The default batching limits.
+MAX_BATCH = 1024
+MAX_WAIT_US = 200
+
+# How many recent latencies to keep for computing percentiles.
+LATENCY_WINDOW = 100000
+
+
+class _Query(NamedTuple):
+    """A query waiting to be answered in a batch."""
+    kind:    str
+    x:       float
+    y:       float
+    arrived: float
+    answer:  asyncio.Future
+
+
+class HitServer:
+    """Answers batches of queries about a fixed set of target circles."""
+
+    def __init__(self, targets: CircleArray, max_batch: int = MAX_BATCH,
+                 max_wait_us: float = MAX_WAIT_US) -> None:
+        if len(targets) == 0:
+            raise ValueError('need at least one target circle')
+        self.targets = targets
+        self.max_batch = max_batch
+        self.max_wait = max_wait_us / 1e6
+        self._max_radius = float(targets.radii.max())
+        self._grid = PointGrid(targets.centers,
+                               max(2 * self._max_radius, 1e-9))
+        self._pending: Optional[asyncio.Queue] = None
+        self._batcher_task: Optional[asyncio.Future] = None
+        self._listener: Optional[asyncio.AbstractServer] = None
+        self._connections: Set[asyncio.Future] = set()
+        self._latencies: Deque[float] = collections.deque(
+            maxlen=LATENCY_WINDOW)
+        self.n_queries = 0
+        self.n_batches = 0
+
+    async def serve(self, host: str = '127.0.0.1', port: int = 0,
+                    path: Optional[str] = None) -> asyncio.AbstractServer:
+        """Starts listening on a TCP port, or on a Unix socket if `path`
+        is given, and starts the batcher. Returns the asyncio server."""
+        self._pending = asyncio.Queue()
+        self._batcher_task = asyncio.ensure_future(self._batcher())
+        if path is not None:
+            self._listener = await asyncio.start_unix_server(self._handle,
+                                                             path)
+        else:
+            self._listener = await asyncio.start_server(self._handle, host,
+                                                        port)
+        return self._listener
+
+    async def close(self) -> None:
+        """Stops listening, closes the connections, and stops the
+        batcher. Queries that haven't been answered yet are answered
+        with an error."""
+        if self._listener is not None:
+            self._listener.close()
+        # Each connection answers the queries it has already read before
+        # it closes, so the batcher has to outlive them.
+        connections = list(self._connections)
+        for connection in connections:
+            connection.cancel()
+        await asyncio.gather(*connections, return_exceptions=True)
+        if self._listener is not None:
+            await self._listener.wait_closed()
+        if self._batcher_task is not None:
+            self._batcher_task.cancel()
+            try:
+                await self._batcher_task
+            except asyncio.CancelledError:
+                pass
+        while self._pending is not None and not self._pending.empty():
+            self._fail([self._pending.get_nowait()],
+                       ConnectionAbortedError('server closed'))
+
+    def stats(self) -> str:
+        """Formats the latency counters, in microseconds.
+
+        >>> server = HitServer(CircleArray(PositionArray([0], [0]), [1]))
+        >>> server.stats()
+        'queries=0 batches=0 p50_us=0 p99_us=0'
+        """
+        if self._latencies:
+            p50, p99 = np.percentile(self._latencies, [50, 99]) * 1e6
+        else:
+            p50 = p99 = 0
+        return 'queries={} batches={} p50_us={:.0f} p99_us={:.0f}'.format(
+            self.n_queries, self.n_batches, p50, p99)
+
+    def answer_batch(self, kinds: List[str],
+                     points: PositionArray) -> List[str]:
+        """Answers a batch of `contains` and `distance` queries at once.
+
+        >>> server = HitServer(CircleArray(PositionArray([0, 10], [0, 0]),
+        ...                                [2, 2]))
+        >>> server.answer_batch(['contains', 'contains', 'distance'],
+        ...                     PositionArray([1, 5, 7], [0, 0, 4]))
+        ['hit 0', 'miss', '1 5.0']
+        """
+        answers = [''] * len(kinds)
+        is_contains = np.array([kind == 'contains' for kind in kinds],
+                               dtype=bool)
+
+        contains_at = np.flatnonzero(is_contains)
+        if len(contains_at):
+            hits: List[List[int]] = [[] for _ in contains_at]
+            ps = points[contains_at]
+            r = self._max_radius
+            which, circle = self._grid.box_candidates(ps.x - r, ps.y - r,
+                                                      ps.x + r, ps.y + r)
+            inside = self.targets[circle].contains_many(ps[which])
+            for i, c in sorted(zip(which[inside].tolist(),
+                                   circle[inside].tolist())):
+                hits[i].append(c)
+            for i, found in zip(contains_at.tolist(), hits):
+                answers[i] = ('hit ' + ' '.join(map(str, found))
+                              if found else 'miss')
+
+        distance_at = np.flatnonzero(~is_contains)
+        if len(distance_at):
+            best = np.full(len(distance_at), np.inf)
+            best_index = np.zeros(len(distance_at), dtype=np.int64)
+
+            def keep_nearest(row: int, col: int, tile: np.ndarray) -> None:
+                nearest = tile.argmin(axis=1)
+                nearest_d = tile[np.arange(len(tile)), nearest]
+                rows = slice(row, row + len(tile))
+                better = nearest_d < best[rows]
+                best[rows] = np.where(better, nearest_d, best[rows])
+                best_index[rows] = np.where(better, nearest + col,
+                                            best_index[rows])
+
+            pairwise_distances(points[distance_at], self.targets.centers,
+                               callback=keep_nearest)
+            for i, index, d in zip(distance_at.tolist(), best_index.tolist(),
+                                   best.tolist()):
+                answers[i] = '{} {!r}'.format(index, d)
+
+        return answers
+
+    async def _handle(self, reader: asyncio.StreamReader,
+                      writer: asyncio.StreamWriter) -> None:
+        """Serves one connection. Queries are submitted as soon as they
+        are read, and answered in order by a separate task."""
+        connection = asyncio.current_task()
+        self._connections.add(connection)
+        answers: asyncio.Queue = asyncio.Queue()
+        replier = asyncio.ensure_future(self._reply(answers, writer))
+        try:
+            while True:
+                line = await self._read_line(reader)
+                if line is None:
+                    answers.put_nowait(self._error('error line too long'))
+                    continue
+                if not line:
+                    break
+                try:
+                    words = line.decode().split()
+                except UnicodeDecodeError:
+                    answers.put_nowait(self._error('error bad query'))
+                else:
+                    answers.put_nowait(self._submit(words))
+        finally:
+            self._connections.discard(connection)
+            answers.put_nowait(None)
+            try:
+                await replier
+            finally:
+                writer.close()
+                try:
+                    await writer.wait_closed()
+                except ConnectionError:
+                    pass
+
+    @staticmethod
+    async def _read_line(reader: asyncio.StreamReader) -> Optional[bytes]:
+        """Reads one line, or what is left at the end of the stream.
+        Returns None for a line too long for the reader's buffer, having
+        skipped it."""
+        try:
+            return await reader.readuntil(b'\n')
+        except asyncio.IncompleteReadError as error:
+            return error.partial
+        except asyncio.LimitOverrunError as error:
+            # The start of the line is still in the buffer.
+            consumed = error.consumed
+        while True:
+            await reader.readexactly(consumed)
+            try:
+                await reader.readuntil(b'\n')
+                return None
+            except asyncio.IncompleteReadError:
+                return None
+            except asyncio.LimitOverrunError as error:
+                consumed = error.consumed
+
+    async def _reply(self, answers: asyncio.Queue,
+                     writer: asyncio.StreamWriter) -> None:
+        """Writes answers to a connection in the order they were asked."""
+        while True:
+            answer = await answers.get()
+            if answer is None:
+                break
+            try:
+                line = await answer
+            except Exception:
+                line = 'error internal'
+            writer.write(line.encode() + b'\n')
+            if answers.empty():
+                await writer.drain()
+
+    @staticmethod
+    def _error(message: str) -> asyncio.Future:
+        """Returns an answer that is already the error `message`."""
+        answer = asyncio.get_event_loop().create_future()
+        answer.set_result(message)
+        return answer
+
+    def _submit(self, words: List[str]) -> asyncio.Future:
+        """Queues a query for the next batch, returning its answer."""
+        answer = asyncio.get_event_loop().create_future()
+        if words == ['stats']:
+            answer.set_result(self.stats())
+        elif len(words) == 3 and words[0] in ('contains', 'distance'):
+            try:
+                x, y = float(words[1]), float(words[2])
+            except ValueError:
+                answer.set_result('error bad number')
+            else:
+                self._pending.put_nowait(
+                    _Query(words[0], x, y, time.perf_counter(), answer))
+        else:
+            answer.set_result('error unknown query')
+        return answer
+
+    async def _batcher(self) -> None:
+        """Forever gathers queries into batches and answers them."""
+        while True:
+            batch = [await self._pending.get()]
+            try:
+                await self._gather(batch)
+            except asyncio.CancelledError:
+                self._fail(batch, ConnectionAbortedError('server closed'))
+                raise
+            self._answer(batch)
+            # Let the connections write their answers before the next
+            # batch starts.
+            await asyncio.sleep(0)
+
+    async def _gather(self, batch: List[_Query]) -> None:
+        """Adds queries to `batch` until it is full or its time is up."""
+        deadline = batch[0].arrived + self.max_wait
+        while len(batch) < self.max_batch:
+            if not self._pending.empty():
+                batch.append(self._pending.get_nowait())
+                continue
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._pending.get(),
+                                                    remaining))
+            except asyncio.TimeoutError:
+                break
+
+    def _answer(self, batch: List[_Query]) -> None:
+        """Answers a batch of queries. If that fails, the error goes to
+        each query of the batch, and the batcher carries on."""
+        points = PositionArray([q.x for q in batch], [q.y for q in batch])
+        try:
+            answers = self.answer_batch([q.kind for q in batch], points)
+        except Exception as error:
+            self._fail(batch, error)
+            return
+        done = time.perf_counter()
+        for query, answer in zip(batch, answers):
+            if not query.answer.done():
+                query.answer.set_result(answer)
+            self._latencies.append(done - query.arrived)
+        self.n_queries += len(batch)
+        self.n_batches += 1
+
+    @staticmethod
+    def _fail(batch: List[_Query], error: Exception) -> None:
+        """Gives `error` as the answer to each query of `batch`."""
+        for query in batch:
+            if not query.answer.done():
+                query.answer.set_exception(error)
+
+
+class HitClient:
+    """A connection to a `HitServer`, sending one query at a time."""
+
+    def __init__(self, reader: asyncio.StreamReader,
+                 writer: asyncio.StreamWriter) -> None:
+        self._reader = reader
+        self._writer = writer
+
+    @classmethod
+    async def connect(cls, host: str = '127.0.0.1', port: int = 0,
+                      path: Optional[str] = None) -> 'HitClient':
+        """Connects to a server on a TCP port, or on a Unix socket if
+        `path` is given."""
+        if path is not None:
+            return cls(*await asyncio.open_unix_connection(path))
+        return cls(*await asyncio.open_connection(host, port))
+
+    async def query(self, line: str) -> str:
+        """Sends one query line and returns the answer line."""
+        self._writer.write(line.encode() + b'\n')
+        await self._writer.drain()
+        return (await self._reader.readline()).decode().rstrip('\n')
+
+    async def contains(self, x: float, y: float) -> List[int]:
+        """Returns the indices of the target circles containing (x, y)."""
+        words = (await self.query('contains {!r} {!r}'.format(x, y))).split()
+        return [int(word) for word in words[1:]]
+
+    async def distance(self, x: float, y: float) -> Tuple[int, float]:
+        """Returns the index of the target circle with the center nearest
+        (x, y), and the distance to it."""
+        index, d = (await self.query('distance {!r} {!r}'
+                                     .format(x, y))).split()
+        return int(index), float(d)
+
+    async def stats(self) -> str:
+        """Returns the server's latency counters."""
+        return await self.query('stats')
+
+    async def close(self) -> None:
+        """Closes the connection."""
+        self._writer.close()
+        await self._writer.wait_closed()
+
+
+async def load_test(n_clients: int, n_queries: int, host: str = '127.0.0.1',
+                    port: int = 0, path: Optional[str] = None,
+                    spread: float = 100.0) -> float:
+    """Runs `n_clients` concurrent clients, each sending `n_queries`
+    random `contains` queries with coordinates in [-spread, spread].
+    Returns the overall queries per second."""
+    async def one_client(seed: int) -> None:
+        rng = random.Random(seed)
+        client = await HitClient.connect(host, port, path)
+        try:
+            for _ in range(n_queries):
+                await client.contains(rng.uniform(-spread, spread),
+                                      rng.uniform(-spread, spread))
+        finally:
+            await client.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one_client(seed) for seed in range(n_clients)))
+    return n_clients * n_queries / (time.perf_counter() - start)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('command', choices=['serve', 'load'])
+    parser.add_argument('circles', nargs='?',
+                        help='for serve, a point file of target circles')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=2300)
+    parser.add_argument('--unix', metavar='PATH',
+                        help='use a Unix socket instead of TCP')
+    parser.add_argument('--max-batch', type=int, default=MAX_BATCH)
+    parser.add_argument('--max-wait-us', type=float, default=MAX_WAIT_US)
+    parser.add_argument('--clients', type=int, default=64)
+    parser.add_argument('--queries', type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    async def serve() -> None:
+        server = HitServer(read_circles(args.circles), args.max_batch,
+                           args.max_wait_us)
+        listener = await server.serve(args.host, args.port, args.unix)
+        try:
+            await listener.serve_forever()
+        finally:
+            await server.close()
+
+    async def load() -> None:
+        rate = await load_test(args.clients, args.queries, args.host,
+                               args.port, args.unix)
+        client = await HitClient.connect(args.host, args.port, args.unix)
+        print('{:.0f} queries/s; server {}'.format(rate,
+                                                   await client.stats()))
+        await client.close()
+
+    if args.command == 'serve':
+        if args.circles is None:
+            parser.error('serve needs a point file of circles')
+        asyncio.run(serve())
+    else:
+        asyncio.run(load())
+
+
+if __name__ == '__main__':
+    main()
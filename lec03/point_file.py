@@ -0,0 +1,170 @@
+"""A compact binary file format for sets of positions and circles.
+
+Parsing text into `Position`s one at a time is slow, and so is turning
+millions of numbers into Python objects at all. Instead, a point file
+stores each coordinate as a column of packed numbers that can be
+memory-mapped straight into a `PositionArray` without copying.
+
+The layout is:
+
+  - a 64-byte header: the magic bytes `GEOM230\\0`, the format version
+    and the kind of file (each a little-endian uint32), and the number
+    of entries (a little-endian uint64), padded with zeros; then
+
+  - the x column, then the y column, and for circle files the radius
+    column, each as that many little-endian float64s.
+
+A file can then be classified against a target circle in parallel by
+`classify_file`, which hands each worker process its own range of the
+file to map and check.
+"""
+
+import os
+import struct
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+
+from geometry import Circle, CircleArray, Position, PositionArray
+
+
+MAGIC = b'GEOM230\0'
+VERSION = 1
+
+# The kinds of point file.
+POSITIONS = 1
+CIRCLES = 2
+
+_HEADER = struct.Struct('<8sIIQ')
+HEADER_SIZE = 64
+_COLUMN_DTYPE = np.dtype('<f8')
+_COLUMN_COUNTS = {POSITIONS: 2, CIRCLES: 3}
+
+
+def write_positions(path: str,
+                    positions: Union[PositionArray, Iterable[Position]]
+                    ) -> None:
+    """Writes a set of positions to a point file."""
+    if not isinstance(positions, PositionArray):
+        positions = PositionArray.from_positions(positions)
+    _write(path, POSITIONS, [positions.x, positions.y])
+
+
+def write_circles(path: str,
+                  circles: Union[CircleArray, Iterable[Circle]]) -> None:
+    """Writes a set of circles to a point file."""
+    if not isinstance(circles, CircleArray):
+        circles = CircleArray.from_circles(circles)
+    _write(path, CIRCLES,
+           [circles.centers.x, circles.centers.y, circles.radii])
+
+
+def read_positions(path: str) -> PositionArray:
+    """Maps a point file of positions into memory. The coordinates are
+    read from disk only as they are used, and are never copied.
+    """
+    x, y = _read(path, POSITIONS)
+    return PositionArray(x, y)
+
+
+def read_circles(path: str) -> CircleArray:
+    """Maps a point file of circles into memory, as `read_positions`."""
+    x, y, radii = _read(path, CIRCLES)
+    return CircleArray(PositionArray(x, y), radii)
+
+
+def read_header(path: str) -> Tuple[int, int]:
+    """Returns the kind of a point file and its number of entries."""
+    with open(path, 'rb') as f:
+        magic, version, kind, count = _HEADER.unpack(f.read(_HEADER.size))
+    if magic != MAGIC:
+        raise ValueError('{} is not a point file'.format(path))
+    if version != VERSION:
+        raise ValueError('{} has unsupported version {}'
+                         .format(path, version))
+    if kind not in _COLUMN_COUNTS:
+        raise ValueError('{} has unknown kind {}'.format(path, kind))
+    return kind, count
+
+
+def _write(path: str, kind: int, columns: List[np.ndarray]) -> None:
+    """Writes a header and columns of float64s."""
+    count = len(columns[0])
+    with open(path, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, kind, count)
+                .ljust(HEADER_SIZE, b'\0'))
+        for column in columns:
+            f.write(np.ascontiguousarray(column, dtype=_COLUMN_DTYPE)
+                    .tobytes())
+
+
+def _read(path: str, kind: int) -> List[np.ndarray]:
+    """Maps the columns of a point file of the given kind."""
+    actual_kind, count = read_header(path)
+    if actual_kind != kind:
+        raise ValueError('{} holds the wrong kind of data'.format(path))
+    n_columns = _COLUMN_COUNTS[kind]
+    if count == 0:
+        return [np.empty(0, dtype=_COLUMN_DTYPE)] * n_columns
+    data = np.memmap(path, dtype=_COLUMN_DTYPE, mode='r',
+                     offset=HEADER_SIZE, shape=(n_columns, count))
+    return list(data)
+
+
+# How many positions a worker checks at a time, which bounds the memory
+# each worker uses for temporaries.
+BLOCK_SIZE = 1 << 20
+
+
+def classify_file(path: str, target: Circle, out: Optional[str] = None,
+                  workers: Optional[int] = None,
+                  block_size: int = BLOCK_SIZE) -> int:
+    """Checks every position in a point file against `target`, using a
+    pool of `workers` processes (by default, one per core). Returns how
+    many positions `target` contains.
+
+    If `out` is given, also writes a `.npy` file there holding a Boolean
+    for each position, as `Circle.contains` would answer for it.
+    """
+    _, count = read_header(path)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if out is not None:
+        # Create the output file here so each worker can fill in its part.
+        np.lib.format.open_memmap(out, mode='w+', dtype=np.bool_,
+                                  shape=(count,)).flush()
+
+    # A few ranges per worker keeps every core busy to the end.
+    n_ranges = max(1, min(4 * workers, -(-count // block_size)))
+    bounds = [count * i // n_ranges for i in range(n_ranges + 1)]
+    if workers == 1 or n_ranges == 1:
+        return sum(_classify_range(path, target, start, stop, out, block_size)
+                   for start, stop in zip(bounds, bounds[1:]))
+    with ProcessPoolExecutor(workers) as pool:
+        futures = [pool.submit(_classify_range, path, target, start, stop,
+                               out, block_size)
+                   for start, stop in zip(bounds, bounds[1:])]
+        return sum(future.result() for future in futures)
+
+
+def _classify_range(path: str, target: Circle, start: int, stop: int,
+                    out: Optional[str], block_size: int) -> int:
+    """Checks positions `start` up to `stop` of a point file against
+    `target`, recording the results in `out` if given. Returns the
+    number of hits. Runs in a worker process.
+    """
+    positions = read_positions(path)
+    results = None
+    if out is not None:
+        results = np.load(out, mmap_mode='r+')
+    hits = 0
+    for block_start in range(start, stop, block_size):
+        block_stop = min(block_start + block_size, stop)
+        inside = target.contains_many(positions[block_start:block_stop])
+        hits += int(np.count_nonzero(inside))
+        if results is not None:
+            results[block_start:block_stop] = inside
+    if results is not None:
+        results.flush()
+    return hits
@@ -0,0 +1,241 @@
+"""A spatial index for finding positions near a place without checking
+every position.
+
+The index divides the plane into square cells of the same size and
+remembers which positions fall into each cell. A query then only has to
+look at the cells that it overlaps, rather than at every position.
+"""
+
+import heapq
+from math import floor, sqrt
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from geometry import Circle, Metric, Position, distance, manhattan_distance
+
+
+# A cell is identified by its column and row in the grid.
+_Cell = Tuple[int, int]
+
+
+class GridIndex:
+    """An index of positions, bucketed into a uniform grid of square
+    cells.
+
+    >>> index = GridIndex([Position(0, 0), Position(1, 1), Position(5, 5)],
+    ...                   cell_size=2)
+    >>> len(index)
+    3
+    >>> sorted(index.within(Circle(Position(0, 0), 2)))
+    [Position(x=0, y=0), Position(x=1, y=1)]
+    >>> index.nearest(Position(4, 4))
+    [Position(x=5, y=5)]
+    >>> index.nearest(Position(4, 4), 2, manhattan_distance)
+    [Position(x=5, y=5), Position(x=1, y=1)]
+    """
+
+    def __init__(self, positions: Iterable[Position] = (),
+                 cell_size: Optional[float] = None) -> None:
+        """Builds an index of the given positions. If `cell_size` is not
+        given, picks one that puts a few positions in each cell.
+        """
+        positions = list(positions)
+        if cell_size is None:
+            cell_size = _default_cell_size(positions)
+        if not cell_size > 0:
+            raise ValueError('cell_size must be positive')
+        self.cell_size = cell_size
+        self._cells: Dict[_Cell, List[Position]] = {}
+        self._count = 0
+        # Bounds on the occupied cells. They only ever grow, which is
+        # fine since `nearest` uses them only to know when to give up.
+        self._min_col = self._min_row = 0
+        self._max_col = self._max_row = -1
+        for p in positions:
+            self.insert(p)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self) -> Iterator[Position]:
+        for members in self._cells.values():
+            yield from members
+
+    def __contains__(self, p: Position) -> bool:
+        return p in self._cells.get(self._cell_of(p), ())
+
+    def insert(self, p: Position) -> None:
+        """Adds a position to the index.
+
+        >>> index = GridIndex(cell_size=1)
+        >>> index.insert(Position(3, 4))
+        >>> Position(3, 4) in index
+        True
+        """
+        col, row = cell = self._cell_of(p)
+        self._cells.setdefault(cell, []).append(p)
+        if self._count == 0:
+            self._min_col = self._max_col = col
+            self._min_row = self._max_row = row
+        else:
+            self._min_col = min(self._min_col, col)
+            self._max_col = max(self._max_col, col)
+            self._min_row = min(self._min_row, row)
+            self._max_row = max(self._max_row, row)
+        self._count += 1
+
+    def remove(self, p: Position) -> None:
+        """Removes one occurrence of a position from the index. Raises
+        `ValueError` if the position is not present.
+
+        >>> index = GridIndex([Position(3, 4), Position(3, 4)], cell_size=1)
+        >>> index.remove(Position(3, 4))
+        >>> len(index)
+        1
+        >>> index.remove(Position(0, 0))
+        Traceback (most recent call last):
+        ...
+        ValueError: position not in index
+        """
+        cell = self._cell_of(p)
+        members = self._cells.get(cell)
+        if not members or p not in members:
+            raise ValueError('position not in index')
+        members.remove(p)
+        if not members:
+            del self._cells[cell]
+        self._count -= 1
+
+    def within(self, circle: Circle) -> List[Position]:
+        """Finds all the positions that `circle` contains.
+
+        >>> index = GridIndex([Position(x, 0) for x in range(10)],
+        ...                   cell_size=3)
+        >>> sorted(p.x for p in index.within(Circle(Position(4, 0), 2)))
+        [3, 4, 5]
+        """
+        cx, cy = circle.center
+        r = circle.radius
+        if not r > 0:
+            return []
+        col0, row0 = self._cell_of(Position(cx - r, cy - r))
+        col1, row1 = self._cell_of(Position(cx + r, cy + r))
+        n_cells = (col1 - col0 + 1) * (row1 - row0 + 1)
+        if n_cells <= len(self._cells):
+            cells = (self._cells.get((col, row), ())
+                     for col in range(col0, col1 + 1)
+                     for row in range(row0, row1 + 1))
+        else:
+            # A huge circle over a sparse grid: it's cheaper to visit
+            # the occupied cells than every cell under the circle.
+            cells = (members for (col, row), members in self._cells.items()
+                     if col0 <= col <= col1 and row0 <= row <= row1)
+        return [q for members in cells for q in members
+                if circle.contains(q)]
+
+    def nearest(self, p: Position, k: int = 1,
+                metric: Metric = distance) -> List[Position]:
+        """Finds the `k` positions closest to `p`, nearest first, using
+        `metric` to measure distance. The metric should be `distance`,
+        `manhattan_distance`, or another metric that is never smaller
+        than the largest difference of coordinates.
+
+        >>> index = GridIndex([Position(x, x) for x in range(10)],
+        ...                   cell_size=1)
+        >>> index.nearest(Position(2.2, 2.4), 3)
+        [Position(x=2, y=2), Position(x=3, y=3), Position(x=1, y=1)]
+        >>> len(index.nearest(Position(100, 100), 20))
+        10
+        """
+        if k <= 0 or self._count == 0:
+            return []
+        center = self._cell_of(p)
+        col, row = center
+        reach = max(col - self._min_col, self._max_col - col,
+                    row - self._min_row, self._max_row - row)
+        # Max-heap (by negated distance) of the best k found so far; the
+        # counter breaks ties so that positions are never compared.
+        best: List[Tuple[float, int, Position]] = []
+        counter = 0
+
+        def consider(members: Iterable[Position]) -> None:
+            nonlocal counter
+            for q in members:
+                d = metric(p, q)
+                if len(best) < k:
+                    heapq.heappush(best, (-d, counter, q))
+                elif d < -best[0][0]:
+                    heapq.heapreplace(best, (-d, counter, q))
+                counter += 1
+
+        for ring in range(max(reach, 0) + 1):
+            if (2 * ring + 1) ** 2 > 4 * len(self._cells):
+                # The rings are now mostly empty cells, so visit the
+                # remaining occupied cells directly instead.
+                for cell, members in self._cells.items():
+                    if _ring_of(center, cell) >= ring:
+                        consider(members)
+                break
+            for cell in _ring_cells(center, ring):
+                consider(self._cells.get(cell, ()))
+            # Every position outside this ring is more than
+            # `ring * cell_size` away along at least one axis.
+            if len(best) == k and -best[0][0] <= ring * self.cell_size:
+                break
+
+        best.sort(key=lambda entry: (-entry[0], entry[1]))
+        return [q for _, _, q in best]
+
+    def _cell_of(self, p: Position) -> _Cell:
+        """Returns the cell that contains the given position."""
+        return floor(p.x / self.cell_size), floor(p.y / self.cell_size)
+
+
+def _ring_of(center: _Cell, cell: _Cell) -> int:
+    """Returns how many rings of cells `cell` is away from `center`.
+
+    >>> _ring_of((0, 0), (2, -3))
+    3
+    """
+    return max(abs(cell[0] - center[0]), abs(cell[1] - center[1]))
+
+
+def _ring_cells(center: _Cell, ring: int) -> Iterator[_Cell]:
+    """Iterates over the cells exactly `ring` rings away from `center`.
+
+    >>> list(_ring_cells((0, 0), 0))
+    [(0, 0)]
+    >>> len(list(_ring_cells((0, 0), 2)))
+    16
+    """
+    col, row = center
+    if ring == 0:
+        yield center
+        return
+    for dc in range(-ring, ring + 1):
+        yield col + dc, row - ring
+        yield col + dc, row + ring
+    for dr in range(-ring + 1, ring):
+        yield col - ring, row + dr
+        yield col + ring, row + dr
+
+
+def _default_cell_size(positions: List[Position]) -> float:
+    """Picks a cell size that puts about four positions in each cell of
+    the positions' bounding box.
+
+    >>> _default_cell_size([Position(0, 0), Position(10, 0),
+    ...                     Position(0, 10), Position(10, 10)])
+    10.0
+    >>> _default_cell_size([])
+    1.0
+    """
+    if len(positions) < 2:
+        return 1.0
+    xs = [p.x for p in positions]
+    ys = [p.y for p in positions]
+    width = max(xs) - min(xs)
+    height = max(ys) - min(ys)
+    area = width * height or max(width, height) ** 2
+    if not area > 0:
+        return 1.0
+    return 2 * sqrt(area / len(positions))
@@ -0,0 +1,189 @@
+"""Continuous collision detection for moving positions.
+
+Checking `Circle.contains` once per frame misses a fast-moving position
+that passes all the way through a circle between two frames. Instead,
+we treat each position as moving in a straight line during a frame,
+and solve for the exact time at which that line first touches each
+circle.
+
+A position p moving with velocity v is at p + v·t at time t, and it
+touches circle (c, r) when |p + v·t − c| = r. Squaring both sides gives
+a quadratic in t, whose smaller root (if any) is the time of impact.
+"""
+
+from math import sqrt
+from typing import Iterable, List, NamedTuple, Optional, Tuple, Union
+
+import numpy as np
+
+from broad_phase import PointGrid, BATCH_SIZE
+from geometry import Circle, CircleArray, Position, PositionArray, sqr
+
+
+class Velocity(NamedTuple):
+    """Represents a 2-D velocity, in distance units per time unit."""
+    x: float
+    y: float
+
+
+def time_of_impact(p: Position, v: Velocity, target: Circle,
+                   dt: float) -> Optional[float]:
+    """Finds the first time in [0, `dt`] at which a position starting
+    at `p` and moving with velocity `v` touches `target`, or None if it
+    does not. A position that starts inside `target` touches it at 0.
+
+    >>> target = Circle(Position(5, 0), 1)
+    >>> time_of_impact(Position(0, 0), Velocity(2, 0), target, 10)
+    2.0
+    >>> time_of_impact(Position(0, 0), Velocity(2, 0), target, 1)
+    >>> time_of_impact(Position(0, 0), Velocity(0, 2), target, 10)
+    >>> time_of_impact(Position(5, 0.5), Velocity(0, 0), target, 1)
+    0.0
+    """
+    sx = p.x - target.center.x
+    sy = p.y - target.center.y
+    c = sqr(sx) + sqr(sy) - sqr(target.radius)
+    if c <= 0:
+        return 0.0
+    a = sqr(v.x) + sqr(v.y)
+    b = 2 * (sx * v.x + sy * v.y)
+    discriminant = sqr(b) - 4 * a * c
+    if b >= 0 or discriminant < 0:
+        # Moving away, or passing by without touching.
+        return None
+    # The numerically stable form of the smaller root.
+    t = 2 * c / (sqrt(discriminant) - b)
+    return t if t <= dt else None
+
+
+class Impact(NamedTuple):
+    """Records that a mover touched a target during a frame."""
+    mover:  int
+    target: int
+    time:   float
+
+
+class Simulation:
+    """Moves a set of positions in straight lines, frame by frame,
+    reporting every time one of them touches a target circle.
+
+    >>> sim = Simulation([Circle(Position(5, 0), 1)],
+    ...                  [Position(0, 0), Position(0, 3)],
+    ...                  [Velocity(2.5, 0), Velocity(2.5, 0)])
+    >>> sim.step(1)
+    []
+    >>> sim.step(1)
+    [Impact(mover=0, target=0, time=0.6)]
+    >>> sim.positions[0]
+    Position(x=5.0, y=0.0)
+    >>> sim.time
+    2.0
+    """
+
+    def __init__(self, targets: Union[CircleArray, Iterable[Circle]],
+                 positions: Union[PositionArray, Iterable[Position]],
+                 velocities: Iterable[Velocity]) -> None:
+        if not isinstance(targets, CircleArray):
+            targets = CircleArray.from_circles(targets)
+        if not isinstance(positions, PositionArray):
+            positions = PositionArray.from_positions(positions)
+        velocities = list(velocities)
+        self.targets = targets
+        self.positions = positions
+        self.vx = np.array([v.x for v in velocities], dtype=np.float64)
+        self.vy = np.array([v.y for v in velocities], dtype=np.float64)
+        if self.vx.shape != positions.x.shape:
+            raise ValueError('need exactly one velocity per position')
+        self.time = 0.0
+        # The targets don't move, so their grid is built just once.
+        self._max_radius = float(targets.radii.max()) if len(targets) else 0
+        self._grid = PointGrid(targets.centers,
+                               max(2 * self._max_radius, 1e-9))
+
+    @classmethod
+    def from_arrays(cls, targets: CircleArray, positions: PositionArray,
+                    vx, vy) -> 'Simulation':
+        """Creates a simulation with velocities given as arrays of x and
+        y components, which avoids making a `Velocity` per mover."""
+        sim = cls(targets, PositionArray([], []), [])
+        sim.positions = positions
+        sim.vx = np.array(vx, dtype=np.float64)
+        sim.vy = np.array(vy, dtype=np.float64)
+        if sim.vx.shape != positions.x.shape or sim.vy.shape != sim.vx.shape:
+            raise ValueError('need exactly one velocity per position')
+        return sim
+
+    def impacts(self, dt: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Finds every (mover, target) pair that touches within the
+        next `dt` time units, without moving anything. Returns parallel
+        arrays of mover indices, target indices, and times of impact
+        measured from the start of the frame, sorted by mover and then
+        by time.
+        """
+        x, y = self.positions.x, self.positions.y
+        end_x = x + self.vx * dt
+        end_y = y + self.vy * dt
+        r = self._max_radius
+        mover_parts, target_parts, time_parts = [], [], []
+        for start in range(0, len(x), BATCH_SIZE * 16):
+            batch = slice(start, start + BATCH_SIZE * 16)
+            # Broad phase: targets whose centers are within the largest
+            # radius of the box around each mover's path.
+            movers, targets = self._grid.box_candidates(
+                np.minimum(x[batch], end_x[batch]) - r,
+                np.minimum(y[batch], end_y[batch]) - r,
+                np.maximum(x[batch], end_x[batch]) + r,
+                np.maximum(y[batch], end_y[batch]) + r)
+            movers += start
+            times = _times_of_impact(
+                x[movers], y[movers], self.vx[movers], self.vy[movers],
+                self.targets.centers.x[targets],
+                self.targets.centers.y[targets],
+                self.targets.radii[targets], dt)
+            hit = ~np.isnan(times)
+            mover_parts.append(movers[hit])
+            target_parts.append(targets[hit])
+            time_parts.append(times[hit])
+        movers = np.concatenate(mover_parts) if mover_parts else \
+            np.empty(0, dtype=np.int64)
+        targets = np.concatenate(target_parts) if target_parts else \
+            np.empty(0, dtype=np.int64)
+        times = np.concatenate(time_parts) if time_parts else np.empty(0)
+        order = np.lexsort((targets, times, movers))
+        return movers[order], targets[order], times[order]
+
+    def step(self, dt: float) -> List[Impact]:
+        """Advances the simulation by `dt` time units, returning the
+        `Impact`s that happened along the way."""
+        movers, targets, times = self.impacts(dt)
+        self.advance(dt)
+        return [Impact(m, t, time) for m, t, time
+                in zip(movers.tolist(), targets.tolist(), times.tolist())]
+
+    def advance(self, dt: float) -> None:
+        """Moves every position along its velocity for `dt` time units."""
+        self.positions = PositionArray(self.positions.x + self.vx * dt,
+                                       self.positions.y + self.vy * dt)
+        self.time += dt
+
+
+def _times_of_impact(px, py, vx, vy, cx, cy, r, dt: float) -> np.ndarray:
+    """Computes `time_of_impact` for arrays of movers and targets at
+    once, with NaN where there is no impact.
+
+    >>> _times_of_impact(np.array([0, 0]), np.array([0, 0]),
+    ...                  np.array([2, 0]), np.array([0, 2]),
+    ...                  5, 0, 1, 10).tolist()
+    [2.0, nan]
+    """
+    sx = px - cx
+    sy = py - cy
+    c = sqr(sx) + sqr(sy) - sqr(r)
+    a = sqr(vx) + sqr(vy)
+    b = 2 * (sx * vx + sy * vy)
+    discriminant = sqr(b) - 4 * a * c
+    approaching = (b < 0) & (discriminant >= 0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        t = 2 * c / (np.sqrt(np.where(approaching, discriminant, 0)) - b)
+    t = np.where(approaching & (t <= dt), t, np.nan)
+    return np.where(c <= 0, 0.0, t)
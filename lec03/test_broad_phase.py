@@ -0,0 +1,69 @@
+import math
+import random
+
+from broad_phase import hit_pairs, union_area_estimate
+from geometry import Circle, Position, union_area
+
+
+def random_scene(n_circles, n_positions, seed=230):
+    rng = random.Random(seed)
+    circles = [Circle(Position(rng.uniform(-50, 50), rng.uniform(-50, 50)),
+                      rng.uniform(0, 8))
+               for _ in range(n_circles)]
+    positions = [Position(rng.uniform(-60, 60), rng.uniform(-60, 60))
+                 for _ in range(n_positions)]
+    return circles, positions
+
+
+def brute_force_pairs(circles, positions):
+    return [(i, j)
+            for i, c in enumerate(circles)
+            for j, p in enumerate(positions)
+            if c.contains(p)]
+
+
+def test_hit_pairs_matches_brute_force():
+    circles, positions = random_scene(300, 2000)
+    cs, ps = hit_pairs(circles, positions)
+    assert list(zip(cs.tolist(), ps.tolist())) \
+        == brute_force_pairs(circles, positions)
+
+
+def test_hit_pairs_any_cell_size():
+    circles, positions = random_scene(50, 500, seed=7)
+    expected = brute_force_pairs(circles, positions)
+    for cell_size in (0.1, 3, 1000):
+        cs, ps = hit_pairs(circles, positions, cell_size)
+        assert list(zip(cs.tolist(), ps.tolist())) == expected
+
+
+def test_hit_pairs_circles_outside_points():
+    circles = [Circle(Position(1000, 1000), 5), Circle(Position(-1e6, 0), 1),
+               Circle(Position(0, 0), 0), Circle(Position(0, 0), 1)]
+    positions = [Position(0, 0), Position(0.5, 0.5), Position(3, 3)]
+    cs, ps = hit_pairs(circles, positions)
+    assert list(zip(cs.tolist(), ps.tolist())) == [(3, 0), (3, 1)]
+
+
+def test_hit_pairs_empty():
+    cs, ps = hit_pairs([], [Position(0, 0)])
+    assert len(cs) == len(ps) == 0
+    cs, ps = hit_pairs([Circle(Position(0, 0), 1)], [])
+    assert len(cs) == len(ps) == 0
+
+
+def test_union_area_estimate_with_hole():
+    # Six circles in a ring leave an uncovered hole in the middle.
+    ring = [Circle(Position(2 * math.cos(t * math.pi / 3),
+                            2 * math.sin(t * math.pi / 3)), 1.1)
+            for t in range(6)]
+    assert abs(union_area_estimate(ring, 0.05, seed=1)
+               - union_area(ring)) < 0.05
+
+
+def test_union_area_matches_estimate():
+    rng = random.Random(230)
+    cs = [Circle(Position(rng.uniform(0, 10), rng.uniform(0, 10)),
+                 rng.uniform(0.1, 2))
+          for _ in range(200)]
+    assert abs(union_area_estimate(cs, 1, seed=2) - union_area(cs)) < 1
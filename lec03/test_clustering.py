@@ -0,0 +1,76 @@
+import random
+
+import numpy as np
+import pytest
+
+from clustering import NOISE, dbscan
+from geometry import Position, distance, manhattan_distance
+
+
+def naive_dbscan(ps, eps, min_points, metric):
+    """Straightforward O(n²) DBSCAN, with the same rules as `dbscan`."""
+    n = len(ps)
+    neighbours = [[j for j in range(n) if metric(ps[i], ps[j]) <= eps]
+                  for i in range(n)]
+    core = [len(nbrs) >= min_points for nbrs in neighbours]
+    labels = [NOISE] * n
+    next_label = 0
+    for i in range(n):
+        if not core[i] or labels[i] != NOISE:
+            continue
+        labels[i] = next_label
+        stack = [i]
+        while stack:
+            k = stack.pop()
+            for j in neighbours[k]:
+                if core[j] and labels[j] == NOISE:
+                    labels[j] = next_label
+                    stack.append(j)
+        next_label += 1
+    for i in range(n):
+        if not core[i]:
+            cores = [j for j in neighbours[i] if core[j]]
+            if cores:
+                labels[i] = labels[min(cores)]
+    # Renumber the clusters in order of their first position.
+    renumber = {}
+    for label in labels:
+        if label != NOISE and label not in renumber:
+            renumber[label] = len(renumber)
+    return [renumber.get(label, NOISE) for label in labels]
+
+
+def blobs(n, seed=230):
+    rng = random.Random(seed)
+    centers = [(rng.uniform(0, 100), rng.uniform(0, 100)) for _ in range(8)]
+    ps = []
+    for _ in range(n):
+        if rng.random() < 0.2:
+            ps.append(Position(rng.uniform(0, 100), rng.uniform(0, 100)))
+        else:
+            cx, cy = rng.choice(centers)
+            ps.append(Position(rng.gauss(cx, 3), rng.gauss(cy, 3)))
+    return ps
+
+
+@pytest.mark.parametrize('metric', [distance, manhattan_distance])
+@pytest.mark.parametrize('eps, min_points', [(1.5, 4), (3, 10), (0.5, 2)])
+def test_dbscan_matches_naive(metric, eps, min_points):
+    ps = blobs(600)
+    labels = dbscan(ps, eps, min_points, metric)
+    assert labels.dtype == np.int32
+    assert labels.tolist() == naive_dbscan(ps, eps, min_points, metric)
+
+
+def test_dbscan_long_chain():
+    # A chain of close positions is one cluster, however long it is.
+    ps = [Position(0.9 * i, 0) for i in range(1000)]
+    assert set(dbscan(ps, 1, 2).tolist()) == {0}
+
+
+def test_dbscan_edge_cases():
+    assert len(dbscan([], 1, 1)) == 0
+    assert dbscan([Position(0, 0)], 1, 1).tolist() == [0]
+    assert dbscan([Position(0, 0)], 1, 2).tolist() == [NOISE]
+    with pytest.raises(ValueError):
+        dbscan([Position(0, 0)], 0, 1)
@@ -1,5 +1,9 @@
+import math
+import random
 from math import isclose, pi
 
+import pytest
+
 from geometry import *
 
 
@@ -35,3 +39,136 @@ def test_contains():
     assert not c.contains(Position(5, 0))
     assert not c.contains(Position(-5, 0))
 
+
+def random_positions(n, seed=230):
+    rng = random.Random(seed)
+    return [Position(rng.uniform(-10, 10), rng.uniform(-10, 10))
+            for _ in range(n)]
+
+
+def test_position_array_round_trip():
+    ps = random_positions(50)
+    assert PositionArray.from_positions(ps).to_positions() == ps
+
+
+def test_position_array_distances():
+    ps = random_positions(200)
+    q = Position(1.5, -2.25)
+    arr = PositionArray.from_positions(ps)
+    assert arr.distance(q).tolist() == [distance(p, q) for p in ps]
+    assert (arr.manhattan_distance(q).tolist()
+            == [manhattan_distance(p, q) for p in ps])
+    qs = random_positions(200, seed=231)
+    assert (arr.distance(PositionArray.from_positions(qs)).tolist()
+            == [distance(p, q) for p, q in zip(ps, qs)])
+
+
+def test_circle_array_area_circumference():
+    cs = [Circle(p, abs(p.x)) for p in random_positions(50)]
+    arr = CircleArray.from_circles(cs)
+    assert arr.to_circles() == cs
+    assert arr.area().tolist() == [c.area() for c in cs]
+    assert arr.circumference().tolist() == [c.circumference() for c in cs]
+
+
+def test_contains_many_agrees_with_contains():
+    c = Circle(Position(0, 0), 5)
+    ps = random_positions(1000) + [Position(3, 4), Position(2.9, 3.9),
+                                   Position(5, 0), Position(-4.9, 0)]
+    arr = PositionArray.from_positions(ps)
+    assert c.contains_many(arr).tolist() == [c.contains(p) for p in ps]
+
+
+def test_contains_many_near_boundary():
+    c = Circle(Position(0.1, 0.2), 0.3)
+    ps = [Position(0.1 + 0.3 * math.cos(t), 0.2 + 0.3 * math.sin(t))
+          for t in (i / 100 for i in range(700))]
+    arr = PositionArray.from_positions(ps)
+    assert c.contains_many(arr).tolist() == [c.contains(p) for p in ps]
+
+
+def test_contains_many_degenerate_radius():
+    arr = PositionArray([0, 1], [0, 0])
+    assert not Circle(Position(0, 0), 0).contains_many(arr).any()
+    assert not Circle(Position(0, 0), -2).contains_many(arr).any()
+
+
+def test_circle_array_contains_many():
+    cs = [Circle(p, abs(p.y)) for p in random_positions(100)]
+    arr = CircleArray.from_circles(cs)
+    q = Position(0.5, 0.5)
+    assert arr.contains_many(q).tolist() == [c.contains(q) for c in cs]
+
+
+def test_pairwise_distances_matches_scalar():
+    a = random_positions(70)
+    b = random_positions(40, seed=231)
+    for metric in (distance, manhattan_distance):
+        expected = [[metric(p, q) for q in b] for p in a]
+        assert pairwise_distances(a, b, metric, tile_size=16).tolist() \
+            == expected
+
+
+def test_pairwise_distances_callback_covers_matrix():
+    a = PositionArray.from_positions(random_positions(37))
+    b = PositionArray.from_positions(random_positions(23, seed=231))
+    seen = np.zeros((len(a), len(b)), dtype=int)
+
+    def count(row, col, tile):
+        assert tile.shape[0] <= 10 and tile.shape[1] <= 10
+        seen[row:row + tile.shape[0], col:col + tile.shape[1]] += 1
+
+    assert pairwise_distances(a, b, callback=count, tile_size=10) is None
+    assert (seen == 1).all()
+
+
+def test_pairwise_distances_memmap(tmp_path):
+    a = random_positions(50)
+    path = str(tmp_path / 'distances.npy')
+    result = pairwise_distances(a, a, out=path, dtype=np.float32,
+                                tile_size=8)
+    assert result.dtype == np.float32
+    reloaded = np.load(path, mmap_mode='r')
+    assert reloaded.shape == (50, 50)
+    expected = np.array([[distance(p, q) for q in a] for p in a],
+                        dtype=np.float32)
+    assert (reloaded == expected).all()
+
+
+def test_pairwise_distances_rejects_other_metrics():
+    with pytest.raises(ValueError):
+        pairwise_distances([Position(0, 0)], [Position(1, 1)],
+                           lambda p, q: 0)
+
+
+def lens_area(r1, r2, d):
+    """The area of the intersection of two circles, by formula."""
+    a1 = r1 * r1 * math.acos((d * d + r1 * r1 - r2 * r2) / (2 * d * r1))
+    a2 = r2 * r2 * math.acos((d * d + r2 * r2 - r1 * r1) / (2 * d * r2))
+    a3 = 0.5 * math.sqrt((-d + r1 + r2) * (d + r1 - r2)
+                         * (d - r1 + r2) * (d + r1 + r2))
+    return a1 + a2 - a3
+
+
+def test_union_area_two_circles():
+    for r1, r2, d in [(1, 1, 1), (2, 1, 2.5), (3, 2, 1.5), (1, 4, 4.5)]:
+        cs = [Circle(Position(10, -3), r1), Circle(Position(10 + d, -3), r2)]
+        expected = pi * r1 * r1 + pi * r2 * r2 - lens_area(r1, r2, d)
+        assert isclose(union_area(cs), expected, rel_tol=1e-12)
+
+
+def test_union_area_degenerate():
+    c = Circle(Position(1, 2), 3)
+    assert union_area([]) == 0
+    assert isclose(union_area([c, c, c]), c.area())
+    assert isclose(union_area([c, Circle(Position(1, 2), 1)]), c.area())
+    assert isclose(union_area([c, Circle(Position(7, 2), 3)]), 2 * c.area())
+    assert union_area([Circle(Position(0, 0), 0)]) == 0
+
+
+def test_union_area_with_hole():
+    # Six circles in a ring leave an uncovered hole in the middle.
+    ring = [Circle(Position(2 * math.cos(t * pi / 3),
+                            2 * math.sin(t * pi / 3)), 1.1)
+            for t in range(6)]
+    assert union_area(ring) < 6 * pi * 1.1 ** 2
@@ -0,0 +1,153 @@
+import asyncio
+import random
+
+from geometry import Circle, CircleArray, Position, distance
+from hit_server import HitClient, HitServer, load_test
+
+
+def random_targets(n, seed=230):
+    rng = random.Random(seed)
+    return [Circle(Position(rng.uniform(-20, 20), rng.uniform(-20, 20)),
+                   rng.uniform(0.5, 5))
+            for _ in range(n)]
+
+
+def run_against_server(targets, scenario, **kwargs):
+    async def go():
+        server = HitServer(CircleArray.from_circles(targets), **kwargs)
+        listener = await server.serve()
+        port = listener.sockets[0].getsockname()[1]
+        try:
+            return await scenario(server, port)
+        finally:
+            await server.close()
+    return asyncio.run(go())
+
+
+def test_concurrent_queries_match_geometry():
+    targets = random_targets(200)
+    rng = random.Random(1)
+    points = [Position(rng.uniform(-25, 25), rng.uniform(-25, 25))
+              for _ in range(300)]
+
+    async def scenario(server, port):
+        clients = [await HitClient.connect(port=port) for _ in range(10)]
+
+        async def ask(i, p):
+            client = clients[i % len(clients)]
+            return await client.contains(*p), await client.distance(*p)
+
+        # Each client is used by one task at a time.
+        results = []
+        for start in range(0, len(points), len(clients)):
+            results += await asyncio.gather(
+                *(ask(i, p) for i, p in enumerate(points[start:start + 10])))
+        for client in clients:
+            await client.close()
+        return results, server.n_batches
+
+    results, n_batches = run_against_server(targets, scenario)
+    assert n_batches < len(points) * 2
+    for p, (hits, (index, d)) in zip(points, results):
+        assert hits == [i for i, c in enumerate(targets) if c.contains(p)]
+        distances = [distance(p, c.center) for c in targets]
+        assert d == min(distances)
+        assert distances[index] == d
+
+
+def test_pipelined_answers_in_order():
+    targets = [Circle(Position(0, 0), 1), Circle(Position(3, 0), 1)]
+
+    async def scenario(server, port):
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(b'contains 0 0\ncontains 3 0.5\nbogus\ncontains 9 9\n'
+                     b'distance 2 0\ncontains x 1\n')
+        await writer.drain()
+        lines = [(await reader.readline()).decode().strip()
+                 for _ in range(6)]
+        writer.close()
+        await writer.wait_closed()
+        return lines
+
+    assert run_against_server(targets, scenario) == [
+        'hit 0', 'hit 1', 'error unknown query', 'miss', '1 1.0',
+        'error bad number']
+
+
+def test_load_test_and_stats():
+    async def scenario(server, port):
+        rate = await load_test(8, 25, port=port, spread=20)
+        client = await HitClient.connect(port=port)
+        stats = await client.stats()
+        await client.close()
+        return rate, stats
+
+    rate, stats = run_against_server(random_targets(50), scenario,
+                                     max_batch=16, max_wait_us=1000)
+    assert rate > 0
+    assert stats.startswith('queries=200 ')
+    assert 'p99_us=' in stats
+
+
+def test_failed_batch_answers_error_and_carries_on():
+    targets = [Circle(Position(0, 0), 1)]
+
+    async def scenario(server, port):
+        answer_batch = server.answer_batch
+
+        def flaky(kinds, points):
+            if 13 in points.x:
+                raise ValueError('unlucky')
+            return answer_batch(kinds, points)
+        server.answer_batch = flaky
+        client = await HitClient.connect(port=port)
+        answers = [await client.query('contains 13 0'),
+                   await client.query('contains 0 0')]
+        await client.close()
+        return answers
+
+    assert run_against_server(targets, scenario, max_batch=1) == [
+        'error internal', 'hit 0']
+
+
+def test_close_stops_batcher():
+    async def scenario(server, port):
+        await server.close()
+        return server._batcher_task.done()
+
+    assert run_against_server(random_targets(5), scenario)
+
+
+def test_bad_lines_answer_errors():
+    targets = [Circle(Position(0, 0), 1)]
+
+    async def scenario(server, port):
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        # The server reads lines with the default 64 KiB limit.
+        writer.write(b'contains \xff 0\n' + b'x' * 200000 + b'\n'
+                     b'contains 0 0\n' + b'y' * 100000)
+        writer.write_eof()
+        lines = [(await reader.readline()).decode().strip()
+                 for _ in range(4)]
+        assert await reader.readline() == b''
+        writer.close()
+        await writer.wait_closed()
+        return lines
+
+    assert run_against_server(targets, scenario) == [
+        'error bad query', 'error line too long', 'hit 0',
+        'error line too long']
+
+
+def test_close_closes_open_connections():
+    async def scenario(server, port):
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(b'contains 0 0\n')
+        assert await reader.readline() == b'miss\n'
+        await server.close()
+        assert await reader.readline() == b''
+        writer.close()
+        await writer.wait_closed()
+        return server._connections
+
+    assert run_against_server([Circle(Position(5, 5), 1)], scenario) == set()
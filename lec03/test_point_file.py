@@ -0,0 +1,63 @@
+import random
+
+import numpy as np
+import pytest
+
+from geometry import Circle, Position, PositionArray
+from point_file import (classify_file, read_circles, read_header,
+                        read_positions, write_circles, write_positions,
+                        CIRCLES, POSITIONS)
+
+
+def random_positions(n, seed=230):
+    rng = random.Random(seed)
+    return [Position(rng.uniform(-10, 10), rng.uniform(-10, 10))
+            for _ in range(n)]
+
+
+def test_positions_round_trip(tmp_path):
+    path = str(tmp_path / 'points.bin')
+    ps = random_positions(1000)
+    write_positions(path, ps)
+    assert read_header(path) == (POSITIONS, 1000)
+    loaded = read_positions(path)
+    assert isinstance(loaded.x.base, np.memmap)
+    assert loaded.to_positions() == ps
+
+
+def test_circles_round_trip(tmp_path):
+    path = str(tmp_path / 'circles.bin')
+    cs = [Circle(p, abs(p.x)) for p in random_positions(100)]
+    write_circles(path, cs)
+    assert read_header(path) == (CIRCLES, 100)
+    assert read_circles(path).to_circles() == cs
+
+
+def test_empty_file(tmp_path):
+    path = str(tmp_path / 'empty.bin')
+    write_positions(path, [])
+    assert len(read_positions(path)) == 0
+
+
+def test_wrong_kind_or_format(tmp_path):
+    path = str(tmp_path / 'points.bin')
+    write_positions(path, random_positions(3))
+    with pytest.raises(ValueError):
+        read_circles(path)
+    with open(path, 'wb') as f:
+        f.write(b'not a point file at all' * 4)
+    with pytest.raises(ValueError):
+        read_positions(path)
+
+
+@pytest.mark.parametrize('workers', [1, 3])
+def test_classify_file(tmp_path, workers):
+    path = str(tmp_path / 'points.bin')
+    out = str(tmp_path / 'hits.npy')
+    ps = random_positions(5000)
+    write_positions(path, PositionArray.from_positions(ps))
+    target = Circle(Position(1, -2), 5)
+    expected = [target.contains(p) for p in ps]
+    hits = classify_file(path, target, out, workers=workers, block_size=700)
+    assert hits == sum(expected)
+    assert np.load(out).tolist() == expected
@@ -0,0 +1,64 @@
+import random
+
+from geometry import Circle, Position, distance, manhattan_distance
+from spatial_index import GridIndex
+
+
+def random_positions(n, seed=230):
+    rng = random.Random(seed)
+    return [Position(rng.uniform(-100, 100), rng.uniform(-50, 50))
+            for _ in range(n)]
+
+
+def test_within_matches_brute_force():
+    ps = random_positions(2000)
+    index = GridIndex(ps)
+    rng = random.Random(1)
+    for _ in range(50):
+        c = Circle(Position(rng.uniform(-120, 120), rng.uniform(-60, 60)),
+                   rng.uniform(0, 40))
+        assert sorted(index.within(c)) == sorted(p for p in ps
+                                                 if c.contains(p))
+
+
+def test_within_huge_circle():
+    ps = random_positions(100)
+    index = GridIndex(ps, cell_size=0.01)
+    assert sorted(index.within(Circle(Position(0, 0), 1e6))) == sorted(ps)
+
+
+def test_nearest_matches_brute_force():
+    ps = random_positions(2000)
+    index = GridIndex(ps)
+    rng = random.Random(2)
+    for metric in (distance, manhattan_distance):
+        for _ in range(50):
+            q = Position(rng.uniform(-300, 300), rng.uniform(-300, 300))
+            k = rng.randrange(1, 20)
+            expected = sorted(metric(q, p) for p in ps)[:k]
+            assert [metric(q, p) for p in index.nearest(q, k, metric)] \
+                == expected
+
+
+def test_nearest_fewer_than_k():
+    index = GridIndex([Position(0, 0), Position(1, 0)], cell_size=1)
+    assert index.nearest(Position(5, 5), 5) == [Position(1, 0),
+                                                Position(0, 0)]
+    assert GridIndex().nearest(Position(0, 0), 3) == []
+
+
+def test_insert_and_remove():
+    ps = random_positions(500)
+    index = GridIndex(ps[:250], cell_size=5)
+    for p in ps[250:]:
+        index.insert(p)
+    for p in ps[::2]:
+        index.remove(p)
+    remaining = ps[1::2]
+    assert len(index) == len(remaining)
+    assert sorted(index) == sorted(remaining)
+    c = Circle(Position(10, 10), 30)
+    assert sorted(index.within(c)) == sorted(p for p in remaining
+                                             if c.contains(p))
+    q = Position(3, -7)
+    assert index.nearest(q) == [min(remaining, key=lambda p: distance(q, p))]
@@ -0,0 +1,75 @@
+import math
+import random
+
+import pytest
+
+from geometry import Circle, Position
+from swept import Simulation, Velocity, time_of_impact
+
+
+def test_time_of_impact_tunnelling():
+    # Fast enough to skip right over the circle between frames.
+    target = Circle(Position(10, 0), 1)
+    p, v = Position(0, 0), Velocity(100, 0)
+    assert not target.contains(p)
+    assert not target.contains(Position(p.x + v.x, p.y + v.y))
+    assert time_of_impact(p, v, target, 1) == pytest.approx(0.09)
+
+
+def test_time_of_impact_touches_boundary():
+    target = Circle(Position(0, 0), 1)
+    t = time_of_impact(Position(-3, 0.5), Velocity(1, 0), target, 10)
+    assert t == pytest.approx(3 - math.sqrt(0.75))
+    # Just grazing the top of the circle.
+    assert time_of_impact(Position(-3, 1), Velocity(1, 0), target, 10) \
+        == pytest.approx(3)
+    assert time_of_impact(Position(-3, 1.01), Velocity(1, 0), target, 10) \
+        is None
+    assert time_of_impact(Position(3, 0), Velocity(1, 0), target, 10) is None
+
+
+def random_simulation(n_targets, n_movers, seed=230):
+    rng = random.Random(seed)
+    targets = [Circle(Position(rng.uniform(-50, 50), rng.uniform(-50, 50)),
+                      rng.uniform(0.5, 4))
+               for _ in range(n_targets)]
+    positions = [Position(rng.uniform(-60, 60), rng.uniform(-60, 60))
+                 for _ in range(n_movers)]
+    velocities = [Velocity(rng.uniform(-30, 30), rng.uniform(-30, 30))
+                  for _ in range(n_movers)]
+    return targets, positions, velocities
+
+
+def test_simulation_matches_brute_force():
+    targets, positions, velocities = random_simulation(100, 1000)
+    sim = Simulation(targets, positions, velocities)
+    for frame in range(3):
+        dt = 0.25
+        expected = []
+        for i, (p, v) in enumerate(zip(sim.positions.to_positions(),
+                                       velocities)):
+            for j, c in enumerate(targets):
+                t = time_of_impact(p, v, c, dt)
+                if t is not None:
+                    expected.append((i, t, j))
+        impacts = sim.step(dt)
+        assert len(impacts) == len(expected)
+        for impact, (i, t, j) in zip(impacts, sorted(expected)):
+            assert (impact.mover, impact.target) == (i, j)
+            assert impact.time == pytest.approx(t)
+    assert sim.time == pytest.approx(0.75)
+
+
+def test_simulation_without_targets():
+    sim = Simulation([], [Position(0, 0)], [Velocity(1, 1)])
+    assert sim.step(1) == []
+    assert sim.positions[0] == Position(1, 1)
+
+
+def test_from_arrays_matches_constructor():
+    targets, positions, velocities = random_simulation(30, 200, seed=5)
+    sim = Simulation(targets, positions, velocities)
+    arrays = Simulation.from_arrays(sim.targets, sim.positions,
+                                    [v.x for v in velocities],
+                                    [v.y for v in velocities])
+    assert arrays.step(0.5) == sim.step(0.5)
@@ -0,0 +1,189 @@
+"""Searching for a needle that may be misspelled (approximate matching).
+
+Sometimes the needle appears in the haystack with a few mistakes: a
+character left out, an extra character, or one character changed. The
+*edit distance* between two strings is the fewest such edits that turn
+one into the other, and we want every place in the haystack where some
+substring is within `k` edits of the needle.
+
+The textbook way fills in a table with one row per needle character and
+one column per haystack character. Myers' *bit-vector* algorithm notices
+that neighbouring entries of a column differ by -1, 0 or +1, so a whole
+column can be stored as two bit-vectors (where it goes up, and where it
+goes down), and the next column can be computed from them with a
+handful of additions and bitwise operations. Python integers can be as
+long as we like, so a needle of length m takes ⌈m/w⌉ machine words per
+operation, and searching a haystack of length n takes O(n⌈m/w⌉) time.
+
+That search finds where each match *ends*. To find where it starts, we
+run the same algorithm backwards from the end over a window just long
+enough to hold a match, but with the needle anchored at the end, which
+gives the exact edit distance to each possible start.
+
+Needles and haystacks may be `str` or `bytes`, as long as they match.
+"""
+
+from functools import lru_cache
+from typing import Dict, Iterator, NamedTuple, Optional, Union
+
+from needle import Text
+
+
+class Match(NamedTuple):
+    """A substring `haystack[start:end]` within `distance` edits of the
+    needle."""
+    start: int
+    end: int
+    distance: int
+
+
+class ApproximateNeedle:
+    """A needle and a limit `k` on the number of edits, along with
+    tables for finding it quickly.
+
+    There is a match for each `end` such that some substring ending just
+    before `end` is within `k` edits of the needle. Its `distance` is
+    the fewest edits of any such substring, and its `start` is the
+    earliest start of a substring with that many edits.
+
+    >>> needle = compile_approximate('survey', 2)
+    >>> needle.index('a surgery was done')
+    Match(start=2, end=7, distance=2)
+    >>> [m.end for m in needle.find_all('a surgery was done')]
+    [7, 8, 9]
+    """
+
+    def __init__(self, needle: Text, k: int) -> None:
+        if k < 0:
+            raise ValueError('k must not be negative')
+        self.needle = needle
+        self.k = k
+        self._forward = _peq(needle)
+        self._backward = _peq(needle[::-1])
+
+    def __repr__(self) -> str:
+        return 'compile_approximate({!r}, {})'.format(self.needle, self.k)
+
+    def index(self, haystack: Text, start: int = 0) -> Optional[Match]:
+        """Returns the first match (from `start` onward) that ends
+        earliest in `haystack`, or None if there isn't one.
+
+        >>> compile_approximate(b'color', 1).index(b'the colour red')
+        Match(start=4, end=8, distance=1)
+        >>> compile_approximate('color', 1).index('the hue')
+        """
+        for match in self.find_all(haystack, start):
+            return match
+        return None
+
+    def find_all(self, haystack: Text, start: int = 0) -> Iterator[Match]:
+        """Generates every match (from `start` onward) in `haystack`, in
+        order of where they end.
+
+        >>> [m.start for m in compile_approximate('aba', 0).find_all('ababa')]
+        [0, 2]
+        """
+        if type(haystack) is not type(self.needle):
+            raise TypeError('needle and haystack must both be str or both '
+                            'be bytes')
+        m = len(self.needle)
+        start = max(start, 0)
+        if m == 0:
+            for i in range(start, len(haystack)):
+                yield Match(i, i, 0)
+            return
+
+        k = self.k
+        peq = self._forward
+        mask = (1 << m) - 1
+        high = 1 << (m - 1)
+        # The column of the table is stored as where it goes up (pv) and
+        # where it goes down (mv); its last entry is `score`.
+        pv = mask
+        mv = 0
+        score = m
+        for j in range(start, len(haystack)):
+            eq = peq.get(haystack[j], 0)
+            xv = eq | mv
+            xh = (((eq & pv) + pv) ^ pv) | eq
+            ph = mv | ~(xh | pv)
+            mh = pv & xh
+            if ph & high:
+                score += 1
+            elif mh & high:
+                score -= 1
+            # The top row of the table is all zeros: a match may start
+            # anywhere.
+            ph <<= 1
+            mh <<= 1
+            pv = (mh | ~(xv | ph)) & mask
+            mv = ph & xv
+            if score <= k:
+                yield self._match_ending(haystack, start, j + 1, score)
+
+    def _match_ending(self, haystack: Text, lo: int, end: int,
+                      distance: int) -> Match:
+        """Finds the earliest start (at or after `lo`) of a substring
+        ending just before `end` that is `distance` edits from the
+        needle."""
+        m = len(self.needle)
+        peq = self._backward
+        mask = (1 << m) - 1
+        high = 1 << (m - 1)
+        pv = mask
+        mv = 0
+        score = m
+        best = end if score == distance else None
+        # A match is at most m + k long.
+        for j in range(end - 1, max(lo, end - m - self.k) - 1, -1):
+            eq = peq.get(haystack[j], 0)
+            xv = eq | mv
+            xh = (((eq & pv) + pv) ^ pv) | eq
+            ph = mv | ~(xh | pv)
+            mh = pv & xh
+            if ph & high:
+                score += 1
+            elif mh & high:
+                score -= 1
+            # The top row of the table counts up: the match must end at
+            # `end`.
+            ph = (ph << 1) | 1
+            mh <<= 1
+            pv = (mh | ~(xv | ph)) & mask
+            mv = ph & xv
+            if score == distance:
+                best = j
+        assert best is not None
+        return Match(best, end, distance)
+
+
+def _peq(needle: Text) -> Dict[Union[str, int], int]:
+    """For each character of `needle`, makes a bit-vector of where it
+    appears.
+
+    >>> sorted(_peq('abca').items())
+    [('a', 9), ('b', 2), ('c', 4)]
+    """
+    peq: Dict[Union[str, int], int] = {}
+    for i, c in enumerate(needle):
+        peq[c] = peq.get(c, 0) | (1 << i)
+    return peq
+
+
+@lru_cache(maxsize=256)
+def compile_approximate(needle: Text, k: int) -> ApproximateNeedle:
+    """Prepares a needle for searching with up to `k` edits. Recently
+    compiled needles are remembered, so compiling the same needle again
+    is cheap."""
+    return ApproximateNeedle(needle, k)
+
+
+def str_index_approx(needle: Text, haystack: Text, k: int) -> Optional[int]:
+    """Like `str_index`, but allows up to `k` edits: returns where the
+    first match starts, or None if there isn't one.
+
+    >>> str_index_approx('recieve', 'please receive this', 2)
+    7
+    """
+    match = compile_approximate(needle, k).index(haystack)
+    return None if match is None else match.start
@@ -1,9 +1,11 @@
 # enables methods to return their own class type:
 from __future__ import annotations
 
-from typing import List, Optional
+import heapq
+from fractions import Fraction
+from typing import Dict, List, Optional, Tuple
 from enum import Enum, auto
-from lib230 import record, Factory
+from lib230 import record, ChangeJournal
 
 
 class WaterType(Enum):
@@ -13,7 +15,7 @@ class WaterType(Enum):
     SALT = auto()
 
 
-@record
+@record(track_changes=True, instrument=True)
 class Fish:
     """Represents a pet fish.
 
@@ -132,10 +134,18 @@ class Aquarium3:
                 + self.fish3.weight_kg) / 3
 
 
-@record
+@record(init=False)
 class Aquarium:
     """An aquarium of any number of fish.
 
+    The aquarium keeps its total weight and a heap of its fish by weight
+    up to date as fish are added, removed or reweighed, so that asking
+    for the heaviest fish or the average weight doesn't look at every
+    fish. Fish should be added and removed with `append` and `remove`.
+    If `all_fish` is changed directly instead, the aquarium notices that
+    its length changed and indexes every fish again, but it doesn't
+    notice a fish replaced by another.
+
     >>> aq = Aquarium()
     >>> aq.append(Fish('A', 10))
     >>> aq.append(Fish('B', 8))
@@ -147,7 +157,29 @@ class Aquarium:
     10
     """
 
-    all_fish: List[Fish] = Factory(list)
+    all_fish: List[Fish]
+    # Invariants, unless all_fish has been changed directly:
+    #  - _order[i] is the sequence number of all_fish[i], and sequence
+    #    numbers increase along all_fish, so smaller means earlier;
+    #  - _live maps the sequence number of each fish to its entry
+    #    (-weight, sequence number, fish) in _heap, which may also hold
+    #    stale entries that are no longer in _live;
+    #  - _positions maps the id of each fish to the sequence numbers of
+    #    its places in all_fish, and _journal watches their weights;
+    #  - _total is the exact sum of the weights in _live, once the
+    #    changes in _journal have been applied. It is a Fraction, as a
+    #    running float total would gather rounding errors.
+
+    # passing init=False to @record above lets us define our own constructor:
+    def __init__(self, all_fish: Optional[List[Fish]] = None) -> None:
+        """Constructs an aquarium holding the fish in `all_fish`, if
+        given.
+
+        >>> Aquarium([Fish('A', 1)]).all_fish[0].name
+        'A'
+        """
+        self.all_fish = [] if all_fish is None else all_fish
+        self._index()
 
     def append(self, fish: Fish) -> None:
         """Adds a new fish to the aquarium
@@ -163,6 +195,29 @@ class Aquarium:
         'B'
         """
         self.all_fish.append(fish)
+        self._add(fish)
+
+    def remove(self, fish: Fish) -> None:
+        """Removes the first fish equal to `fish` from the aquarium, as
+        `list.remove` does; raises ValueError if there isn't one.
+
+        >>> aq = Aquarium([Fish('A', 1), Fish('B', 2), Fish('C', 2)])
+        >>> aq.remove(Fish('B', 2))
+        >>> [f.name for f in aq.all_fish]
+        ['A', 'C']
+        >>> aq.heaviest_fish().name
+        'C'
+        """
+        self._sync()
+        i = self.all_fish.index(fish)
+        removed = self.all_fish.pop(i)
+        seq = self._order.pop(i)
+        self._total -= Fraction(-self._live.pop(seq)[0])
+        positions = self._positions[id(removed)]
+        positions.remove(seq)
+        if not positions:
+            del self._positions[id(removed)]
+            self._journal.unwatch(removed)
 
     def increment_all_ages(self) -> None:
         """Increases the age of every fish in the aquarium by
@@ -179,7 +234,7 @@ class Aquarium:
             fish.increment_age()
 
     def heaviest_fish(self) -> Optional[Fish]:
-        """Finds the heaviest fish, if any.
+        """Finds the heaviest fish, if any. Ties go to the earliest.
 
         >>> aq = Aquarium()
         >>> aq.heaviest_fish()
@@ -192,13 +247,120 @@ class Aquarium:
         >>> aq.append(Fish('C', 15))
         >>> aq.heaviest_fish().name
         'B'
+        >>> aq.all_fish[0].weight_kg = 20
+        >>> aq.heaviest_fish().name
+        'A'
+        """
+        self._sync()
+        heap = self._heap
+        while heap and self._live.get(heap[0][1]) is not heap[0]:
+            heapq.heappop(heap)
+        return heap[0][2] if heap else None
+
+    def heaviest(self, k: int) -> List[Fish]:
+        """Finds the `k` heaviest fish (or all of them, if there are
+        fewer), heaviest first. Ties go to the earliest.
+
+        >>> aq = Aquarium([Fish('A', 5), Fish('B', 9), Fish('C', 5),
+        ...                Fish('D', 7)])
+        >>> [f.name for f in aq.heaviest(3)]
+        ['B', 'D', 'A']
+        >>> [f.name for f in aq.heaviest(10)]
+        ['B', 'D', 'A', 'C']
         """
-        best = None
+        self._sync()
+        heap = self._heap
+        taken = []
+        while heap and len(taken) < k:
+            entry = heapq.heappop(heap)
+            if self._live.get(entry[1]) is entry:
+                taken.append(entry)
+        for entry in taken:
+            heapq.heappush(heap, entry)
+        return [entry[2] for entry in taken]
+
+    def all_heaviest_fish(self) -> List[Fish]:
+        """Finds every fish that is as heavy as the heaviest, earliest
+        first.
+
+        >>> aq = Aquarium([Fish('A', 5), Fish('B', 9), Fish('C', 9)])
+        >>> [f.name for f in aq.all_heaviest_fish()]
+        ['B', 'C']
+        >>> Aquarium().all_heaviest_fish()
+        []
+        """
+        self._sync()
+        heap = self._heap
+        taken: List[Tuple[float, int, Fish]] = []
+        while heap and (not taken or heap[0][0] == taken[0][0]):
+            entry = heapq.heappop(heap)
+            if self._live.get(entry[1]) is entry:
+                taken.append(entry)
+        for entry in taken:
+            heapq.heappush(heap, entry)
+        return [entry[2] for entry in taken]
+
+    def average_weight(self) -> Optional[float]:
+        """Returns the average fish weight, if there are any fish.
+
+        >>> aq = Aquarium([Fish('A', 5), Fish('B', 10)])
+        >>> aq.average_weight()
+        7.5
+        >>> aq.all_fish[1].weight_kg = 20
+        >>> aq.average_weight()
+        12.5
+        >>> Aquarium().average_weight()
+        """
+        self._sync()
+        if not self.all_fish:
+            return None
+        return float(self._total / len(self.all_fish))
+
+    def _index(self) -> None:
+        """Indexes every fish in `all_fish` from scratch."""
+        self._order: List[int] = []
+        self._live: Dict[int, Tuple[float, int, Fish]] = {}
+        self._heap: List[Tuple[float, int, Fish]] = []
+        self._positions: Dict[int, List[int]] = {}
+        self._journal = ChangeJournal(fields=['weight_kg'])
+        self._total = Fraction(0)
         for fish in self.all_fish:
-            if best is None or fish.weight_kg > best.weight_kg:
-                best = fish
-        return best
-
-    # average_weight?
-    # all_heaviest_fish?
-
+            self._add(fish)
+
+    def _add(self, fish: Fish) -> None:
+        """Indexes `fish`, which has just been added to the end of
+        `all_fish`."""
+        seq = self._order[-1] + 1 if self._order else 0
+        self._order.append(seq)
+        self._place(seq, fish, fish.weight_kg)
+        if id(fish) not in self._positions:
+            self._positions[id(fish)] = []
+            self._journal.watch(fish)
+        self._positions[id(fish)].append(seq)
+
+    def _place(self, seq: int, fish: Fish, weight: float) -> None:
+        """Makes `weight` the weight of the fish with sequence number
+        `seq`, which may be new."""
+        entry = (-weight, seq, fish)
+        old = self._live.get(seq)
+        if old is not None:
+            self._total -= Fraction(-old[0])
+        self._live[seq] = entry
+        self._total += Fraction(weight)
+        heapq.heappush(self._heap, entry)
+
+    def _sync(self) -> None:
+        """Catches up with the fish that have been reweighed, or with
+        `all_fish` if it has been changed directly."""
+        if len(self.all_fish) != len(self._order):
+            self._index()
+            return
+        for change in self._journal.take():
+            for seq in self._positions.get(id(change.record), []):
+                fish = self._live[seq][2]
+                if fish is change.record:
+                    self._place(seq, fish, change.new)
+        # Rebuild the heap once most of it is stale.
+        if len(self._heap) > 2 * len(self._live) + 16:
+            self._heap = list(self._live.values())
+            heapq.heapify(self._heap)
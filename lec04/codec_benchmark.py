@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+
+"""Compares the `lib230` record files with `pickle`.
+
+Run it as `python3 codec_benchmark.py [--count N]`. It encodes and
+decodes N `MedicalRecord`s (from `data_definitions.py`, with nested
+records, an enum and an optional field) both ways, and reports the
+time for each and the size of the result.
+"""
+
+import argparse
+import gc
+import io
+import pickle
+import random
+import sys
+import time
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from data_definitions import (BloodLipids, BloodPressure, Biometrics,
+                              MedicalRecord, Sex, Vitals)
+from lib230 import RecordReader, decode_records, encode_records
+
+
+def make_records(count: int, seed: int = 230) -> List[MedicalRecord]:
+    """Makes `count` random medical records."""
+    rng = random.Random(seed)
+    sexes = list(Sex)
+    records = []
+    for i in range(count):
+        lipids = None
+        if rng.random() < 0.5:
+            lipids = BloodLipids(rng.uniform(30, 90), rng.uniform(50, 200),
+                                 rng.uniform(50, 300))
+        records.append(MedicalRecord(
+            i, 'patient {}'.format(i),
+            Biometrics(rng.uniform(140, 200), rng.uniform(40, 120),
+                       rng.uniform(0, 100), rng.choice(sexes)),
+            Vitals(BloodPressure(rng.uniform(90, 140), rng.uniform(60, 90)),
+                   rng.uniform(36, 39), rng.randrange(50, 100),
+                   rng.randrange(10, 20)),
+            lipids))
+    return records
+
+
+def _time(action: Callable[[], object]) -> Tuple[float, object]:
+    """Returns the best of three times for `action`, and its result."""
+    best = float('inf')
+    result = None
+    for _ in range(3):
+        gc.collect()
+        start = time.perf_counter()
+        result = action()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def benchmark(count: int) -> List[Tuple[str, float, float, int]]:
+    """Returns, for each format: its name, the seconds to encode and to
+    decode `count` records, and the encoded size in bytes."""
+    records = make_records(count)
+    results = []
+
+    encode_time, data = _time(lambda: pickle.dumps(
+        records, pickle.HIGHEST_PROTOCOL))
+    decode_time, decoded = _time(lambda: pickle.loads(data))
+    assert decoded == records
+    results.append(('pickle', encode_time, decode_time, len(data)))
+
+    def loads_without_gc():
+        gc.disable()
+        try:
+            return pickle.loads(data)
+        finally:
+            gc.enable()
+    decode_time, decoded = _time(loads_without_gc)
+    results.append(('pickle, gc paused', encode_time, decode_time,
+                    len(data)))
+
+    encode_time, data = _time(lambda: encode_records(MedicalRecord, records))
+    decode_time, decoded = _time(lambda: decode_records(MedicalRecord, data))
+    assert decoded == records
+    results.append(('lib230 records', encode_time, decode_time, len(data)))
+
+    decode_time, table = _time(
+        lambda: RecordReader(io.BytesIO(data), MedicalRecord).read_table())
+    assert len(table) == count
+    results.append(('lib230 into a Table', encode_time, decode_time,
+                    len(data)))
+    return results
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--count', type=int, default=100000,
+                        help='how many records to encode and decode')
+    args = parser.parse_args(argv)
+    print('{:<20} {:>10} {:>10} {:>12}'.format('format', 'encode s',
+                                               'decode s', 'bytes'))
+    for name, encode_time, decode_time, size in benchmark(args.count):
+        print('{:<20} {:>10.3f} {:>10.3f} {:>12}'.format(
+            name, encode_time, decode_time, size))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+
+"""Measures how long modules of `record` classes take to import.
+
+Run it as `python3 import_benchmark.py [--runs N] [MODULE ...]`. Each
+import runs in a fresh interpreter, and times only the import of the
+modules (by default `data_definitions`), after `lib230` itself is
+imported. It compares three ways:
+
+  - with the code cache of `lib230` turned off;
+  - cold: with the cache on, but no cache file yet, as on the first run
+    after a class changes;
+  - warm: with the cache file written by an earlier run.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from lib230 import _code_cache_path
+
+
+# The program that each fresh interpreter runs: it prints the seconds
+# taken to import the modules named in its arguments.
+_PROGRAM = '''
+import sys, time
+import lib230
+start = time.perf_counter()
+for name in sys.argv[1:]:
+    __import__(name)
+print(time.perf_counter() - start)
+'''
+
+
+def _run(modules: Sequence[str], env: Dict[str, str]) -> float:
+    """Imports `modules` in a fresh interpreter, and returns the
+    seconds it took."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    output = subprocess.run([sys.executable, '-c', _PROGRAM, *modules],
+                            cwd=here, env=env, check=True,
+                            stdout=subprocess.PIPE,
+                            universal_newlines=True).stdout
+    return float(output)
+
+
+def _clear(modules: Sequence[str]) -> None:
+    """Removes the code cache files of `modules`."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    for name in modules:
+        path = _code_cache_path(os.path.join(here, name + '.py'))
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def benchmark(modules: Sequence[str],
+              runs: int) -> List[Tuple[str, float, float]]:
+    """Returns, for each way of importing `modules`: its name, and the
+    best and median milliseconds of `runs` imports."""
+    env = dict(os.environ)
+    # Let the interpreter write .pyc files (and code cache files), as it
+    # normally would, and start each way with them written.
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    env.pop('LIB230_NO_CODE_CACHE', None)
+    no_cache = dict(env, LIB230_NO_CODE_CACHE='1')
+    _run(modules, no_cache)
+
+    times: Dict[str, List[float]] = {'no cache': [], 'cold': [], 'warm': []}
+    for _ in range(runs):
+        times['no cache'].append(_run(modules, no_cache))
+        _clear(modules)
+        times['cold'].append(_run(modules, env))
+        times['warm'].append(_run(modules, env))
+    return [(name, min(seconds) * 1e3, statistics.median(seconds) * 1e3)
+            for name, seconds in times.items()]
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('modules', nargs='*', default=['data_definitions'],
+                        help='the modules to import')
+    parser.add_argument('--runs', type=int, default=20,
+                        help='how many times to import them each way')
+    args = parser.parse_args(argv)
+    print('{:<10} {:>10} {:>10}'.format('cache', 'best ms', 'median ms'))
+    for name, best, median in benchmark(args.modules, args.runs):
+        print('{:<10} {:>10.2f} {:>10.2f}'.format(name, best, median))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
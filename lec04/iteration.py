@@ -11,6 +11,8 @@ This file demonstates two design strategies:
 from typing import Optional
 from typing import Callable, Iterable
 
+from needle import compile_needle
+
 
 # "Helper function" for str_index. The idea is to move some of the work
 # out into a smaller function that we can understand more easily and
@@ -38,11 +40,12 @@ def str_index(needle: str, haystack: str) -> Optional[int]:
     >>> str_index('g', 'apple')
     >>> str_index('pl', 'apple')
     2
+
+    This used to try `_matches_at` at every index of `haystack`, which
+    is slow for long needles. Now it uses `compile_needle` (see
+    `needle.py`), which studies the needle once and then skips ahead.
     """
-    for i in range(len(haystack)):
-        if _matches_at(needle, haystack, i):
-            return i
-    return None
+    return compile_needle(needle).index(haystack)
 
 
 def find_satisfies(haystack: Iterable[int],
@@ -1,11 +1,2294 @@
+"""Helpers for defining records: classes that are mostly a bundle of
+annotated fields.
+
+`@record` is the `attr.s` decorator from the attrs library, with
+`auto_attribs=True` so that the fields come from the class's annotations.
+Other attrs options may be passed too, as in `@record(init=False)`.
+
+By default each record stores its fields in a per-instance dictionary.
+When there are millions of instances, that dictionary is most of their
+memory, so `record` has options to make them smaller and quicker:
+
+  - `slots=True` stores the fields in fixed slots instead, which takes
+    about half the memory, but means no other attributes can be added;
+
+  - `frozen=True` makes the fields read-only, so instances are
+    immutable values that can be hashed. With `cache_hash=True` too,
+    each instance computes its hash once and keeps it, at the cost of
+    one more field's memory;
+
+  - frozen records also get a `from_tuple` class method, which builds an
+    instance from a tuple of every field's value in order, storing them
+    straight into the new instance and skipping defaults, converters
+    and validators, so it suits trusted data, such as rows read from a
+    file. Only with `slots=True` is it quicker than the constructor,
+    which has to get around the frozen check for each field. Other
+    records are built by storing into the instance dictionary either
+    way, and `from_tuple` is then a little slower;
+
+  - frozen records can also be *interned* with `intern=True`: making a
+    value equal to one that already exists gives back the existing
+    instance instead, so there is only one copy of each value, and
+    equal values are usually the same object;
+
+  - records that aren't frozen can *track changes* with
+    `track_changes=True`: each instance remembers which of its fields
+    have been assigned since it was made (or last marked clean), and a
+    `ChangeJournal` lists every change to the records it watches, so
+    that whatever is worked out from them can be brought up to date
+    without looking at every record again.
+
+See `lec04/record_benchmark.py` for a comparison of the options.
+
+A list of records keeps each record as a separate object, so adding up
+one field means following a pointer per record. A `Table` stores the
+records of one class column by column instead, with `int`, `float` and
+`bool` fields packed into typed arrays, so that sums, extremes and
+filters over a column run as tight loops over packed numbers. Every
+record class gets a `Table` companion: `Fish.Table(fish_list)` is the
+same as `Table(Fish, fish_list)`.
+
+Records can also be saved compactly in binary. `RecordWriter` and
+`RecordReader` write and read a file of records of one class, a block
+at a time, using an encoding worked out from the field types: `int`,
+`float`, `bool`, `str`, `bytes`, enums, other records, and `Optional`
+and `List` of those. Each block is stored column by column, so a whole
+column is packed or unpacked at once, and a file can be read straight
+into a `Table`. See `lec04/codec_benchmark.py` for a comparison with
+`pickle`.
+
+Sending a big collection of records to other processes, say to a
+process pool, pickles all of it for each of them. A `SharedTable` puts
+the columns in shared memory instead, once, and other processes attach
+to it by name and read the columns where they are.
+
+To see where the time goes, a record defined with `instrument=True`
+counts its live instances, and counts and times the calls to each of
+its methods; `@instrumented` does the same for any function. This only
+happens once instrumentation is turned on, by `enable_instrumentation()`
+or the environment variable LIB230_INSTRUMENT, before the classes and
+functions are defined; otherwise they are left exactly as they are. The
+results can be exported as JSON or in the Prometheus text format.
+
+attrs generates and compiles the methods of each record class when it
+is defined, which slows down importing a module with many records. So
+`record` caches the compiled code between runs, next to the module's
+.pyc file, and generates `from_tuple` only when it is first used.
+"""
+
+from array import array
+import atexit
+from bisect import bisect_left
+from contextlib import contextmanager
+from enum import Enum
+from functools import partial, wraps
+import gc
+import importlib.util
+from itertools import accumulate, compress
+import io
+import marshal
+from operator import attrgetter
+import os
+import struct
+import sys
+import threading
+from time import perf_counter
+import types
+from typing import (Any, BinaryIO, Callable, Dict, Generic, Iterable,
+                    Iterator, List, NamedTuple, Optional, Set, Tuple, Type,
+                    TypeVar, Union)
+import typing
+import weakref
+
 import attr
 
 
-def record(*args, **kwargs):
-    if 'auto_attribs' in kwargs:
-        return attr.s(*args, **kwargs)
-    else:
-        return attr.s(*args, auto_attribs=True, **kwargs)
+def record(maybe_cls: Optional[type] = None, *, slots: bool = False,
+           frozen: bool = False, cache_hash: bool = False,
+           intern: Union[bool, int] = False, track_changes: bool = False,
+           instrument: bool = False, **kwargs: Any) -> Any:
+    """Defines a record class, either as `@record` or `@record(...)`.
+
+    >>> @record(slots=True, frozen=True)
+    ... class Point:
+    ...     x: int
+    ...     y: int = 0
+    >>> p = Point(3)
+    >>> p
+    Point(x=3, y=0)
+    >>> p == Point.from_tuple((3, 0))
+    True
+    >>> hash(p) == hash(Point(3, 0))
+    True
+    >>> p.x = 4
+    Traceback (most recent call last):
+    ...
+    attr.exceptions.FrozenInstanceError
+    """
+    kwargs.setdefault('auto_attribs', True)
+    weakly_referenced = not slots or kwargs.get('weakref_slot', True)
+    if intern is not False and not (frozen and weakly_referenced):
+        raise ValueError('only frozen records that can be weakly '
+                         'referenced can be interned')
+    if track_changes and (frozen or not weakly_referenced):
+        raise ValueError('only records that can change, and can be '
+                         'weakly referenced, can track changes')
+
+    def wrap(cls: type) -> type:
+        methods = None
+        if instrument and _INSTRUMENTATION.on:
+            methods = _own_methods(cls)
+        with _code_cache_for(cls.__module__):
+            cls = attr.s(cls, slots=slots, frozen=frozen,
+                         cache_hash=cache_hash, **kwargs)
+        if frozen:
+            cls.from_tuple = _LazyTupleConstructor(cls)
+        if 'Table' not in cls.__dict__:
+            cls.Table = _TableCompanion()
+        if methods is not None:
+            _instrument_class(cls, methods)
+        if intern is not False:
+            _intern_class(cls, _INTERN_KEEP if intern is True else intern)
+        if track_changes:
+            _track_changes(cls)
+        return cls
+
+    if maybe_cls is None:
+        return wrap
+    return wrap(maybe_cls)
 
 
 Factory = attr.Factory
+
+
+# Where attrs keeps a cached hash.
+_HASH_CACHE_FIELD = getattr(attr._make, '_hash_cache_field',
+                            '_attrs_cached_hash')
+
+
+class _LazyTupleConstructor:
+    """Stands in for the `from_tuple` class method of the record class
+    `cls` until it is first used, and then generates it, so that classes
+    that never use it don't pay for it at import."""
+
+    def __init__(self, cls: type) -> None:
+        self.cls = cls
+
+    def __get__(self, instance: Any, owner: type) -> Callable:
+        from_tuple = classmethod(_tuple_constructor(self.cls))
+        setattr(self.cls, 'from_tuple', from_tuple)
+        return from_tuple.__get__(instance, owner)
+
+
+def _tuple_constructor(cls: type) -> Callable:
+    """Generates a function that builds an instance of the record class
+    `cls` from a tuple of its field values. It stores the fields
+    straight into the instance, skipping the argument handling of
+    `__init__` (and any frozen check in `__setattr__`)."""
+    n = len(attr.fields(cls))
+    namespace, params, body = _field_stores(cls, '    ')
+    lines = ['def from_tuple(cls, values):',
+             '    try:',
+             '        ({}) = values'.format(''.join(p + ', ' for p in params)),
+             '    except ValueError:',
+             '        raise TypeError("expected {} values") from None'
+             .format(n),
+             '    self = _new(cls)']
+    lines += body
+    lines.append('    return {}'.format(_canonical(cls, namespace, 'self')))
+    from_tuple = _compile(lines, 'from_tuple', cls, namespace)
+    from_tuple.__doc__ = ("Builds an instance from a tuple of every "
+                          "field's value, in order, without checking them.")
+    return from_tuple
+
+
+def _columns_constructor(cls: type) -> Callable:
+    """Generates a function that builds a list of instances of the record
+    class `cls` from a column of values for each field, the same way as
+    `_tuple_constructor` but without a call per instance."""
+    namespace, params, body = _field_stores(cls, '        ')
+    namespace['_cls'] = cls
+    lines = ['def from_columns(columns, count):',
+             '    out = []',
+             '    append = out.append']
+    if params:
+        lines.append('    for {} in zip(*columns):'.format(', '.join(params)))
+    else:
+        lines.append('    for _ in range(count):')
+    lines.append('        self = _new(_cls)')
+    lines += body
+    lines += ['        append({})'.format(_canonical(cls, namespace, 'self')),
+              '    return out']
+    return _compile(lines, 'from_columns', cls, namespace)
+
+
+def _field_stores(cls: type, indent: str) -> Tuple[Dict[str, Any], List[str],
+                                                    List[str]]:
+    """Generates the lines of code that store the fields of a new
+    instance `self` of `cls` from locals `_0`, `_1`, …. Returns the
+    globals the lines need, the names of the locals, and the lines."""
+    fields = [a.name for a in attr.fields(cls)]
+    # Locals are numbered, so that no field name can clash with them.
+    params = ['_{}'.format(i) for i in range(len(fields))]
+    assigned = list(zip(fields, params))
+    if _caches_hash(cls):
+        assigned.append((_HASH_CACHE_FIELD, 'None'))
+
+    interner = _INTERNERS.get(cls)
+    namespace: Dict[str, Any] = {
+        '_new': cls.__new__ if interner is None else interner.allocate,
+    }
+    lines = []
+    # Ordinary assignment is quickest, but only if `cls` doesn't change
+    # what assignment does.
+    plain = cls.__setattr__ is object.__setattr__
+    have_dict = False
+    for i, (name, value) in enumerate(assigned):
+        slot = cls.__dict__.get(name)
+        if plain:
+            lines.append('{}self.{} = {}'.format(indent, name, value))
+        elif isinstance(slot, types.MemberDescriptorType):
+            namespace['_set_{}'.format(i)] = slot.__set__
+            lines.append('{}_set_{}(self, {})'.format(indent, i, value))
+        else:
+            if not have_dict:
+                lines.append('{}_dict = self.__dict__'.format(indent))
+                have_dict = True
+            lines.append('{}_dict[{!r}] = {}'.format(indent, name, value))
+    return namespace, params, lines
+
+
+def _canonical(cls: type, namespace: Dict[str, Any], name: str) -> str:
+    """Returns an expression for the canonical instance equal to the
+    new instance of `cls` in the local `name`, adding what it needs to
+    `namespace`."""
+    interner = _INTERNERS.get(cls)
+    if interner is None:
+        return name
+    namespace['_canonical'] = interner.canonical
+    return '_canonical({})'.format(name)
+
+
+def _compile(lines: List[str], name: str, cls: type,
+             namespace: Dict[str, Any]) -> Callable:
+    """Compiles the generated function `name` for the class `cls`."""
+    source = '\n'.join(lines)
+    filename = '<{} of {}>'.format(name, cls.__qualname__)
+    cache = _code_cache(cls.__module__)
+    if cache is None:
+        code = compile(source, filename, 'exec')
+    else:
+        with _compile_lock:
+            code = cache.compile(source, filename, 'exec')
+    exec(code, namespace)
+    return namespace[name]
+
+
+def _caches_hash(cls: type) -> bool:
+    """Tells whether attrs generated a caching `__hash__` for `cls`."""
+    code = getattr(cls.__hash__, '__code__', None)
+    return code is not None and _HASH_CACHE_FIELD in code.co_names
+
+
+# How many recently interned values an interned record class keeps alive
+# by default, so that a value that is made and dropped over and over is
+# still only made once.
+_INTERN_KEEP = 1024
+
+
+class _Interner:
+    """The canonical instances of the interned record class `cls`.
+
+    They are kept in a table keyed by their exact field values (see
+    `_intern_key`), which only holds them weakly, so a value is
+    forgotten once nothing else uses it. But the values used by the last
+    `keep` constructions are also held strongly, so that a value that is
+    made and dropped over and over is still found again."""
+
+    def __init__(self, cls: type, keep: int) -> None:
+        # Makes a new, uninitialized instance.
+        self.allocate = cls.__new__
+        self.names = [a.name for a in attr.fields(cls)]
+        self.key = _intern_key(cls, self.names)
+        # As in a `WeakValueDictionary`, but without its method calls.
+        self.refs: Dict[Any, weakref.KeyedRef] = {}
+        self.recent: List[Any] = [None] * keep
+        self.next_recent = 0
+
+        refs = self.refs
+
+        def forget(ref: weakref.KeyedRef) -> None:
+            if refs.get(ref.key) is ref:
+                del refs[ref.key]
+        self.forget = forget
+
+    def __len__(self) -> int:
+        return len(self.refs)
+
+    def canonical(self, instance: Any) -> Any:
+        """Returns the canonical instance equal to the new `instance`,
+        which becomes canonical if there isn't one yet. An instance with
+        an unhashable field can't be interned, and is returned as is.
+        (If two threads make the same value at once, each may get its
+        own instance; they are still equal.)"""
+        key = self.key(instance)
+        try:
+            ref = self.refs.get(key)
+        except TypeError:
+            return instance
+        found = None if ref is None else ref()
+        if found is None:
+            self.refs[key] = weakref.KeyedRef(instance, self.forget, key)
+            found = instance
+        if self.recent:
+            self.recent[self.next_recent] = found
+            self.next_recent = (self.next_recent + 1) % len(self.recent)
+        return found
+
+
+def _intern_key(cls: type, names: List[str]) -> Callable[[Any], Any]:
+    """Generates a function that returns a key for the field values of
+    an instance of `cls` that is only equal to the key of exactly the
+    same values. Equal values of different types, such as 1 and 1.0, get
+    different keys, and so do floats (and complex numbers) with
+    different bits, such as 0.0 and -0.0.
+
+    >>> @record(frozen=True)
+    ... class Number:
+    ...     x: float
+    >>> key = _intern_key(Number, ['x'])
+    >>> key(Number(1)) == key(Number(1.0)), key(Number(1)) == key(Number(1))
+    (False, True)
+    >>> key(Number(0.0)) == key(Number(-0.0))
+    False
+    """
+    lines = ['def key(self):']
+    for i, name in enumerate(names):
+        lines += ['    _{} = self.{}'.format(i, name),
+                  '    _t{0} = _{0}.__class__'.format(i)]
+    # Nonzero floats that are equal have the same bits, so only zeros
+    # (and complex numbers) need their bits in the key.
+    lines.append('    return ({})'.format(''.join(
+        '_t{0}, _{0} if _{0} and _t{0} is not complex or '
+        '_t{0} not in _inexact else _exact(_{0}), '
+        .format(i) for i in range(len(names)))))
+    namespace = {'_inexact': {float, complex}, '_exact': _exact}
+    return _compile(lines, 'key', cls, namespace)
+
+
+def _exact(value: Any) -> Any:
+    """Returns the exact bits of a float or complex `value`."""
+    if type(value) is float:
+        return value.hex()
+    return value.real.hex(), value.imag.hex()
+
+
+# The interner for each interned record class.
+_INTERNERS: 'weakref.WeakKeyDictionary[type, _Interner]' = \
+    weakref.WeakKeyDictionary()
+
+
+def _intern_class(cls: type, keep: int) -> None:
+    """Makes the constructor of the frozen record class `cls` return
+    canonical instances. The constructor still runs `__init__` on a new
+    instance, so that defaults, converters and validators work as
+    usual, and then looks for an equal instance that already exists.
+    Subclasses of `cls` aren't interned.
+
+    >>> @record(frozen=True, intern=True)
+    ... class IntPair:
+    ...     a: int
+    ...     b: int
+    >>> IntPair(3, 4) is IntPair(3, 4)
+    True
+    >>> IntPair.from_tuple((3, 4)) is IntPair(3, b=4)
+    True
+    """
+    interner = _INTERNERS[cls] = _Interner(cls, keep)
+    allocate = interner.allocate
+    canonical = interner.canonical
+    init = cls.__init__
+
+    def __new__(klass: type, *args: Any, **kwargs: Any) -> Any:
+        self = allocate(klass)
+        if klass is not cls:
+            return self
+        init(self, *args, **kwargs)
+        return canonical(self)
+
+    def __init__(self: Any, *args: Any, **kwargs: Any) -> None:
+        # Instances of `cls` were initialized by `__new__`.
+        if type(self) is not cls:
+            init(self, *args, **kwargs)
+
+    def __reduce_ex__(self: Any, protocol: int) -> Any:
+        # Unpickling and copying intern as well.
+        if type(self) is not cls:
+            return object.__reduce_ex__(self, protocol)
+        return _reintern, (cls, tuple(getattr(self, name)
+                                      for name in interner.names))
+
+    cls.__new__ = staticmethod(__new__)  # type: ignore
+    cls.__init__ = __init__  # type: ignore
+    cls.__eq__ = _identity_eq(cls)  # type: ignore
+    cls.__reduce_ex__ = __reduce_ex__  # type: ignore
+
+
+def _identity_eq(cls: type) -> Callable[[Any, Any], Any]:
+    """Returns an `__eq__` for the interned record class `cls` that is
+    quick for the same instance, which equal values usually are. If
+    attrs generated `cls.__eq__`, it generates one like it; otherwise it
+    wraps the one that `cls` has."""
+    eq = cls.__eq__
+    code = getattr(eq, '__code__', None)
+    fields = [a for a in attr.fields(cls)
+              if getattr(a, 'eq', getattr(a, 'cmp', True))]
+    if (code is None or not code.co_filename.startswith('<attrs generated')
+            or any(getattr(a, 'eq_key', None) for a in fields)):
+        def __eq__(self: Any, other: Any) -> Any:
+            return self is other or eq(self, other)
+        return __eq__
+
+    lines = ['def __eq__(self, other):',
+             '    if self is other:',
+             '        return True',
+             '    if other.__class__ is not self.__class__:',
+             '        return NotImplemented',
+             '    return ({}) == ({})'.format(
+                 ''.join('self.{}, '.format(a.name) for a in fields),
+                 ''.join('other.{}, '.format(a.name) for a in fields))]
+    return _compile(lines, '__eq__', cls, {})
+
+
+def _reintern(cls: type, values: Tuple[Any, ...]) -> Any:
+    """Unpickles an instance of the interned record class `cls`."""
+    return cls.from_tuple(values)
+
+
+class Change(NamedTuple):
+    """An assignment of `new` to the field `field` of the record
+    `record`, which was `old` before."""
+    record: Any
+    field: str
+    old: Any
+    new: Any
+
+
+class ChangeJournal:
+    """Lists the changes to the fields of the records it watches, in the
+    order they happen, until they are taken. The records must be of
+    classes that track changes. If `fields` is given, the journal lists
+    only the changes to the fields it names. A journal doesn't keep the
+    records it watches alive.
+
+    >>> @record(track_changes=True)
+    ... class Fish:
+    ...     name: str
+    ...     weight_kg: float
+    >>> nemo, dory = Fish('Nemo', 1.0), Fish('Dory', 2.0)
+    >>> journal = ChangeJournal([nemo, dory])
+    >>> dory.weight_kg = 2.5
+    >>> nemo.name = 'Marlin'
+    >>> [(c.record.name, c.field, c.old, c.new) for c in journal.take()]
+    [('Dory', 'weight_kg', 2.0, 2.5), ('Marlin', 'name', 'Nemo', 'Marlin')]
+    >>> len(journal)
+    0
+    >>> weights = ChangeJournal([nemo], fields=['weight_kg'])
+    >>> nemo.name, nemo.weight_kg = 'Nemo', 1.5
+    >>> [(c.field, c.new) for c in weights.take()]
+    [('weight_kg', 1.5)]
+    """
+
+    def __init__(self, records: Iterable[Any] = (),
+                 fields: Optional[Iterable[str]] = None) -> None:
+        self._changes: List[Change] = []
+        self._fields = None if fields is None else frozenset(fields)
+        for item in records:
+            self.watch(item)
+
+    def __len__(self) -> int:
+        """Returns the number of changes not yet taken."""
+        return len(self._changes)
+
+    def watch(self, item: Any) -> None:
+        """Starts listing the changes to `item`."""
+        tracking = _tracking(item)
+        if self not in (ref() for ref in tracking.journals):
+            tracking.journals.append(weakref.ref(self))
+
+    def unwatch(self, item: Any) -> None:
+        """Stops listing the changes to `item`."""
+        tracking = _TRACKING.get(id(item))
+        if tracking is not None:
+            tracking.journals = [ref for ref in tracking.journals
+                                 if ref() is not self]
+            tracking.forget_if_unused()
+
+    def take(self) -> List[Change]:
+        """Returns the changes listed so far, and forgets them."""
+        changes, self._changes = self._changes, []
+        return changes
+
+
+def dirty_fields(item: Any) -> Set[str]:
+    """Returns the names of the fields of `item`, whose class tracks
+    changes, that have been assigned since it was made or last marked
+    clean.
+
+    >>> @record(slots=True, track_changes=True)
+    ... class Employee:
+    ...     name: str
+    ...     wage: int
+    >>> alice = Employee('Alice', 1000)
+    >>> dirty_fields(alice)
+    set()
+    >>> alice.wage = 1200
+    >>> dirty_fields(alice)
+    {'wage'}
+    >>> mark_clean(alice)
+    >>> dirty_fields(alice)
+    set()
+    """
+    tracking = _TRACKING.get(id(item))
+    return set() if tracking is None else set(tracking.dirty)
+
+
+def mark_clean(item: Any) -> None:
+    """Forgets which fields of `item` have been assigned."""
+    tracking = _TRACKING.get(id(item))
+    if tracking is not None:
+        tracking.dirty.clear()
+        tracking.forget_if_unused()
+
+
+class _Tracking:
+    """The dirty fields of one record whose class tracks changes, and the
+    journals watching it. Only records that are dirty or watched have
+    one, so clean records cost nothing."""
+
+    def __init__(self, item: Any) -> None:
+        key = id(item)
+        self.key = key
+        # Forgets the record when it is freed, before its id can be
+        # reused.
+        self.ref = weakref.ref(item, lambda ref: _TRACKING.pop(key, None))
+        self.dirty: Set[str] = set()
+        # Weak references to the journals.
+        self.journals: List['weakref.ref[ChangeJournal]'] = []
+
+    def forget_if_unused(self) -> None:
+        if not self.dirty and not self.journals:
+            _TRACKING.pop(self.key, None)
+
+    def log(self, item: Any, field: str, old: Any, new: Any) -> None:
+        """Adds a change to every journal still watching that lists
+        changes to `field`."""
+        dead = False
+        change = None
+        for ref in self.journals:
+            journal = ref()
+            if journal is None:
+                dead = True
+            elif journal._fields is None or field in journal._fields:
+                if change is None:
+                    change = Change(item, field, old, new)
+                journal._changes.append(change)
+        if dead:
+            self.journals = [ref for ref in self.journals
+                             if ref() is not None]
+
+
+# The tracking of each record that is dirty or watched, by its id.
+_TRACKING: Dict[int, _Tracking] = {}
+
+
+def _tracking(item: Any) -> _Tracking:
+    """Returns the tracking of a record, starting it if need be."""
+    tracking = _TRACKING.get(id(item))
+    if tracking is None:
+        if type(item) not in _CHANGE_TRACKED:
+            raise TypeError('{} doesn\'t track changes'
+                            .format(type(item).__qualname__))
+        tracking = _TRACKING[id(item)] = _Tracking(item)
+    return tracking
+
+
+# The record classes that track changes.
+_CHANGE_TRACKED: 'weakref.WeakSet[type]' = weakref.WeakSet()
+
+
+class _Initializing(threading.local):
+    """The records being initialized in each thread, innermost last.
+    Their fields are being assigned for the first time, which doesn't
+    count as a change."""
+
+    def __init__(self) -> None:
+        self.stack: List[Any] = []
+
+
+_initializing = _Initializing()
+
+
+def _track_changes(cls: type) -> None:
+    """Makes assignments to the fields of instances of the record class
+    `cls` (but not of its subclasses) mark them dirty and go in the
+    journals watching them, except during `__init__`."""
+    fields = frozenset(a.name for a in attr.fields(cls))
+    setattr_ = cls.__setattr__
+    init = cls.__init__
+
+    def __init__(self: Any, *args: Any, **kwargs: Any) -> None:
+        stack = _initializing.stack
+        stack.append(self)
+        try:
+            init(self, *args, **kwargs)
+        finally:
+            stack.pop()
+
+    def __setattr__(self: Any, name: str, value: Any) -> None:
+        if name not in fields or type(self) is not cls:
+            setattr_(self, name, value)
+            return
+        stack = _initializing.stack
+        if stack and stack[-1] is self:
+            setattr_(self, name, value)
+            return
+        tracking = _TRACKING.get(id(self))
+        if tracking is None:
+            tracking = _tracking(self)
+        if tracking.journals:
+            old = getattr(self, name)
+            setattr_(self, name, value)
+            tracking.log(self, name, old, value)
+        else:
+            setattr_(self, name, value)
+        tracking.dirty.add(name)
+
+    cls.__init__ = __init__  # type: ignore
+    cls.__setattr__ = __setattr__  # type: ignore
+    _CHANGE_TRACKED.add(cls)
+
+
+# Generating the methods of a record class is quick, but compiling them
+# is not: in a module with a dozen records, it is about half of the time
+# to import it. So the compiled code is cached between runs, much like a
+# module's own bytecode: in a file next to the module's .pyc file,
+# keyed by the generated source. Set the environment variable
+# LIB230_NO_CODE_CACHE to turn the cache off.
+# See `lec04/import_benchmark.py` for the difference it makes.
+
+# The end of the name of a code cache file, in place of '.pyc'.
+_CODE_CACHE_SUFFIX = '.lib230'
+
+# Identifies what made a code cache file: its code can only be used by
+# the same Python bytecode and attrs version.
+_CODE_CACHE_TAG = (importlib.util.MAGIC_NUMBER, attr.__version__)
+
+# The code cache for each module, or None if it can't have one.
+_CODE_CACHES: Dict[str, Optional['_CodeCache']] = {}
+
+# Held while compiling through a code cache. attrs looks up `compile` in
+# its own module, so while it is replaced there, nothing else may use it.
+_compile_lock = threading.RLock()
+
+
+class _CodeCache:
+    """The compiled code generated for the record classes of one module,
+    stored in the file `path`.
+
+    A cache file holds the Python and attrs versions that made it, and a
+    dict from (source, filename, mode) to the code compiled from them. A
+    changed class just has different source, so it misses. When new code
+    is compiled, the file is written again at exit, with only the code
+    that was used, so code for classes that have changed is dropped."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.codes = self._load()
+        self.used: Dict[Tuple[str, str, str], types.CodeType] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def compile(self, source: str, filename: str, mode: str, *args: Any,
+                **kwargs: Any) -> types.CodeType:
+        """Acts like the builtin `compile`, but returns cached code if
+        there is any."""
+        if args or kwargs:
+            return compile(source, filename, mode, *args, **kwargs)
+        key = (source, filename, mode)
+        code = self.codes.get(key)
+        if code is None:
+            code = compile(source, filename, mode)
+            self.codes[key] = code
+            self.misses += 1
+        else:
+            self.hits += 1
+        self.used[key] = code
+        return code
+
+    def _load(self) -> Dict[Tuple[str, str, str], types.CodeType]:
+        """Reads the cache file, if it exists and is usable."""
+        try:
+            with open(self.path, 'rb') as file:
+                tag, codes = marshal.loads(file.read())
+        except (OSError, EOFError, ValueError, TypeError):
+            return {}
+        return codes if tag == _CODE_CACHE_TAG else {}
+
+    def save(self) -> None:
+        """Writes the cache file, if any code had to be compiled. As with
+        .pyc files, failing to write it is not an error."""
+        if not self.misses or sys.dont_write_bytecode:
+            return
+        temporary = '{}.{}'.format(self.path, os.getpid())
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(temporary, 'wb') as file:
+                file.write(marshal.dumps((_CODE_CACHE_TAG, self.used)))
+            os.replace(temporary, self.path)
+        except OSError:
+            return
+        self.misses = 0
+
+
+def _code_cache_path(source_path: str) -> str:
+    """Returns where the code cache for the module in the file
+    `source_path` goes.
+
+    >>> _code_cache_path('/src/fish.py').replace(sys.implementation.cache_tag,
+    ...                                          'TAG')
+    '/src/__pycache__/fish.TAG.lib230'
+    """
+    cached = importlib.util.cache_from_source(source_path)
+    return os.path.splitext(cached)[0] + _CODE_CACHE_SUFFIX
+
+
+def _code_cache(module_name: str) -> Optional[_CodeCache]:
+    """Returns the code cache for a module, or None if it has no source
+    file (or the cache is turned off)."""
+    try:
+        return _CODE_CACHES[module_name]
+    except KeyError:
+        pass
+    cache = None
+    module = sys.modules.get(module_name)
+    path = getattr(module, '__file__', None)
+    if (path and path.endswith('.py')
+            and not os.environ.get('LIB230_NO_CODE_CACHE')):
+        cache = _CodeCache(_code_cache_path(path))
+        if not _CODE_CACHES:
+            atexit.register(_save_code_caches)
+    _CODE_CACHES[module_name] = cache
+    return cache
+
+
+def _save_code_caches() -> None:
+    """Writes every code cache that has new code."""
+    for cache in list(_CODE_CACHES.values()):
+        if cache is not None:
+            cache.save()
+
+
+@contextmanager
+def _code_cache_for(module_name: str) -> Iterator[None]:
+    """While attrs generates a class in the module `module_name`, makes
+    it compile through the module's code cache."""
+    cache = _code_cache(module_name)
+    if cache is None:
+        yield
+        return
+    namespace = vars(attr._make)
+    with _compile_lock:
+        previous = namespace.get('compile')
+        namespace['compile'] = cache.compile
+        try:
+            yield
+        finally:
+            if previous is None:
+                del namespace['compile']
+            else:
+                namespace['compile'] = previous
+
+
+T = TypeVar('T')
+
+# The array typecode for each field type that can be packed.
+_TYPECODES = {int: 'q', float: 'd', bool: 'B'}
+
+# A column: a typed array, or a list for anything else.
+Column = Union[array, List[Any]]
+
+
+class Table(Generic[T]):
+    """Records of one record class, stored column by column.
+
+    Indexing or iterating gives *row views*: objects of the record class
+    (with all of its methods) whose fields read and write the table. A
+    packed column converts what is stored in it: an `int` stored in a
+    `float` column comes back as a `float`. If a value can't be packed,
+    such as a `float` in an `int` column, the column becomes a list.
+
+    >>> @record
+    ... class Fish:
+    ...     name: str
+    ...     weight_kg: float
+    ...     age_days: int = 0
+    ...     def increment_age(self) -> None:
+    ...         self.age_days += 1
+    >>> tank = Fish.Table([Fish('A', 10), Fish('B', 8), Fish('C', 10)])
+    >>> tank.column('weight_kg')
+    array('d', [10.0, 8.0, 10.0])
+    >>> tank.sum('weight_kg'), tank.argmax('weight_kg')
+    (28.0, 0)
+    >>> tank[1].increment_age()
+    >>> tank[1]
+    Fish(name='B', weight_kg=8.0, age_days=1)
+    >>> [f.name for f in tank.where('weight_kg', lambda w: w > 9)]
+    ['A', 'C']
+    """
+
+    def __init__(self, record_class: Type[T], rows: Iterable[T] = ()) -> None:
+        self.record_class = record_class
+        types = _field_types(record_class)
+        self._columns: Dict[str, Column] = {}
+        for name in (a.name for a in attr.fields(record_class)):
+            typecode = _TYPECODES.get(types.get(name))
+            self._columns[name] = array(typecode) if typecode else []
+        self._length = 0
+        self._view = _view_class(record_class)
+        self.extend(rows)
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, index: Union[int, slice]) -> Any:
+        """Returns a row view for an int index, or a new table of the
+        selected rows for a slice."""
+        if isinstance(index, slice):
+            table = self._empty_like()
+            for name, column in self._columns.items():
+                table._columns[name] = column[index]
+            table._length = len(range(self._length)[index])
+            return table
+        return self._view(self, self._check_index(index))
+
+    def __setitem__(self, index: int, row: T) -> None:
+        """Replaces the row at `index` with the fields of `row`."""
+        index = self._check_index(index)
+        for name, column in self._columns.items():
+            value = getattr(row, name)
+            try:
+                column[index] = value
+            except (TypeError, OverflowError):
+                column = self._unpack(name)
+                column[index] = value
+
+    def __iter__(self) -> Iterator[T]:
+        for index in range(self._length):
+            yield self._view(self, index)
+
+    def __repr__(self) -> str:
+        return 'Table({}, <{} rows>)'.format(self.record_class.__qualname__,
+                                            self._length)
+
+    def append(self, row: T) -> None:
+        """Adds a row with the fields of `row`."""
+        for name, column in self._columns.items():
+            value = getattr(row, name)
+            try:
+                column.append(value)
+            except (TypeError, OverflowError):
+                self._unpack(name).append(value)
+        self._length += 1
+
+    def extend(self, rows: Iterable[T]) -> None:
+        """Adds a row for each of `rows`, a column at a time."""
+        rows = list(rows)
+        for name, column in self._columns.items():
+            values = [getattr(row, name) for row in rows]
+            if isinstance(column, array):
+                try:
+                    # Pack first, so nothing is added if packing fails.
+                    values = array(column.typecode, values)
+                except (TypeError, OverflowError):
+                    column = self._unpack(name)
+            column.extend(values)
+        self._length += len(rows)
+
+    def record(self, index: int) -> T:
+        """Copies the row at `index` out into a record of its own."""
+        index = self._check_index(index)
+        return _record_builder(self.record_class)(
+            tuple(getattr(self._view(self, index), name)
+                  for name in self._columns))
+
+    def column(self, name: str) -> Column:
+        """Returns the column for a field: an `array` if it is packed, or
+        else a list. Don't change its length."""
+        return self._columns[name]
+
+    def to_numpy(self, name: str) -> Any:
+        """Returns the column for a field as a NumPy array. A packed column
+        is shared, not copied. Needs NumPy."""
+        import numpy as np
+        column = self._columns[name]
+        typecode = _typecode(column)
+        if typecode is not None:
+            dtype = bool if typecode == 'B' else typecode
+            return np.frombuffer(column, dtype=np.dtype(dtype)) \
+                if len(column) else np.empty(0, dtype=dtype)
+        return np.array(list(column), dtype=object)
+
+    def sum(self, name: str) -> Any:
+        """Adds up a column."""
+        return sum(self._columns[name])
+
+    def mean(self, name: str) -> float:
+        """Averages a column; the table must not be empty."""
+        if not self._length:
+            raise ValueError('mean of an empty table')
+        return sum(self._columns[name]) / self._length
+
+    def min(self, name: str) -> Any:
+        """Finds the smallest value in a column."""
+        return min(self._columns[name])
+
+    def max(self, name: str) -> Any:
+        """Finds the largest value in a column."""
+        return max(self._columns[name])
+
+    def argmax(self, name: str) -> Optional[int]:
+        """Finds the index of the first row with the largest value in a
+        column, or None if the table is empty."""
+        column = self._columns[name]
+        if not column:
+            return None
+        return column.index(max(column))
+
+    def where(self, name: str, predicate: Callable[[Any], bool]) -> 'Table[T]':
+        """Makes a new table of the rows whose value in column `name`
+        satisfies `predicate`."""
+        return self.select(map(predicate, self._columns[name]))
+
+    def select(self, mask: Iterable[Any]) -> 'Table[T]':
+        """Makes a new table of the rows where `mask` is true.
+
+        >>> @record
+        ... class Pair:
+        ...     a: int
+        ...     b: str
+        >>> pairs = Pair.Table([Pair(1, 'x'), Pair(2, 'y'), Pair(3, 'z')])
+        >>> list(pairs.select([True, False, True]).column('b'))
+        ['x', 'z']
+        """
+        mask = list(mask)
+        if len(mask) != self._length:
+            raise ValueError('mask must have one entry per row')
+        table = self._empty_like()
+        for name, column in self._columns.items():
+            kept = compress(column, mask)
+            typecode = _typecode(column)
+            if typecode is not None:
+                table._columns[name] = array(typecode, kept)
+            else:
+                table._columns[name] = list(kept)
+        table._length = sum(1 for keep in mask if keep)
+        return table
+
+    def _empty_like(self) -> 'Table[T]':
+        """Makes an empty table for the same record class."""
+        table = Table.__new__(Table)
+        table.record_class = self.record_class
+        table._columns = {}
+        table._length = 0
+        table._view = self._view
+        return table
+
+    def _check_index(self, index: int) -> int:
+        """Turns a possibly negative index into a position in range."""
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError('table index out of range')
+        return index
+
+    def _unpack(self, name: str) -> List[Any]:
+        """Replaces a packed column by a list, which can hold anything."""
+        column = self._columns[name]
+        if isinstance(column, array):
+            unpacked = column.tolist()
+            if column.typecode == 'B':
+                unpacked = [bool(value) for value in unpacked]
+            self._columns[name] = column = unpacked
+        return column
+
+
+def _typecode(column: Any) -> Optional[str]:
+    """Returns the array typecode of a packed column (an array, or a
+    memoryview of a shared one), or None for a list."""
+    if isinstance(column, array):
+        return column.typecode
+    if isinstance(column, memoryview):
+        return column.format
+    return None
+
+
+class _TableCompanion:
+    """Makes `SomeRecord.Table(rows)` a shorthand for
+    `Table(SomeRecord, rows)`."""
+
+    def __get__(self, instance: Any, owner: type) -> Callable[..., Table]:
+        def make_table(rows: Iterable[Any] = ()) -> Table:
+            return Table(owner, rows)
+        return make_table
+
+
+def _field_types(cls: type) -> Dict[str, Any]:
+    """Finds the type of each field of a record class, from its
+    annotations. Annotations that can't be evaluated are left out."""
+    try:
+        return typing.get_type_hints(cls)
+    except Exception:
+        return {}
+
+
+# The row view class and the tuple constructor of each record class.
+_VIEW_CLASSES: 'weakref.WeakKeyDictionary[type, type]' = \
+    weakref.WeakKeyDictionary()
+_RECORD_BUILDERS: 'weakref.WeakKeyDictionary[type, Callable]' = \
+    weakref.WeakKeyDictionary()
+
+
+def _record_builder(cls: type) -> Callable:
+    """Returns (and remembers) a function that builds a `cls` from a
+    tuple of its field values."""
+    builder = _RECORD_BUILDERS.get(cls)
+    if builder is None:
+        builder = _RECORD_BUILDERS[cls] = partial(_tuple_constructor(cls),
+                                                  cls)
+    return builder
+
+
+def _view_class(cls: type) -> type:
+    """Returns (and remembers) a subclass of the record class `cls`
+    whose fields are properties that read and write a row of a table.
+    Views compare equal to views and records of `cls` with the same
+    field values, but aren't hashable, because the rows can change.
+    They pickle as copies of the row in records of `cls`."""
+    view = _VIEW_CLASSES.get(cls)
+    if view is not None:
+        return view
+    types = _field_types(cls)
+    # The fields that records of `cls` are compared on (`cmp` before
+    # attrs 19.2).
+    compared = [a.name for a in attr.fields(cls)
+                if getattr(a, 'eq', getattr(a, 'cmp', True))]
+    values = attrgetter(*compared) if compared else lambda item: ()
+
+    def __eq__(self: Any, other: Any) -> Any:
+        if other.__class__ is not cls and other.__class__ is not view:
+            return NotImplemented
+        return values(self) == values(other)
+
+    def __ne__(self: Any, other: Any) -> Any:
+        equal = __eq__(self, other)
+        return equal if equal is NotImplemented else not equal
+
+    namespace: Dict[str, Any] = {
+        '__slots__': ('_table', '_index'),
+        '__init__': _view_init,
+        '__eq__': __eq__,
+        '__ne__': __ne__,
+        '__hash__': None,
+        '__reduce_ex__': _view_reduce_ex,
+    }
+    for name in (a.name for a in attr.fields(cls)):
+        namespace[name] = _field_property(name, types.get(name) is bool)
+    view = type(cls.__name__, (cls,), namespace)
+    view.__qualname__ = cls.__qualname__
+    _VIEW_CLASSES[cls] = view
+    return view
+
+
+def _view_init(self: Any, table: Table, index: int) -> None:
+    object.__setattr__(self, '_table', table)
+    object.__setattr__(self, '_index', index)
+
+
+def _view_reduce_ex(self: Any, protocol: int) -> Any:
+    """Pickles (or copies) a row view as a record of its own."""
+    return _row_record, (self._table.record_class,
+                         tuple(getattr(self, name)
+                               for name in self._table._columns))
+
+
+def _row_record(cls: type, values: Tuple[Any, ...]) -> Any:
+    """Builds a record of class `cls` from a tuple of its field values,
+    when unpickling a row view."""
+    return _record_builder(cls)(values)
+
+
+def _field_property(name: str, is_bool: bool) -> property:
+    """Makes a property for one field of a row view."""
+    if is_bool:
+        def get(self: Any) -> Any:
+            return bool(self._table._columns[name][self._index])
+    else:
+        def get(self: Any) -> Any:
+            return self._table._columns[name][self._index]
+
+    def set(self: Any, value: Any) -> None:
+        table = self._table
+        try:
+            table._columns[name][self._index] = value
+        except (TypeError, OverflowError):
+            table._unpack(name)[self._index] = value
+
+    return property(get, set)
+
+
+# A file of records starts with a header: a magic number, the format
+# version, and the length of the schema that follows it. Each block then
+# has a header giving its number of records and its length in bytes.
+_MAGIC = b'LIB230R\0'
+_FORMAT_VERSION = 1
+_FILE_HEADER = struct.Struct('<8sII')
+_BLOCK_HEADER = struct.Struct('<IQ')
+_LENGTH = struct.Struct('<Q')
+
+# How many records a `RecordWriter` puts in each block by default.
+BLOCK_SIZE = 4096
+
+
+class _Codec:
+    """Encodes and decodes a column of values of one type. A column is
+    what a `Table` would store: an `array` for `int`, `float` and `bool`,
+    or a list for anything else."""
+
+    # Describes the encoding, so that a reader can check that it matches
+    # the writer.
+    schema = ''
+
+    def encode(self, values: List[Any], out: List[bytes]) -> None:
+        """Appends the encoding of `values` to `out`."""
+        raise NotImplementedError
+
+    def decode(self, data: memoryview, pos: int,
+               count: int) -> Tuple[Column, int]:
+        """Decodes a column of `count` values from `data` at `pos`.
+        Returns the column and the position after it."""
+        raise NotImplementedError
+
+    def to_values(self, column: Column) -> Iterable[Any]:
+        """Converts a decoded column to the field values."""
+        return column
+
+
+class _PackedCodec(_Codec):
+    """Numbers, stored in an array of fixed-size numbers."""
+
+    def __init__(self, typecode: str, name: str) -> None:
+        self.typecode = typecode
+        self.itemsize = array(typecode).itemsize
+        self.schema = name
+
+    def encode(self, values: List[Any], out: List[bytes]) -> None:
+        out.append(_little_endian(array(self.typecode, values)).tobytes())
+
+    def decode(self, data: memoryview, pos: int,
+               count: int) -> Tuple[Column, int]:
+        column = _read_array(self.typecode, data, pos, count)
+        return column, pos + count * self.itemsize
+
+    def to_values(self, column: Column) -> Iterable[Any]:
+        if self.typecode == 'B':
+            return map(bool, column)
+        return column
+
+
+class _TextCodec(_Codec):
+    """Strings, stored as their lengths followed by all of them joined
+    together, so that the whole column is encoded or decoded at once.
+    For `str`, lengths are in characters, so that the decoded text can be
+    sliced up directly."""
+
+    def __init__(self, kind: type) -> None:
+        self.kind = kind
+        self.schema = kind.__name__
+
+    def encode(self, values: List[Any], out: List[bytes]) -> None:
+        out.append(_little_endian(array('I', map(len, values))).tobytes())
+        blob = self.kind().join(values)
+        if self.kind is str:
+            blob = blob.encode('utf-8', 'surrogatepass')
+        out.append(_LENGTH.pack(len(blob)))
+        out.append(blob)
+
+    def decode(self, data: memoryview, pos: int,
+               count: int) -> Tuple[Column, int]:
+        lengths = _read_array('I', data, pos, count)
+        pos += 4 * count
+        size, = _LENGTH.unpack_from(data, pos)
+        pos += _LENGTH.size
+        blob = bytes(data[pos:pos + size])
+        if self.kind is str:
+            blob = blob.decode('utf-8', 'surrogatepass')
+        ends = list(accumulate(lengths))
+        starts = [0] + ends[:-1]
+        return [blob[a:b] for a, b in zip(starts, ends)], pos + size
+
+
+class _EnumCodec(_Codec):
+    """Enum members, stored as their positions in the enum."""
+
+    def __init__(self, enum: Type[Enum]) -> None:
+        self.members = list(enum)
+        self.positions = {member: i for i, member in enumerate(self.members)}
+        self.schema = 'enum {}({})'.format(
+            enum.__qualname__, ','.join(m.name for m in self.members))
+
+    def encode(self, values: List[Any], out: List[bytes]) -> None:
+        positions = array('I', map(self.positions.__getitem__, values))
+        out.append(_little_endian(positions).tobytes())
+
+    def decode(self, data: memoryview, pos: int,
+               count: int) -> Tuple[Column, int]:
+        positions = _read_array('I', data, pos, count)
+        return list(map(self.members.__getitem__, positions)), pos + 4 * count
+
+
+class _OptionalCodec(_Codec):
+    """Values that may be None, stored as a byte for each saying whether
+    it is there, followed by the values that are there."""
+
+    def __init__(self, inner: _Codec) -> None:
+        self.inner = inner
+
+    @property
+    def schema(self) -> str:
+        return 'optional({})'.format(self.inner.schema)
+
+    def encode(self, values: List[Any], out: List[bytes]) -> None:
+        out.append(bytes(value is not None for value in values))
+        self.inner.encode([value for value in values if value is not None],
+                          out)
+
+    def decode(self, data: memoryview, pos: int,
+               count: int) -> Tuple[Column, int]:
+        present = data[pos:pos + count]
+        column, pos = self.inner.decode(data, pos + count,
+                                        sum(present))
+        values = iter(self.inner.to_values(column))
+        return [next(values) if there else None for there in present], pos
+
+
+class _ListCodec(_Codec):
+    """Lists, stored as their lengths followed by all of their elements
+    as one column."""
+
+    def __init__(self, inner: _Codec) -> None:
+        self.inner = inner
+
+    @property
+    def schema(self) -> str:
+        return 'list({})'.format(self.inner.schema)
+
+    def encode(self, values: List[Any], out: List[bytes]) -> None:
+        out.append(_little_endian(array('I', map(len, values))).tobytes())
+        self.inner.encode([x for value in values for x in value], out)
+
+    def decode(self, data: memoryview, pos: int,
+               count: int) -> Tuple[Column, int]:
+        lengths = _read_array('I', data, pos, count)
+        ends = list(accumulate(lengths))
+        column, pos = self.inner.decode(data, pos + 4 * count,
+                                        ends[-1] if ends else 0)
+        elements = list(self.inner.to_values(column))
+        starts = [0] + ends[:-1]
+        return [elements[a:b] for a, b in zip(starts, ends)], pos
+
+
+class _RecordCodec(_Codec):
+    """Records, stored as a column for each field in turn."""
+
+    def __init__(self, cls: type) -> None:
+        self.cls = cls
+        # Filled in by `_record_codec`, once this codec is in the cache,
+        # so that a record may (through Optional or List) contain itself.
+        self.fields: List[Tuple[str, _Codec]] = []
+        self._building = False
+        self._build: Optional[Callable] = None
+
+    @property
+    def schema(self) -> str:
+        if self._building:
+            # A reference back to a record that is being described.
+            return self.cls.__qualname__
+        self._building = True
+        try:
+            return 'record {}{{{}}}'.format(
+                self.cls.__qualname__,
+                ','.join('{}:{}'.format(name, codec.schema)
+                         for name, codec in self.fields))
+        finally:
+            self._building = False
+
+    def encode(self, values: List[Any], out: List[bytes]) -> None:
+        if not values:
+            # Nothing at all is stored for no records, which ends the
+            # recursion for a record that contains itself.
+            return
+        for name, codec in self.fields:
+            codec.encode(list(map(attrgetter(name), values)), out)
+
+    def decode_columns(self, data: memoryview, pos: int,
+                       count: int) -> Tuple[List[Column], int]:
+        """Decodes a column for each field."""
+        columns = []
+        for _, codec in self.fields:
+            column, pos = codec.decode(data, pos, count)
+            columns.append(column)
+        return columns, pos
+
+    def decode(self, data: memoryview, pos: int,
+               count: int) -> Tuple[Column, int]:
+        if not count:
+            return [], pos
+        columns, pos = self.decode_columns(data, pos, count)
+        if self._build is None:
+            self._build = _columns_constructor(self.cls)
+        values = [codec.to_values(column)
+                  for (_, codec), column in zip(self.fields, columns)]
+        return self._build(values, count), pos
+
+
+_RECORD_CODECS: 'weakref.WeakKeyDictionary[type, _RecordCodec]' = \
+    weakref.WeakKeyDictionary()
+
+
+def _record_codec(cls: type) -> _RecordCodec:
+    """Returns (and remembers) the codec for a record class."""
+    codec = _RECORD_CODECS.get(cls)
+    if codec is None:
+        codec = _RECORD_CODECS[cls] = _RecordCodec(cls)
+        types = _field_types(cls)
+        try:
+            for field in attr.fields(cls):
+                if field.name not in types:
+                    raise TypeError('field {}.{} has no usable type '
+                                    'annotation'.format(cls.__qualname__,
+                                                        field.name))
+                codec.fields.append((field.name,
+                                     _codec_for(types[field.name])))
+        except TypeError:
+            del _RECORD_CODECS[cls]
+            raise
+    return codec
+
+
+def _codec_for(tp: Any) -> _Codec:
+    """Works out how to encode values of the type `tp`."""
+    if tp in _TYPECODES:
+        return _PackedCodec(_TYPECODES[tp], tp.__name__)
+    if tp in (str, bytes):
+        return _TextCodec(tp)
+    if isinstance(tp, type) and issubclass(tp, Enum):
+        return _EnumCodec(tp)
+    if isinstance(tp, type) and attr.has(tp):
+        return _record_codec(tp)
+    origin = getattr(tp, '__origin__', None)
+    args = getattr(tp, '__args__', ())
+    if origin is Union and len(args) == 2 and type(None) in args:
+        inner, = (arg for arg in args if arg is not type(None))
+        return _OptionalCodec(_codec_for(inner))
+    if origin in (list, List) and len(args) == 1:
+        return _ListCodec(_codec_for(args[0]))
+    raise TypeError('cannot encode values of type {!r}'.format(tp))
+
+
+def _little_endian(numbers: array) -> array:
+    """Returns `numbers` in little-endian byte order."""
+    if sys.byteorder == 'big':
+        numbers = array(numbers.typecode, numbers)
+        numbers.byteswap()
+    return numbers
+
+
+def _read_array(typecode: str, data: memoryview, pos: int,
+                count: int) -> array:
+    """Reads `count` little-endian numbers from `data` at `pos`."""
+    numbers = array(typecode)
+    end = pos + count * numbers.itemsize
+    if end > len(data):
+        raise ValueError('record data is truncated')
+    numbers.frombytes(data[pos:end])
+    if sys.byteorder == 'big':
+        numbers.byteswap()
+    return numbers
+
+
+class RecordWriter(Generic[T]):
+    """Writes records of one class to a binary file, a block at a time.
+    `file` is a file name or a binary stream; a file that the writer
+    opens, it also closes.
+
+    >>> @record
+    ... class Pet:
+    ...     name: str
+    ...     legs: int
+    >>> buffer = io.BytesIO()
+    >>> with RecordWriter(buffer, Pet) as writer:
+    ...     writer.write(Pet('Rex', 4))
+    ...     writer.write_all([Pet('Polly', 2), Pet('Nemo', 0)])
+    >>> _ = buffer.seek(0)
+    >>> [(pet.name, pet.legs) for pet in RecordReader(buffer, Pet)]
+    [('Rex', 4), ('Polly', 2), ('Nemo', 0)]
+    """
+
+    def __init__(self, file: Union[str, 'os.PathLike[str]', BinaryIO],
+                 record_class: Type[T], block_size: int = BLOCK_SIZE) -> None:
+        if block_size < 1:
+            raise ValueError('block_size must be positive')
+        self._codec = _record_codec(record_class)
+        self._owned = isinstance(file, (str, os.PathLike))
+        self._file = open(file, 'wb') if self._owned else file
+        self._block_size = block_size
+        self._pending: List[T] = []
+        schema = self._codec.schema.encode('utf-8')
+        self._file.write(_FILE_HEADER.pack(_MAGIC, _FORMAT_VERSION,
+                                           len(schema)))
+        self._file.write(schema)
+
+    def write(self, row: T) -> None:
+        """Writes one record."""
+        self._pending.append(row)
+        if len(self._pending) >= self._block_size:
+            self._write_block()
+
+    def write_all(self, rows: Iterable[T]) -> None:
+        """Writes every record in `rows`."""
+        for row in rows:
+            self.write(row)
+
+    def flush(self) -> None:
+        """Writes out any records still waiting to fill a block."""
+        if self._pending:
+            self._write_block()
+        self._file.flush()
+
+    def close(self) -> None:
+        """Flushes, and closes the file if the writer opened it."""
+        self.flush()
+        if self._owned:
+            self._file.close()
+
+    def __enter__(self) -> 'RecordWriter[T]':
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def _write_block(self) -> None:
+        out: List[bytes] = []
+        self._codec.encode(self._pending, out)
+        body = b''.join(out)
+        self._file.write(_BLOCK_HEADER.pack(len(self._pending), len(body)))
+        self._file.write(body)
+        self._pending = []
+
+
+class RecordReader(Generic[T]):
+    """Reads records of one class from a file written by `RecordWriter`,
+    a block at a time. Iterating over it yields the records lazily;
+    `read_table` decodes the rest of the file straight into columns.
+    Raises ValueError if the file was written for a different
+    definition of the class."""
+
+    def __init__(self, file: Union[str, 'os.PathLike[str]', BinaryIO],
+                 record_class: Type[T]) -> None:
+        self.record_class = record_class
+        self._codec = _record_codec(record_class)
+        self._owned = isinstance(file, (str, os.PathLike))
+        self._file = open(file, 'rb') if self._owned else file
+        magic, version, schema_size = _FILE_HEADER.unpack(
+            self._read_exactly(_FILE_HEADER.size))
+        if magic != _MAGIC:
+            raise ValueError('not a file of records')
+        if version != _FORMAT_VERSION:
+            raise ValueError('unsupported record file version {}'.format(
+                version))
+        schema = self._read_exactly(schema_size).decode('utf-8')
+        if schema != self._codec.schema:
+            raise ValueError('file was written for a different definition '
+                             'of {}'.format(record_class.__qualname__))
+
+    def __iter__(self) -> Iterator[T]:
+        for count, data in self._blocks():
+            with _gc_paused():
+                records, _ = self._codec.decode(data, 0, count)
+            yield from records
+
+    def read_table(self) -> Table[T]:
+        """Reads the rest of the file into a `Table`."""
+        table = Table(self.record_class)
+        for count, data in self._blocks():
+            with _gc_paused():
+                columns, _ = self._codec.decode_columns(data, 0, count)
+            for (name, codec), column in zip(self._codec.fields, columns):
+                if isinstance(table._columns[name], array):
+                    table._columns[name].extend(column)
+                else:
+                    table._columns[name].extend(codec.to_values(column))
+            table._length += count
+        return table
+
+    def close(self) -> None:
+        """Closes the file if the reader opened it."""
+        if self._owned:
+            self._file.close()
+
+    def __enter__(self) -> 'RecordReader[T]':
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def _blocks(self) -> Iterator[Tuple[int, memoryview]]:
+        """Generates the number of records in, and the data of, each of
+        the remaining blocks."""
+        while True:
+            header = self._file.read(_BLOCK_HEADER.size)
+            if not header:
+                return
+            if len(header) < _BLOCK_HEADER.size:
+                raise ValueError('record file is truncated')
+            count, size = _BLOCK_HEADER.unpack(header)
+            yield count, memoryview(self._read_exactly(size))
+
+    def _read_exactly(self, size: int) -> bytes:
+        data = self._file.read(size)
+        if len(data) != size:
+            raise ValueError('record file is truncated')
+        return data
+
+
+@contextmanager
+def _gc_paused() -> Iterator[None]:
+    """Turns off the cycle collector for a while. Decoding a block makes
+    many objects at once, and each batch of new objects sets off a
+    collection that looks at every object in memory; records that have
+    just been decoded can't be garbage, so that work is wasted."""
+    was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if was_enabled:
+            gc.enable()
+
+
+def encode_records(record_class: Type[T], rows: Iterable[T]) -> bytes:
+    """Encodes records as the contents of a record file.
+
+    >>> @record
+    ... class Pair:
+    ...     a: int
+    ...     b: Optional[str]
+    >>> data = encode_records(Pair, [Pair(1, 'x'), Pair(2, None)])
+    >>> decode_records(Pair, data)
+    [Pair(a=1, b='x'), Pair(a=2, b=None)]
+    """
+    buffer = io.BytesIO()
+    with RecordWriter(buffer, record_class) as writer:
+        writer.write_all(rows)
+    return buffer.getvalue()
+
+
+def decode_records(record_class: Type[T], data: bytes) -> List[T]:
+    """Decodes the contents of a record file."""
+    return list(RecordReader(io.BytesIO(data), record_class))
+
+
+# A shared table is one block of shared memory. It starts with a header:
+# a magic number, the format version, the number of fields and of rows,
+# and the length of the schema, a description of the fields that must
+# match the record class; then the schema; and then the start and size
+# of each field's data. Each field's data starts at a multiple of 8. A
+# packed field is its array; a text field is an array of n + 1 offsets
+# into a blob that follows, where value i is blob[offsets[i]:offsets[i +
+# 1]], encoded in UTF-8 for a `str`. An Optional field starts with a
+# byte per row that tells whether its value is there (and a blank value
+# is stored where it isn't), followed by the values, as above.
+_SHARED_MAGIC = b'LIB230S\0'
+_SHARED_VERSION = 1
+_SHARED_HEADER = struct.Struct('=8sIIQQ')
+_SHARED_EXTENT = struct.Struct('=QQ')
+
+# The code in the schema for each field type that can be shared: array
+# typecodes for packed fields, and 's' and 'y' for `str` and `bytes`.
+_SHARED_KINDS: Dict[Any, str] = {**_TYPECODES, str: 's', bytes: 'y'}
+
+# What stands in for None in the packed values of an Optional field.
+_SHARED_BLANKS = {'q': 0, 'd': 0.0, 'B': False, 's': '', 'y': b''}
+
+# Held while attaching to shared memory; see `_attach_shared_memory`.
+_attach_lock = threading.Lock()
+
+
+class SharedTable(Table[T]):
+    """A read-only `Table` whose columns are in shared memory
+    (`multiprocessing.shared_memory`), where other processes can read
+    them without copying them. It needs Python 3.8 or later; on Python
+    3.7, publishing or attaching raises ImportError, but the rest of
+    this module works.
+
+    One process *publishes* the rows, which copies them into a new
+    block of shared memory, and other processes *attach* to it by its
+    `name`. Pickling a shared table just pickles the name, so it is
+    cheap to pass one to a process pool: the worker attaches when it
+    unpickles it. Fields must be `int`, `float`, `bool`, `str` or
+    `bytes`, or `Optional` ones.
+
+    Each process should `close` a shared table when it is done with it,
+    which also happens when it is garbage collected. The publisher must
+    also `unlink` it, once no other process needs to attach to it; using
+    it as a context manager does both. (A block that is never unlinked
+    is removed, with a warning, when the publishing process ends.)
+    Packed columns are memoryviews of the shared memory, so closing
+    fails with BufferError while anything made from them, such as a
+    NumPy array from `to_numpy`, is still around.
+
+    >>> @record
+    ... class Fish:
+    ...     name: str
+    ...     weight_kg: float
+    >>> rows = [Fish('A', 10), Fish('B', 8)]
+    >>> with SharedTable.publish(Fish, rows) as tank:  # doctest: +SKIP
+    ...     with SharedTable.attach(Fish, tank.name) as seen:
+    ...         print(seen[1], seen.sum('weight_kg'))
+    Fish(name='B', weight_kg=8.0) 18.0
+    """
+
+    name: str
+
+    @classmethod
+    def publish(cls, record_class: Type[T], rows: Iterable[T],
+                name: Optional[str] = None) -> 'SharedTable[T]':
+        """Copies `rows` into a new block of shared memory, named `name`
+        (or a new, unique name)."""
+        SharedMemory = _shared_memory().SharedMemory
+        rows = list(rows)
+        fields = _shared_fields(record_class)
+        schema = _shared_schema(fields).encode()
+        parts = [_shared_pieces(kind, [getattr(row, field_name)
+                                       for row in rows])
+                 for field_name, kind in fields]
+        position = _align(_SHARED_HEADER.size + len(schema)
+                          + _SHARED_EXTENT.size * len(fields))
+        extents = []
+        for part in parts:
+            size = sum(_align(len(piece)) for piece in part)
+            extents.append((position, size))
+            position += size
+
+        shm = SharedMemory(name, create=True, size=max(position, 1))
+        try:
+            buffer = shm.buf
+            _SHARED_HEADER.pack_into(buffer, 0, _SHARED_MAGIC,
+                                     _SHARED_VERSION, len(fields), len(rows),
+                                     len(schema))
+            offset = _SHARED_HEADER.size
+            buffer[offset:offset + len(schema)] = schema
+            offset += len(schema)
+            for extent, part in zip(extents, parts):
+                _SHARED_EXTENT.pack_into(buffer, offset, *extent)
+                offset += _SHARED_EXTENT.size
+                start = extent[0]
+                for piece in part:
+                    buffer[start:start + len(piece)] = piece
+                    start += _align(len(piece))
+            del buffer
+            return cls._open(record_class, shm, owner=True)
+        except BaseException:
+            shm.close()
+            shm.unlink()
+            raise
+
+    @classmethod
+    def attach(cls, record_class: Type[T], name: str) -> 'SharedTable[T]':
+        """Attaches to the shared table published as `name`, which must
+        have been published for the same definition of `record_class`."""
+        return cls._open(record_class, _attach_shared_memory(name),
+                         owner=False)
+
+    @classmethod
+    def _open(cls, record_class: Type[T], shm: Any,
+              owner: bool) -> 'SharedTable[T]':
+        """Makes a shared table that reads the shared memory `shm`."""
+        views: List[Any] = []
+        table = cls.__new__(cls)
+        table.record_class = record_class
+        table.name = shm.name
+        table._shm = shm
+        table._owner = owner
+        table._columns = {}
+        table._view = _view_class(record_class)
+        # Releases this process's views of the memory, and then the
+        # memory, once the table is closed or garbage collected.
+        table._finalizer = weakref.finalize(table, _close_shared, views, shm)
+        try:
+            buffer = shm.buf.toreadonly()
+            views.append(buffer)
+            magic, version, _, table._length, schema_size = \
+                _SHARED_HEADER.unpack_from(buffer)
+            if magic != _SHARED_MAGIC:
+                raise ValueError('not a shared table')
+            if version != _SHARED_VERSION:
+                raise ValueError('unsupported shared table version {}'
+                                 .format(version))
+            fields = _shared_fields(record_class)
+            offset = _SHARED_HEADER.size
+            schema = bytes(buffer[offset:offset + schema_size]).decode()
+            if schema != _shared_schema(fields):
+                raise ValueError('shared table was published for a different '
+                                 'definition of {}'
+                                 .format(record_class.__qualname__))
+            offset += schema_size
+            for field_name, kind in fields:
+                start, size = _SHARED_EXTENT.unpack_from(buffer, offset)
+                offset += _SHARED_EXTENT.size
+                table._columns[field_name] = _shared_column(
+                    kind, buffer[start:start + size], table._length, views)
+        except BaseException:
+            table._finalizer()
+            raise
+        return table
+
+    def close(self) -> None:
+        """Detaches this process from the shared memory. The table can't
+        be used after that."""
+        self._finalizer()
+
+    def unlink(self) -> None:
+        """Removes the shared memory, once every process has closed it.
+        Only the publisher may do this."""
+        if not self._owner:
+            raise ValueError('only the publisher can unlink a shared table')
+        self._shm.unlink()
+        self._owner = False
+
+    def __enter__(self) -> 'SharedTable[T]':
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+        if self._owner:
+            self.unlink()
+
+    def __reduce__(self) -> Any:
+        return SharedTable.attach, (self.record_class, self.name)
+
+    def __repr__(self) -> str:
+        return 'SharedTable({}, {!r}, <{} rows>)'.format(
+            self.record_class.__qualname__, self.name, self._length)
+
+    def __getitem__(self, index: Union[int, slice]) -> Any:
+        """Returns a row view for an int index, or a new (ordinary) table
+        of copies of the selected rows for a slice."""
+        if not isinstance(index, slice):
+            return super().__getitem__(index)
+        table = self._empty_like()
+        for name, column in self._columns.items():
+            typecode = _typecode(column)
+            if typecode is not None:
+                table._columns[name] = array(typecode, column[index])
+            else:
+                table._columns[name] = column[index]
+        table._length = len(range(self._length)[index])
+        return table
+
+    def argmax(self, name: str) -> Optional[int]:
+        """As for `Table`, but without `index`, which memoryviews lack."""
+        column = self._columns[name]
+        if not len(column):
+            return None
+        best = max(column)
+        return next(i for i, value in enumerate(column) if value == best)
+
+    def __setitem__(self, index: int, row: T) -> None:
+        raise TypeError('shared tables are read-only')
+
+    def append(self, row: T) -> None:
+        raise TypeError('shared tables are read-only')
+
+    def extend(self, rows: Iterable[T]) -> None:
+        raise TypeError('shared tables are read-only')
+
+    def _unpack(self, name: str) -> List[Any]:
+        raise TypeError('shared tables are read-only')
+
+
+class _SharedText:
+    """A read-only column of `str` or `bytes` values in shared memory:
+    value i is `blob[offsets[i]:offsets[i + 1]]`, decoded if `decode`."""
+
+    def __init__(self, offsets: memoryview, blob: memoryview,
+                 decode: bool) -> None:
+        self._offsets = offsets
+        self._blob = blob
+        self._decode = decode
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index: Union[int, slice]) -> Any:
+        if isinstance(index, slice):
+            return [self[i] for i in range(len(self))[index]]
+        index = range(len(self))[index]
+        return self._value(self._offsets[index], self._offsets[index + 1])
+
+    def __iter__(self) -> Iterator[Any]:
+        offsets = self._offsets
+        for i in range(len(self)):
+            yield self._value(offsets[i], offsets[i + 1])
+
+    def _value(self, start: int, end: int) -> Any:
+        data = self._blob[start:end]
+        return str(data, 'utf-8', 'surrogatepass') if self._decode \
+            else bytes(data)
+
+
+class _SharedOptional:
+    """A read-only column of optional values in shared memory: value i is
+    `values[i]` if `present[i]`, or else None."""
+
+    def __init__(self, present: memoryview, values: Any,
+                 is_bool: bool) -> None:
+        self._present = present
+        self._values = values
+        self._is_bool = is_bool
+
+    def __len__(self) -> int:
+        return len(self._present)
+
+    def __getitem__(self, index: Union[int, slice]) -> Any:
+        if isinstance(index, slice):
+            return [self[i] for i in range(len(self))[index]]
+        index = range(len(self))[index]
+        return self._value(self._present[index], self._values[index])
+
+    def __iter__(self) -> Iterator[Any]:
+        for present, value in zip(self._present, self._values):
+            yield self._value(present, value)
+
+    def _value(self, present: int, value: Any) -> Any:
+        if not present:
+            return None
+        return bool(value) if self._is_bool else value
+
+
+def _shared_fields(cls: type) -> List[Tuple[str, str]]:
+    """Lists the name and schema code of each field of a record class
+    that is to be shared."""
+    types = _field_types(cls)
+    fields = []
+    for name in (a.name for a in attr.fields(cls)):
+        tp = types.get(name)
+        prefix = ''
+        args = getattr(tp, '__args__', ())
+        if (getattr(tp, '__origin__', None) is Union and len(args) == 2
+                and type(None) in args):
+            tp, = (arg for arg in args if arg is not type(None))
+            prefix = '?'
+        if tp not in _SHARED_KINDS:
+            raise TypeError('field {} of {} can\'t be shared: only int, '
+                            'float, bool, str and bytes fields (or '
+                            'Optional ones) can'
+                            .format(name, cls.__qualname__))
+        fields.append((name, prefix + _SHARED_KINDS[tp]))
+    return fields
+
+
+def _shared_schema(fields: List[Tuple[str, str]]) -> str:
+    """Describes the fields of a shared table.
+
+    >>> _shared_schema([('name', 's'), ('id', '?q')])
+    'name:s;id:?q'
+    """
+    return ';'.join('{}:{}'.format(name, kind) for name, kind in fields)
+
+
+def _shared_pieces(kind: str, values: List[Any]) -> List[Any]:
+    """Packs the values of one field of a shared table, whose schema code
+    is `kind`, into byte strings and arrays of bytes. Each piece starts
+    at a multiple of 8.
+
+    >>> [len(piece) for piece in _shared_pieces('?s', ['hi', None])]
+    [2, 24, 2]
+    """
+    if kind.startswith('?'):
+        kind = kind[1:]
+        blank = _SHARED_BLANKS[kind]
+        present = array('B', [value is not None for value in values])
+        values = [blank if value is None else value for value in values]
+        return [present] + _shared_pieces(kind, values)
+    if kind in 'sy':
+        encoded = [value.encode('utf-8', 'surrogatepass') if kind == 's'
+                   else bytes(value) for value in values]
+        offsets = array('q', [0])
+        offsets.extend(accumulate(map(len, encoded)))
+        return [memoryview(offsets).cast('B'), b''.join(encoded)]
+    return [memoryview(array(kind, values)).cast('B')]
+
+
+def _shared_column(kind: str, data: memoryview, length: int,
+                   views: List[memoryview]) -> Any:
+    """Makes a column of a shared table that reads the field with the
+    schema code `kind` from `data`, adding the memoryviews it keeps to
+    `views`."""
+    if kind.startswith('?'):
+        present = data[:length]
+        views.append(present)
+        return _SharedOptional(present, _shared_column(
+            kind[1:], data[_align(length):], length, views), kind == '?B')
+    if kind in 'sy':
+        split = 8 * (length + 1)
+        offsets = data[:split].cast('q')
+        blob = data[split:]
+        views += [offsets, blob]
+        return _SharedText(offsets, blob, kind == 's')
+    column = data[:length * array(kind).itemsize].cast(kind)
+    views.append(column)
+    return column
+
+
+def _align(position: int) -> int:
+    """Rounds a position in a shared table up to a multiple of 8."""
+    return (position + 7) & ~7
+
+
+def _shared_memory() -> Any:
+    """Imports `multiprocessing.shared_memory`, which is new in Python
+    3.8. Shared tables import it only when they are used, so that the
+    rest of this module still works on Python 3.7."""
+    try:
+        from multiprocessing import shared_memory
+    except ImportError:
+        raise ImportError('SharedTable needs Python 3.8 or later, for '
+                          'multiprocessing.shared_memory') from None
+    return shared_memory
+
+
+def _attach_shared_memory(name: str) -> Any:
+    """Attaches to an existing block of shared memory.
+
+    Before Python 3.13, attaching registers the block with the resource
+    tracker, as creating it does, and the tracker then removes it when
+    the attaching process ends, even though the publisher may still be
+    using it. So registering is skipped here, and only the publisher's
+    registration counts."""
+    shared_memory = _shared_memory()
+    from multiprocessing import resource_tracker
+    try:
+        return shared_memory.SharedMemory(name, track=False)
+    except TypeError:
+        pass
+    with _attach_lock:
+        register = resource_tracker.register
+        resource_tracker.register = lambda name, rtype: None
+        try:
+            return shared_memory.SharedMemory(name)
+        finally:
+            resource_tracker.register = register
+
+
+def _close_shared(views: List[memoryview], shm: Any) -> None:
+    """Releases the views of a shared table, most derived first, and
+    then closes its shared memory."""
+    for view in reversed(views):
+        view.release()
+    views.clear()
+    shm.close()
+
+
+# Instrumentation. Each instrumented function keeps a count of its calls,
+# the total time they took, and how many took at most each of these
+# many seconds, as in a Prometheus histogram. Counts are kept without a
+# lock, so calls from several threads at once may be missed.
+_LATENCY_BUCKETS = (1e-6, 1e-5, 1e-4, 1e-3, 1e-2, 0.1, 1.0, 10.0)
+
+
+class _Instrumentation:
+    """Whether instrumentation is on, and what it has found so far."""
+
+    def __init__(self) -> None:
+        # Whether to instrument classes and functions as they are
+        # defined.
+        self.on = False
+        # Whether instrumented functions are timed; `disable` turns this
+        # off, since it can't take the instrumentation back out.
+        self.timing = False
+        # `tracemalloc.get_traced_memory`, if memory is being traced.
+        self.traced_memory: Optional[Callable[[], Tuple[int, int]]] = None
+        # Whether `enable_instrumentation` started `tracemalloc`.
+        self.started_tracing = False
+        self.calls: Dict[str, _CallStats] = {}
+        self.instances: Dict[str, _InstanceStats] = {}
+
+
+class _CallStats:
+    """What calls to one instrumented function have cost."""
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.seconds = 0.0
+        self.buckets = [0] * (len(_LATENCY_BUCKETS) + 1)
+        # Bytes allocated and not freed by the calls, if memory is being
+        # traced.
+        self.allocated = 0
+
+    def add(self, seconds: float) -> None:
+        self.calls += 1
+        self.seconds += seconds
+        self.buckets[bisect_left(_LATENCY_BUCKETS, seconds)] += 1
+
+
+class _InstanceStats:
+    """How many instances of one instrumented class have been made, and
+    how many have since been freed."""
+
+    def __init__(self) -> None:
+        self.created = 0
+        self.freed = 0
+
+
+_INSTRUMENTATION = _Instrumentation()
+
+
+def enable_instrumentation(trace_memory: bool = False) -> None:
+    """Turns instrumentation on for the classes and functions defined
+    from now on (and starts timing those defined earlier again). If
+    `trace_memory`, also starts `tracemalloc`, so that each instrumented
+    function adds up the memory its calls allocate.
+
+    >>> enable_instrumentation()
+    >>> @instrumented
+    ... def double(x: int) -> int:
+    ...     return 2 * x
+    >>> double(2), double(3)
+    (4, 6)
+    >>> metrics_snapshot()['calls']['lib230.double']['calls']
+    2
+    >>> disable_instrumentation()
+    """
+    _INSTRUMENTATION.on = _INSTRUMENTATION.timing = True
+    if trace_memory:
+        import tracemalloc
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _INSTRUMENTATION.started_tracing = True
+        _INSTRUMENTATION.traced_memory = tracemalloc.get_traced_memory
+
+
+def disable_instrumentation() -> None:
+    """Turns instrumentation off for the classes and functions defined
+    from now on, and stops timing those defined earlier. Instances are
+    still counted. Stops `tracemalloc` if `enable_instrumentation`
+    started it."""
+    _INSTRUMENTATION.on = _INSTRUMENTATION.timing = False
+    _INSTRUMENTATION.traced_memory = None
+    if _INSTRUMENTATION.started_tracing:
+        import tracemalloc
+        tracemalloc.stop()
+        _INSTRUMENTATION.started_tracing = False
+
+
+def reset_metrics() -> None:
+    """Forgets the calls counted so far. Instance counts are kept, since
+    the instances are still there."""
+    for stats in _INSTRUMENTATION.calls.values():
+        stats.__init__()  # type: ignore
+
+
+def instrumented(func: Callable) -> Callable:
+    """Counts and times the calls to `func`, if instrumentation is on;
+    otherwise returns `func` unchanged."""
+    if not _INSTRUMENTATION.on:
+        return func
+    return _timed(func, '{}.{}'.format(func.__module__, func.__qualname__))
+
+
+def _timed(func: Callable, name: str) -> Callable:
+    """Wraps `func` to count and time its calls under `name`."""
+    state = _INSTRUMENTATION
+    stats = state.calls.setdefault(name, _CallStats())
+
+    @wraps(func)
+    def timed(*args: Any, **kwargs: Any) -> Any:
+        if not state.timing:
+            return func(*args, **kwargs)
+        traced_memory = state.traced_memory
+        if traced_memory is not None:
+            before = traced_memory()[0]
+        start = perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            stats.add(perf_counter() - start)
+            if traced_memory is not None:
+                stats.allocated += traced_memory()[0] - before
+    return timed
+
+
+def _own_methods(cls: type) -> List[str]:
+    """Lists the methods defined in the body of the class `cls` (before
+    attrs adds any)."""
+    return [name for name, value in vars(cls).items()
+            if isinstance(value, (types.FunctionType, classmethod,
+                                  staticmethod))
+            and name not in ('__new__', '__del__')]
+
+
+def _instrument_class(cls: type, methods: List[str]) -> None:
+    """Times `__init__` and the `methods` of the record class `cls`, and
+    counts its instances (but not those of its subclasses)."""
+    prefix = '{}.{}.'.format(cls.__module__, cls.__qualname__)
+    for name in set(methods) | {'__init__'}:
+        value = cls.__dict__.get(name)
+        if isinstance(value, (classmethod, staticmethod)):
+            setattr(cls, name,
+                    type(value)(_timed(value.__func__, prefix + name)))
+        elif isinstance(value, types.FunctionType):
+            setattr(cls, name, _timed(value, prefix + name))
+
+    stats = _INSTRUMENTATION.instances.setdefault(
+        prefix[:-1], _InstanceStats())
+    base_new = cls.__new__
+    base_del = getattr(cls, '__del__', None)
+
+    def __new__(klass: type, *args: Any, **kwargs: Any) -> Any:
+        if klass is cls:
+            stats.created += 1
+        if base_new is object.__new__:
+            return object.__new__(klass)
+        return base_new(klass, *args, **kwargs)
+
+    def __del__(self: Any) -> None:
+        if type(self) is cls:
+            stats.freed += 1
+        if base_del is not None:
+            base_del(self)
+
+    cls.__new__ = staticmethod(__new__)  # type: ignore
+    cls.__del__ = __del__  # type: ignore
+
+
+def metrics_snapshot() -> Dict[str, Any]:
+    """Returns what instrumentation has found so far, as a dict that can
+    be saved as JSON: for each instrumented function, its calls, their
+    total seconds, a histogram of their seconds (the number that took at
+    most each bucket's bound, as in Prometheus), and the bytes they
+    allocated; for each instrumented class, how many instances have been
+    made and how many are live; and, if memory is being traced, the
+    bytes allocated now and at most."""
+    calls = {}
+    for name, stats in sorted(_INSTRUMENTATION.calls.items()):
+        bounds = [str(bound) for bound in _LATENCY_BUCKETS] + ['+Inf']
+        calls[name] = {
+            'calls': stats.calls,
+            'seconds': stats.seconds,
+            'buckets': dict(zip(bounds, accumulate(stats.buckets))),
+            'allocated_bytes': stats.allocated,
+        }
+    instances = {name: {'created': stats.created,
+                        'live': stats.created - stats.freed}
+                 for name, stats in sorted(_INSTRUMENTATION.instances.items())}
+    snapshot = {'calls': calls, 'instances': instances}
+    if _INSTRUMENTATION.traced_memory is not None:
+        current, peak = _INSTRUMENTATION.traced_memory()
+        snapshot['memory'] = {'traced_bytes': current, 'peak_bytes': peak}
+    return snapshot
+
+
+def metrics_json() -> str:
+    """Returns `metrics_snapshot()` as JSON."""
+    import json
+    return json.dumps(metrics_snapshot(), indent=2)
+
+
+def metrics_prometheus() -> str:
+    """Returns `metrics_snapshot()` in the Prometheus text format.
+
+    >>> enable_instrumentation()
+    >>> @record(instrument=True)
+    ... class Probe:
+    ...     n: int
+    >>> probes = [Probe(1), Probe(2)]
+    >>> del probes[0]
+    >>> disable_instrumentation()
+    >>> [line for line in metrics_prometheus().splitlines()
+    ...  if line.startswith('lib230_live_instances') and 'Probe' in line]
+    ['lib230_live_instances{class="lib230.Probe"} 1']
+    """
+    snapshot = metrics_snapshot()
+    lines: List[str] = []
+
+    def family(name: str, kind: str, help: str) -> None:
+        lines.append('# HELP {} {}'.format(name, help))
+        lines.append('# TYPE {} {}'.format(name, kind))
+
+    def sample(name: str, labels: Dict[str, str], value: Any) -> None:
+        text = ','.join('{}="{}"'.format(key, _escape_label(label))
+                        for key, label in labels.items())
+        lines.append('{}{{{}}} {}'.format(name, text, value))
+
+    calls = snapshot['calls']
+    family('lib230_call_seconds', 'histogram',
+           'Time taken by calls to instrumented functions.')
+    for name, stats in calls.items():
+        for bound, count in stats['buckets'].items():
+            sample('lib230_call_seconds_bucket',
+                   {'function': name, 'le': bound}, count)
+        sample('lib230_call_seconds_sum', {'function': name},
+               repr(stats['seconds']))
+        sample('lib230_call_seconds_count', {'function': name},
+               stats['calls'])
+    family('lib230_call_allocated_bytes', 'gauge',
+           'Bytes allocated and not freed by calls to instrumented '
+           'functions, while memory is traced.')
+    for name, stats in calls.items():
+        sample('lib230_call_allocated_bytes', {'function': name},
+               stats['allocated_bytes'])
+
+    instances = snapshot['instances']
+    family('lib230_instances_created_total', 'counter',
+           'Instances made of instrumented classes.')
+    for name, stats in instances.items():
+        sample('lib230_instances_created_total', {'class': name},
+               stats['created'])
+    family('lib230_live_instances', 'gauge',
+           'Instances of instrumented classes that have not been freed.')
+    for name, stats in instances.items():
+        sample('lib230_live_instances', {'class': name}, stats['live'])
+
+    if 'memory' in snapshot:
+        family('lib230_traced_memory_bytes', 'gauge',
+               'Bytes allocated now, as traced by tracemalloc.')
+        lines.append('lib230_traced_memory_bytes {}'.format(
+            snapshot['memory']['traced_bytes']))
+    return '\n'.join(lines) + '\n'
+
+
+def _escape_label(value: str) -> str:
+    """Escapes a label value for the Prometheus text format.
+
+    >>> print(_escape_label('say "hi"\\n'))
+    say \\"hi\\"\\n
+    """
+    return (value.replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+if os.environ.get('LIB230_INSTRUMENT'):
+    enable_instrumentation(
+        trace_memory=os.environ['LIB230_INSTRUMENT'] == 'memory')
@@ -0,0 +1,230 @@
+"""Searching for many needles at once (the Aho–Corasick algorithm).
+
+Searching for each of a hundred keywords with `str_index` walks the
+haystack a hundred times. Instead, we can build one automaton from all
+of the needles and walk the haystack just once:
+
+  - The needles are stored in a *trie*, a tree in which each state
+    stands for a prefix of some needle, and each edge adds one
+    character.
+
+  - Each state also has a *failure link* to the state for the longest
+    proper suffix of its prefix that is also in the trie. When the next
+    character of the haystack has no edge, we follow failure links
+    until one does, so we never back up in the haystack.
+
+  - Each state has a *dictionary link* to the nearest state along its
+    failure links where a needle ends, so reporting every match is
+    quick.
+
+To keep the automaton small enough for hundreds of thousands of
+needles, the states are numbered in breadth-first order and stored in
+a handful of flat integer arrays rather than as objects. Numbered that
+way, the children of each state have consecutive numbers, sorted by
+character, so finding an edge is a binary search.
+"""
+
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from needle import Text
+
+
+# A match: which needle, and the index where it starts.
+Match = Tuple[Text, int]
+
+
+class MultiNeedle:
+    """An automaton for finding any of several needles in a haystack.
+
+    >>> needles = compile_needles(['he', 'she', 'his', 'hers'])
+    >>> list(needles.find_all('ushers'))
+    [('she', 1), ('he', 2), ('hers', 2)]
+    >>> needles.index('ushers')
+    ('she', 1)
+    >>> needles.count('this shell')
+    3
+    """
+
+    def __init__(self, needles: Iterable[Text]) -> None:
+        unique = sorted(set(needles))
+        if len({type(needle) for needle in unique}) > 1:
+            raise TypeError('needles must all be str or all be bytes')
+        self._match_empty = bool(unique) and len(unique[0]) == 0
+        if self._match_empty:
+            unique = unique[1:]
+        self.needles: List[Text] = unique
+        self._max_len = max((len(needle) for needle in unique), default=0)
+
+        # Characters are numbered in sorted order, so sorting the needles
+        # also sorts them by their character numbers.
+        alphabet = sorted({c for needle in unique for c in needle})
+        self._symbol: Dict[Union[str, int], int] = {
+            c: i for i, c in enumerate(alphabet)}
+
+        # For each state: the character on the edge into it, the range
+        # of its children, its failure and dictionary links, and the
+        # needle that ends there (or -1).
+        self._in_symbol = array('i', [-1])
+        self._first_child = array('i', [0])
+        self._end_child = array('i', [0])
+        self._fail = array('i', [0])
+        self._dict_link = array('i', [0])
+        self._needle_at = array('i', [-1])
+        self._build_trie()
+        self._build_links()
+
+        # Edges out of the start state are used the most, so they get a
+        # direct lookup table.
+        self._root = array('i', [0] * len(alphabet))
+        for state in range(self._first_child[0], self._end_child[0]):
+            self._root[self._in_symbol[state]] = state
+
+    def _build_trie(self) -> None:
+        """Adds the states of the trie, one depth at a time."""
+        symbol = self._symbol
+        needles = self.needles
+        # For each needle still being added, the state for the part of
+        # it added so far.
+        state_of = [0] * len(needles)
+        active = list(range(len(needles)))
+        depth = 0
+        while active:
+            previous = None
+            for k in active:
+                parent = state_of[k]
+                edge = (parent, symbol[needles[k][depth]])
+                if edge != previous:
+                    # Needles are sorted, so needles sharing this prefix
+                    # are next to each other.
+                    state = len(self._in_symbol)
+                    self._in_symbol.append(edge[1])
+                    self._first_child.append(0)
+                    self._end_child.append(0)
+                    self._fail.append(0)
+                    self._dict_link.append(0)
+                    self._needle_at.append(-1)
+                    if self._end_child[parent] == 0:
+                        self._first_child[parent] = state
+                    self._end_child[parent] = state + 1
+                    previous = edge
+                state_of[k] = state
+                if len(needles[k]) == depth + 1:
+                    self._needle_at[state] = k
+            depth += 1
+            active = [k for k in active if len(needles[k]) > depth]
+
+    def _build_links(self) -> None:
+        """Computes failure and dictionary links. States are numbered in
+        breadth-first order, so each state's links point to states that
+        are already done."""
+        parent_of = array('i', [0] * len(self._in_symbol))
+        for parent in range(len(self._in_symbol)):
+            for child in range(self._first_child[parent],
+                               self._end_child[parent]):
+                parent_of[child] = parent
+        for state in range(1, len(self._in_symbol)):
+            parent = parent_of[state]
+            fail = 0
+            if parent != 0:
+                fail = self._fail[parent]
+                sym = self._in_symbol[state]
+                while True:
+                    target = self._goto(fail, sym)
+                    if target or fail == 0:
+                        fail = target
+                        break
+                    fail = self._fail[fail]
+            self._fail[state] = fail
+            self._dict_link[state] = (fail if self._needle_at[fail] >= 0
+                                      else self._dict_link[fail])
+
+    def _goto(self, state: int, sym: int) -> int:
+        """Returns the child of `state` along `sym`, or 0 if none."""
+        lo = self._first_child[state]
+        hi = self._end_child[state]
+        i = bisect_left(self._in_symbol, sym, lo, hi)
+        if i < hi and self._in_symbol[i] == sym:
+            return i
+        return 0
+
+    def __len__(self) -> int:
+        """Returns the number of distinct needles."""
+        return len(self.needles) + self._match_empty
+
+    def n_states(self) -> int:
+        """Returns the number of states in the automaton.
+
+        >>> compile_needles(['ab', 'ac', 'b']).n_states()
+        5
+        """
+        return len(self._in_symbol)
+
+    def find_all(self, haystack: Text) -> Iterator[Match]:
+        """Generates every match of every needle in `haystack`, in order
+        of where the matches end; matches that end in the same place come
+        longest first. As with `str_index`, an empty needle matches at
+        every index of the haystack.
+
+        >>> list(compile_needles([b'ab', b'b', b'']).find_all(b'abb'))
+        [(b'', 0), (b'', 1), (b'ab', 0), (b'b', 1), (b'', 2), (b'b', 2)]
+        """
+        if self.needles and type(haystack) is not type(self.needles[0]):
+            raise TypeError('needles and haystack must all be str or all '
+                            'be bytes')
+        symbol = self._symbol
+        root = self._root
+        fail = self._fail
+        needle_at = self._needle_at
+        dict_link = self._dict_link
+        needles = self.needles
+        empty = haystack[:0]
+        state = 0
+        for end, c in enumerate(haystack):
+            if self._match_empty:
+                yield empty, end
+            sym = symbol.get(c)
+            if sym is None:
+                state = 0
+                continue
+            while True:
+                target = root[sym] if state == 0 else self._goto(state, sym)
+                if target or state == 0:
+                    state = target
+                    break
+                state = fail[state]
+            found = state if needle_at[state] >= 0 else dict_link[state]
+            while found:
+                needle = needles[needle_at[found]]
+                yield needle, end - len(needle) + 1
+                found = dict_link[found]
+
+    def index(self, haystack: Text) -> Optional[Match]:
+        """Returns the match that starts first in `haystack` (the longest,
+        if several start there), or None if no needle is found.
+
+        >>> compile_needles(['bc', 'abcd', 'ab']).index('xabcd')
+        ('abcd', 1)
+        >>> compile_needles(['z']).index('xabcd')
+        """
+        best: Optional[Match] = None
+        for needle, start in self.find_all(haystack):
+            end = start + len(needle)
+            if best is not None and end - self._max_len > best[1]:
+                # Every later match starts after the best one.
+                break
+            if (best is None or start < best[1]
+                    or (start == best[1] and len(needle) > len(best[0]))):
+                best = needle, start
+        return best
+
+    def count(self, haystack: Text) -> int:
+        """Counts the matches of all needles in `haystack`."""
+        return sum(1 for _ in self.find_all(haystack))
+
+
+def compile_needles(needles: Iterable[Text]) -> MultiNeedle:
+    """Builds an automaton for finding any of the given needles. Build it
+    once and reuse it for every haystack."""
+    return MultiNeedle(needles)
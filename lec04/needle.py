@@ -0,0 +1,167 @@
+"""Searching for one needle in many haystacks.
+
+`iteration.str_index` compares the needle at every offset of the
+haystack, one character at a time. When the same needle is searched for
+over and over, it pays to study the needle once, ahead of time, and
+remember what we learned in some tables:
+
+  - The Boyer–Moore–Horspool *shift table* says, for the character
+    under the last position of the needle, how far the needle can slide
+    forward without skipping a match. On typical text this skips most
+    of the haystack without looking at it.
+
+  - The Knuth–Morris–Pratt *failure table* says, after a partial match,
+    how much of it can be reused. Searching with it never looks at a
+    character of the haystack twice.
+
+Horspool can be slow on repetitive text (like searching for 'aaab' in
+'aaaa…'), so the search starts with Horspool and switches over to KMP if
+it has done more than a few times as many comparisons as the haystack
+is long. That keeps the worst case linear.
+
+Needles and haystacks may be `str` or `bytes`, as long as they match.
+"""
+
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Union
+
+
+# Either kind of string that we can search.
+Text = Union[str, bytes]
+
+# How many comparisons per haystack character Horspool may make before
+# we switch to KMP.
+_HORSPOOL_BUDGET = 4
+
+
+class CompiledNeedle:
+    """A needle, along with tables for finding it quickly.
+
+    Like `str_index`, a needle is found at index `i` of a haystack if
+    `i` is an index of the haystack and the needle matches starting
+    there. In particular, the empty needle is found at every index.
+
+    >>> needle = compile_needle('an')
+    >>> needle.index('banana')
+    1
+    >>> list(needle.find_all('banana'))
+    [1, 3]
+    >>> needle.count('banana')
+    2
+    >>> needle.index('apple')
+    """
+
+    def __init__(self, needle: Text) -> None:
+        self.needle = needle
+        m = len(needle)
+        # How far to shift when the haystack character under the last
+        # position of the needle is a given character. Characters not
+        # in the table shift by the whole needle length.
+        self._shift: Dict[Union[str, int], int] = {}
+        for i in range(m - 1):
+            self._shift[needle[i]] = m - 1 - i
+        # _failure[i] is the length of the longest proper prefix of
+        # needle[:i + 1] that is also a suffix of it.
+        self._failure: List[int] = [0] * m
+        k = 0
+        for i in range(1, m):
+            while k > 0 and needle[i] != needle[k]:
+                k = self._failure[k - 1]
+            if needle[i] == needle[k]:
+                k += 1
+            self._failure[i] = k
+
+    def __repr__(self) -> str:
+        return 'compile_needle({!r})'.format(self.needle)
+
+    def index(self, haystack: Text, start: int = 0) -> Optional[int]:
+        """Returns the first index (from `start` onward) where the needle
+        is found in `haystack`, or None if there isn't one.
+
+        >>> compile_needle('pl').index('apple')
+        2
+        >>> compile_needle('p').index('apple', 2)
+        2
+        >>> compile_needle('').index('apple')
+        0
+        >>> compile_needle('').index('')
+        """
+        for i in self.find_all(haystack, start):
+            return i
+        return None
+
+    def count(self, haystack: Text, start: int = 0) -> int:
+        """Counts the (possibly overlapping) occurrences of the needle in
+        `haystack`, from `start` onward.
+
+        >>> compile_needle('aa').count('aaaa')
+        3
+        >>> compile_needle('').count('abc')
+        3
+        """
+        return sum(1 for _ in self.find_all(haystack, start))
+
+    def find_all(self, haystack: Text, start: int = 0) -> Iterator[int]:
+        """Generates every index (from `start` onward) where the needle is
+        found in `haystack`, in increasing order, including overlapping
+        occurrences.
+
+        >>> list(compile_needle(b'aba').find_all(b'abababa'))
+        [0, 2, 4]
+        >>> list(compile_needle('aaab').find_all('aaaaaaab'))
+        [4]
+        """
+        if type(haystack) is not type(self.needle):
+            raise TypeError('needle and haystack must both be str or both '
+                            'be bytes')
+        needle = self.needle
+        m = len(needle)
+        n = len(haystack)
+        start = max(start, 0)
+        if m == 0:
+            yield from range(start, n)
+            return
+
+        # Horspool, for as long as it stays within its budget.
+        shift = self._shift
+        last = needle[-1]
+        budget = _HORSPOOL_BUDGET * (n - start) + m
+        i = start
+        while i <= n - m:
+            window_end = haystack[i + m - 1]
+            if window_end == last:
+                budget -= m
+                if haystack.startswith(needle, i):
+                    yield i
+            else:
+                budget -= 1
+            i += shift.get(window_end, m)
+            if budget < 0:
+                break
+        else:
+            return
+
+        # KMP from index i onward. Every match before i has already been
+        # found, so we start with nothing matched.
+        failure = self._failure
+        k = 0
+        for j in range(i, n):
+            c = haystack[j]
+            while k > 0 and c != needle[k]:
+                k = failure[k - 1]
+            if c == needle[k]:
+                k += 1
+                if k == m:
+                    yield j - m + 1
+                    k = failure[k - 1]
+
+
+@lru_cache(maxsize=256)
+def compile_needle(needle: Text) -> CompiledNeedle:
+    """Prepares a needle for searching. Recently compiled needles are
+    remembered, so compiling the same needle again is cheap.
+
+    >>> compile_needle('abc') is compile_needle('abc')
+    True
+    """
+    return CompiledNeedle(needle)
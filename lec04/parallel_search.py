@@ -0,0 +1,202 @@
+"""Searching a range in parallel.
+
+`iteration.find_satisfies` tries each number in turn, so an expensive
+predicate keeps only one core busy. Here we split the range into chunks
+and hand the chunks to a pool of workers. To keep the answer the same as
+`find_satisfies` (the *first* number that satisfies the predicate), a
+hit in one chunk cancels every chunk after it, but we still wait for the
+chunks before it, which might contain an earlier hit. Likewise, an error
+raised by the predicate in one chunk is only raised once every chunk
+before it has been checked without a hit, as `find_satisfies` would have
+raised it then, and it is dropped if one of them has a hit.
+
+By default the work is done by a pool of processes, so the predicate
+must be a function defined at the top level of some module (not a
+lambda) for it to be sent to the workers. Passing a
+`concurrent.futures.ThreadPoolExecutor` instead lifts that restriction,
+which is worthwhile when the predicate releases the GIL (as NumPy does).
+
+A *vectorized* predicate takes a whole chunk (a `range`) at once and
+returns a sequence of Booleans, one for each number in the chunk.
+
+`max_workers` is how many workers to create, or how many a given
+executor has (executors don't say). Twice that many chunks are kept in
+flight. It defaults to the number of CPUs.
+"""
+
+from concurrent.futures import (Executor, Future, ProcessPoolExecutor,
+                                FIRST_COMPLETED, wait)
+import os
+from typing import Callable, Dict, Iterator, List, Optional, Sequence
+
+from iteration import find_satisfies
+
+
+# How many numbers go in each chunk by default.
+CHUNK_SIZE = 1000
+
+
+def find_satisfies_parallel(haystack: Sequence[int],
+                            needle: Callable,
+                            chunk_size: int = CHUNK_SIZE,
+                            executor: Optional[Executor] = None,
+                            vectorized: bool = False,
+                            max_workers: Optional[int] = None
+                            ) -> Optional[int]:
+    """Like `find_satisfies`, but checks chunks of `haystack` in
+    parallel. Uses `executor` if given, or else a new process pool.
+
+    >>> from concurrent.futures import ThreadPoolExecutor
+    >>> with ThreadPoolExecutor(4) as pool:
+    ...     find_satisfies_parallel(range(1, 100), lambda x: x % 45 == 0,
+    ...                             chunk_size=7, executor=pool)
+    45
+    >>> with ThreadPoolExecutor(4) as pool:
+    ...     find_satisfies_parallel(range(1, 100), lambda x: x > 1000,
+    ...                             chunk_size=7, executor=pool)
+    """
+    with _Pool(executor, max_workers) as pool:
+        running: Dict[Future, int] = {}
+        chunks = enumerate(_chunks(haystack, chunk_size))
+        # The first chunk known to have a hit or an error, and its hit.
+        stop: Optional[int] = None
+        best: Optional[int] = None
+        errors: Dict[int, Exception] = {}
+        more = True
+        while True:
+            # Keep every worker busy with chunks that might still matter.
+            while more and len(running) < pool.window:
+                try:
+                    index, chunk = next(chunks)
+                except StopIteration:
+                    more = False
+                    break
+                if stop is not None and index > stop:
+                    more = False
+                    break
+                running[pool.submit(_first_in_chunk, needle, chunk,
+                                    vectorized)] = index
+            if not running:
+                if stop in errors:
+                    raise errors[stop]
+                return best
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future not in running:
+                    continue  # Cancelled by an earlier hit in this batch.
+                index = running.pop(future)
+                try:
+                    result = future.result()
+                except Exception as error:
+                    errors[index] = error
+                    result = None
+                else:
+                    if result is None:
+                        continue
+                if stop is None or index < stop:
+                    stop, best = index, result
+                    # Chunks after this one can't have the first hit.
+                    for other, other_index in list(running.items()):
+                        if other_index > index:
+                            other.cancel()
+                            del running[other]
+
+
+def find_all_satisfies(haystack: Sequence[int],
+                       needle: Callable,
+                       chunk_size: int = CHUNK_SIZE,
+                       executor: Optional[Executor] = None,
+                       vectorized: bool = False,
+                       max_workers: Optional[int] = None) -> Iterator[int]:
+    """Generates every number in `haystack` that satisfies `needle`, in
+    order, checking chunks in parallel ahead of what has been consumed.
+    Uses `executor` if given, or else a new process pool. Closing the
+    generator early cancels the chunks that haven't started.
+
+    >>> from concurrent.futures import ThreadPoolExecutor
+    >>> with ThreadPoolExecutor(4) as pool:
+    ...     list(find_all_satisfies(range(1, 100), lambda x: x % 15 == 0,
+    ...                             chunk_size=10, executor=pool))
+    [15, 30, 45, 60, 75, 90]
+    >>> def multiples_of_7(block):
+    ...     return [x % 7 == 0 for x in block]
+    >>> with ThreadPoolExecutor(4) as pool:
+    ...     list(find_all_satisfies(range(30), multiples_of_7, chunk_size=4,
+    ...                             executor=pool, vectorized=True))
+    [0, 7, 14, 21, 28]
+    """
+    with _Pool(executor, max_workers) as pool:
+        queue: List[Future] = []
+        try:
+            for chunk in _chunks(haystack, chunk_size):
+                queue.append(pool.submit(_all_in_chunk, needle, chunk,
+                                         vectorized))
+                if len(queue) >= pool.window:
+                    yield from queue.pop(0).result()
+            for future in queue:
+                yield from future.result()
+            queue = []
+        finally:
+            for future in queue:
+                future.cancel()
+
+
+def _chunks(haystack: Sequence[int],
+            chunk_size: int) -> Iterator[Sequence[int]]:
+    """Splits a sequence into consecutive slices of `chunk_size`.
+
+    >>> list(_chunks(range(0, 10, 2), 2))
+    [range(0, 4, 2), range(4, 8, 2), range(8, 10, 2)]
+    """
+    if chunk_size < 1:
+        raise ValueError('chunk_size must be positive')
+    for start in range(0, len(haystack), chunk_size):
+        yield haystack[start:start + chunk_size]
+
+
+def _first_in_chunk(needle: Callable, chunk: Sequence[int],
+                    vectorized: bool) -> Optional[int]:
+    """Finds the first number in one chunk that satisfies `needle`.
+    Runs in a worker."""
+    if not vectorized:
+        return find_satisfies(chunk, needle)
+    for i, ok in zip(chunk, needle(chunk)):
+        if ok:
+            return i
+    return None
+
+
+def _all_in_chunk(needle: Callable, chunk: Sequence[int],
+                  vectorized: bool) -> List[int]:
+    """Finds every number in one chunk that satisfies `needle`. Runs in
+    a worker."""
+    if not vectorized:
+        return [i for i in chunk if needle(i)]
+    return [i for i, ok in zip(chunk, needle(chunk)) if ok]
+
+
+class _Pool:
+    """Uses a given executor, or creates (and later shuts down) a
+    process pool of `max_workers` processes. Either way, `window` is how
+    many chunks to keep in flight."""
+
+    def __init__(self, executor: Optional[Executor],
+                 max_workers: Optional[int]) -> None:
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+        elif max_workers < 1:
+            raise ValueError('max_workers must be positive')
+        self._owned = executor is None
+        self._executor = executor or ProcessPoolExecutor(max_workers)
+        self.window = 2 * max_workers
+
+    def __enter__(self) -> '_Pool':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        if self._owned:
+            self._executor.shutdown(wait=True)
+
+    def submit(self, fn: Callable, *args) -> Future:
+        return self._executor.submit(fn, *args)
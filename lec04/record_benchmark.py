@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+
+"""Compares the memory and construction time of the `record` options.
+
+Run it as `python3 record_benchmark.py [--count N]`. For each kind of
+record, it builds N five-field records (like `aquarium.Fish`) and
+reports the bytes allocated per record and the time to construct one.
+For slotted frozen records it also times `from_tuple`.
+"""
+
+import argparse
+import gc
+import sys
+import time
+import tracemalloc
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from lib230 import record
+
+
+def _fish_class(**options) -> type:
+    """Defines a record class like `Fish`, with the given options."""
+    @record(**options)
+    class Fish:
+        name:       str
+        weight_kg:  float
+        age_days:   int = 0
+        species:    str = 'unknown'
+        tank:       int = 0
+    return Fish
+
+
+# The kinds of record to compare: a name, and the options to `record`.
+KINDS = [
+    ('default', {}),
+    ('slots', {'slots': True}),
+    ('frozen', {'frozen': True}),
+    ('frozen+cache_hash', {'frozen': True, 'cache_hash': True}),
+    ('slots+frozen', {'slots': True, 'frozen': True}),
+]
+
+# How many times to time each kind; the best time is reported.
+REPEATS = 5
+
+
+def _rows(count: int) -> List[Tuple[str, float, int, str, int]]:
+    """Makes the field values for `count` records."""
+    return [('fish', i * 0.5, i, 'goldfish', i % 7) for i in range(count)]
+
+
+def _measure_memory(build: Callable[[], list]) -> int:
+    """Returns the bytes that `build` allocates (and keeps)."""
+    gc.collect()
+    tracemalloc.start()
+    kept = build()
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    return allocated
+
+
+def _measure_time(build: Callable[[], list]) -> float:
+    """Returns the seconds that `build` takes. As with `timeit`, the
+    garbage collector is off while timing, so that its pauses (which
+    depend on everything else in memory) don't swamp the difference."""
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        kept = build()
+        elapsed = time.perf_counter() - start
+        # Free the records only after the clock has stopped.
+        del kept
+        return elapsed
+    finally:
+        gc.enable()
+
+
+def benchmark(count: int) -> List[Tuple[str, float, float]]:
+    """Returns, for each way of building records: its name, the bytes
+    per record, and the nanoseconds per record."""
+    rows = _rows(count)
+    results = []
+    for name, options in KINDS:
+        cls = _fish_class(**options)
+        ways = [(name, lambda: [cls(*row) for row in rows])]
+        # from_tuple is only quicker than the constructor on slotted
+        # records, so it is only compared there.
+        if options.get('frozen') and options.get('slots'):
+            ways.append((name + ' from_tuple',
+                         lambda: [cls.from_tuple(row) for row in rows]))
+        for label, build in ways:
+            allocated = _measure_memory(build)
+            # Time without tracemalloc, which slows allocation down, and
+            # take the best of a few runs.
+            elapsed = min(_measure_time(build) for _ in range(REPEATS))
+            results.append((label, allocated / count, elapsed / count * 1e9))
+    return results
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--count', type=int, default=200000,
+                        help='how many records to build of each kind')
+    args = parser.parse_args(argv)
+    print('{:<26} {:>14} {:>14}'.format('kind', 'bytes/record', 'ns/record'))
+    for label, size, ns in benchmark(args.count):
+        print('{:<26} {:>14.1f} {:>14.1f}'.format(label, size, ns))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
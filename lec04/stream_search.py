@@ -0,0 +1,153 @@
+"""Searching haystacks too big to hold in memory.
+
+`str_index` needs the whole haystack as one string. Here the haystack is
+read a chunk at a time, from a file, a stream, or a memory-mapped file,
+and each chunk is searched with a `CompiledNeedle`. A match may start in
+one chunk and end in the next, so before each chunk we keep the last
+`len(needle) - 1` characters of what came before. That is just too short
+to hold a whole match, so no match is found twice, but long enough that
+no match is missed. Memory use is bounded by the chunk size plus the
+length of the needle, however big the haystack is.
+
+The source may be:
+
+  - a file name (a `str` or a path object), which is opened in binary
+    mode to search for a `bytes` needle, or in text mode to search for a
+    `str` needle;
+
+  - a stream, such as an open file: a binary stream is decoded if the
+    needle is a `str`, but a text stream can only be searched for a
+    `str` needle;
+
+  - a buffer, such as an `mmap.mmap`, `bytes` or `bytearray`, which is
+    searched from its start, like a binary stream.
+
+Offsets are absolute: they count bytes from the start of the source for
+a `bytes` needle, and characters for a `str` needle.
+"""
+
+import codecs
+import mmap
+import os
+from typing import BinaryIO, Iterator, Optional, TextIO, Union
+
+from needle import Text, compile_needle
+
+
+# How many bytes (or characters) to read at a time by default.
+CHUNK_SIZE = 1 << 20
+
+# Anything we can search: a file name, a stream, or a buffer.
+Source = Union[str, os.PathLike, BinaryIO, TextIO, mmap.mmap, bytes,
+               bytearray, memoryview]
+
+
+def stream_find_all(needle: Text, source: Source,
+                    chunk_size: int = CHUNK_SIZE,
+                    encoding: str = 'utf-8') -> Iterator[int]:
+    """Generates the offset of every occurrence of `needle` in `source`,
+    in increasing order, including overlapping occurrences. A `str`
+    needle is searched for in the text decoded with `encoding`.
+
+    >>> import io
+    >>> list(stream_find_all(b'aba', io.BytesIO(b'abababa'), chunk_size=2))
+    [0, 2, 4]
+    >>> list(stream_find_all('é!', 'café!é!'.encode(), chunk_size=1))
+    [3, 5]
+    """
+    if chunk_size < 1:
+        raise ValueError('chunk_size must be positive')
+    compiled = compile_needle(needle)
+    keep = max(len(needle) - 1, 0)
+    tail = needle[:0]
+    base = 0
+    for chunk in _chunks(source, isinstance(needle, str), chunk_size,
+                         encoding):
+        window = tail + chunk
+        for i in compiled.find_all(window):
+            yield base + i
+        # Keep just enough to catch a match that continues into the next
+        # chunk.
+        tail = window[max(len(window) - keep, 0):] if keep else window[:0]
+        base += len(window) - len(tail)
+
+
+def stream_index(needle: Text, source: Source,
+                 chunk_size: int = CHUNK_SIZE,
+                 encoding: str = 'utf-8') -> Optional[int]:
+    """Like `str_index`, but searches a file, stream or buffer, reading
+    only as much of it as needed.
+
+    >>> import io
+    >>> stream_index(b'needle', io.BytesIO(b'hay' * 1000 + b'needle'),
+    ...              chunk_size=64)
+    3000
+    >>> stream_index('x', io.StringIO('hay'))
+    """
+    for i in stream_find_all(needle, source, chunk_size, encoding):
+        return i
+    return None
+
+
+def stream_count(needle: Text, source: Source,
+                 chunk_size: int = CHUNK_SIZE,
+                 encoding: str = 'utf-8') -> int:
+    """Counts the (possibly overlapping) occurrences of `needle` in
+    `source`.
+
+    >>> stream_count(b'aa', b'aaaa', chunk_size=1)
+    3
+    """
+    return sum(1 for _ in stream_find_all(needle, source, chunk_size,
+                                          encoding))
+
+
+def _chunks(source: Source, text: bool, chunk_size: int,
+            encoding: str) -> Iterator[Text]:
+    """Reads `source` a chunk at a time, as `str` if `text` or else as
+    `bytes`."""
+    if isinstance(source, (str, os.PathLike)):
+        if text:
+            # newline='' so that offsets count every character.
+            with open(source, encoding=encoding, newline='') as stream:
+                yield from _read_stream(stream, text, chunk_size, encoding)
+        else:
+            with open(source, 'rb') as stream:
+                yield from _read_stream(stream, text, chunk_size, encoding)
+    elif hasattr(source, 'read') and not isinstance(source, mmap.mmap):
+        yield from _read_stream(source, text, chunk_size, encoding)
+    else:
+        yield from _read_buffer(memoryview(source).cast('B'), text,
+                                chunk_size, encoding)
+
+
+def _read_stream(stream, text: bool, chunk_size: int,
+                 encoding: str) -> Iterator[Text]:
+    """Reads an open stream a chunk at a time."""
+    decoder = None
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        if isinstance(chunk, str):
+            if not text:
+                raise TypeError('cannot search a text stream for bytes')
+        elif text:
+            if decoder is None:
+                decoder = codecs.getincrementaldecoder(encoding)()
+            chunk = decoder.decode(chunk)
+        yield chunk
+    if decoder is not None:
+        yield decoder.decode(b'', final=True)
+
+
+def _read_buffer(buffer: memoryview, text: bool, chunk_size: int,
+                 encoding: str) -> Iterator[Text]:
+    """Reads a buffer a chunk at a time, copying only one chunk at
+    once."""
+    decoder = codecs.getincrementaldecoder(encoding)() if text else None
+    for start in range(0, len(buffer), chunk_size):
+        chunk = bytes(buffer[start:start + chunk_size])
+        yield decoder.decode(chunk) if decoder else chunk
+    if decoder is not None:
+        yield decoder.decode(b'', final=True)
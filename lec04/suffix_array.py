@@ -0,0 +1,342 @@
+"""Searching one haystack for many needles (suffix arrays).
+
+`str_index` and `CompiledNeedle` study the needle, so each search still
+has to walk the whole haystack. When the haystack stays the same and the
+needles change, it pays to study the haystack instead.
+
+The *suffix array* of a haystack lists the starting index of every
+suffix of the haystack, sorted by the suffixes. Every occurrence of a
+needle is the start of a suffix that begins with the needle, and those
+suffixes are next to each other in sorted order, so two binary searches
+find them all. Each step of a binary search compares at most
+`len(needle)` characters, so a search takes O(m log n) time for a
+needle of length m and a haystack of length n. The first occurrence is
+the smallest start among those suffixes, which a range-minimum table
+over the suffix array finds in constant time, however many there are.
+
+The *LCP array* records, for each suffix in sorted order, the length of
+the longest common prefix that it shares with the suffix before it. Its
+largest entry gives the longest substring that occurs more than once.
+
+The suffix array is built with NumPy by *prefix doubling*. After round
+k, suffixes are sorted by their first 2ᵏ characters. Each round sorts
+them by a pair of ranks from the previous round with a radix sort, in
+O(n) time, and we stop once every suffix has its own rank, after at
+most log n rounds. The LCP array is then found from the final ranks by
+Kasai's algorithm, in O(n) time.
+
+An index is just three arrays: the haystack's character codes, the
+suffix array and the LCP array. It can be saved to a directory and
+loaded back memory-mapped, so a large index is only read from disk as
+queries need it.
+"""
+
+import os
+from typing import Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+from needle import Text
+
+
+# The file in a saved index that holds each array.
+_FILES = ('text.npy', 'suffixes.npy', 'lcp.npy')
+
+# How many entries of the suffix array each block of the range-minimum
+# table covers. The table has an entry per block, rather than per
+# entry, for each power of two, so it stays much smaller than the suffix
+# array, and the ends of a range are searched directly.
+_BLOCK = 64
+
+
+class SuffixIndex:
+    """A suffix array and LCP array for a fixed haystack.
+
+    As with `str_index`, a needle is found at index `i` if `i` is an
+    index of the haystack and the needle matches starting there. In
+    particular, the empty needle is found at every index.
+
+    >>> index = build_index('banana')
+    >>> index.suffixes.tolist()
+    [5, 3, 1, 0, 4, 2]
+    >>> index.lcp.tolist()
+    [0, 1, 3, 0, 0, 2]
+    >>> index.index('ana'), list(index.find_all('ana')), index.count('ana')
+    (1, [1, 3], 2)
+    >>> index.index('nab')
+    """
+
+    def __init__(self, text: np.ndarray, suffixes: np.ndarray,
+                 lcp: np.ndarray) -> None:
+        if text.dtype not in (np.uint8, np.uint32):
+            raise TypeError('text must be uint8 (bytes) or uint32 (str)')
+        if not len(text) == len(suffixes) == len(lcp):
+            raise ValueError('arrays must all be the same length')
+        self.text = text
+        self.suffixes = suffixes
+        self.lcp = lcp
+        # Built when `index` is first used, as it takes O(n) time.
+        self._minima: Optional[List[np.ndarray]] = None
+
+    def __len__(self) -> int:
+        """Returns the length of the haystack."""
+        return len(self.text)
+
+    def index(self, needle: Text) -> Optional[int]:
+        """Returns the first index where `needle` is found in the
+        haystack, or None if it isn't found.
+
+        >>> build_index(b'ab' * 1000).index(b'ba')
+        1
+        """
+        lo, hi = self._range(needle)
+        if lo == hi:
+            return None
+        return self._min_suffix(lo, hi)
+
+    def find_all(self, needle: Text) -> Iterator[int]:
+        """Generates every index where `needle` is found in the haystack,
+        in increasing order, including overlapping occurrences."""
+        lo, hi = self._range(needle)
+        yield from np.sort(self.suffixes[lo:hi]).tolist()
+
+    def count(self, needle: Text) -> int:
+        """Counts the (possibly overlapping) occurrences of `needle` in
+        the haystack.
+
+        >>> build_index(b'aaaa').count(b'aa')
+        3
+        """
+        lo, hi = self._range(needle)
+        return hi - lo
+
+    def longest_repeat(self) -> Tuple[int, int]:
+        """Finds the longest substring that occurs at least twice in the
+        haystack. Returns the index of its first occurrence and its
+        length.
+
+        >>> build_index('mississippi').longest_repeat()
+        (1, 4)
+        """
+        if len(self) == 0:
+            return 0, 0
+        best = int(np.argmax(self.lcp))
+        length = int(self.lcp[best])
+        if length == 0:
+            return 0, 0
+        return self.index(self._decode(best, length)), length
+
+    def _decode(self, position: int, length: int) -> Text:
+        """Returns the first `length` characters of the suffix at
+        `position` in the suffix array, as a string."""
+        start = int(self.suffixes[position])
+        codes = np.ascontiguousarray(self.text[start:start + length])
+        if codes.dtype == np.uint8:
+            return codes.tobytes()
+        return codes.astype('<u4').tobytes().decode('utf-32-le',
+                                                    'surrogatepass')
+
+    def save(self, directory: Union[str, os.PathLike]) -> None:
+        """Saves the index as .npy files in `directory`, creating it if
+        needed."""
+        os.makedirs(directory, exist_ok=True)
+        for name, array in zip(_FILES, (self.text, self.suffixes,
+                                        self.lcp)):
+            np.save(os.path.join(directory, name), array)
+
+    @staticmethod
+    def load(directory: Union[str, os.PathLike],
+             mmap: bool = True) -> 'SuffixIndex':
+        """Loads an index saved by `save`. If `mmap`, the arrays are
+        memory-mapped read-only rather than read into memory."""
+        mode = 'r' if mmap else None
+        text, suffixes, lcp = (np.load(os.path.join(directory, name),
+                                       mmap_mode=mode)
+                               for name in _FILES)
+        return SuffixIndex(text, suffixes, lcp)
+
+    def _min_suffix(self, lo: int, hi: int) -> int:
+        """Returns the smallest entry of the suffix array from position
+        `lo` up to (but not including) `hi`, which must differ."""
+        first, last = lo // _BLOCK + 1, (hi - 1) // _BLOCK
+        if first >= last:
+            # The range is within two neighbouring blocks.
+            return int(self.suffixes[lo:hi].min())
+        if self._minima is None:
+            self._minima = _block_minima(self.suffixes)
+        # The blocks from `first` up to `last` are wholly in the range,
+        # and are covered by two (overlapping) runs of 2ʲ blocks.
+        j = (last - first).bit_length() - 1
+        level = self._minima[j]
+        return int(min(self.suffixes[lo:first * _BLOCK].min(),
+                       self.suffixes[last * _BLOCK:hi].min(),
+                       level[first], level[last - (1 << j)]))
+
+    def _range(self, needle: Text) -> Tuple[int, int]:
+        """Returns the range of positions in the suffix array whose
+        suffixes start with `needle`."""
+        pattern = _codes(needle)
+        if pattern.dtype != self.text.dtype:
+            raise TypeError('needle and haystack must both be str or both '
+                            'be bytes')
+        lo = self._bisect(pattern, 0)
+        hi = self._bisect(pattern, 1, lo)
+        return lo, hi
+
+    def _bisect(self, pattern: np.ndarray, side: int, lo: int = 0) -> int:
+        """Returns the first position in the suffix array at or after
+        `lo` whose suffix compares at least `side` with `pattern`, where
+        comparing only looks at the first `len(pattern)` characters."""
+        hi = len(self.suffixes)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._compare(int(self.suffixes[mid]), pattern) < side:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _compare(self, start: int, pattern: np.ndarray) -> int:
+        """Compares the suffix at `start`, cut to the length of
+        `pattern`, with `pattern`. Returns -1, 0 or 1."""
+        m = len(pattern)
+        prefix = self.text[start:start + m]
+        differ = np.flatnonzero(prefix != pattern[:len(prefix)])
+        if len(differ):
+            d = differ[0]
+            return -1 if prefix[d] < pattern[d] else 1
+        return -1 if len(prefix) < m else 0
+
+
+def build_index(haystack: Text) -> SuffixIndex:
+    """Builds the suffix array and LCP array of `haystack`.
+
+    >>> build_index(b'abab').suffixes.tolist()
+    [2, 0, 3, 1]
+    """
+    text = _codes(haystack)
+    suffixes = _suffix_array(text)
+    return SuffixIndex(text, suffixes, _lcp(text, suffixes))
+
+
+def _codes(text: Text) -> np.ndarray:
+    """Converts a string to an array of its character codes.
+
+    >>> _codes('hé').tolist(), _codes(b'hi').tolist()
+    ([104, 233], [104, 105])
+    """
+    if isinstance(text, str):
+        return np.frombuffer(text.encode('utf-32-le', 'surrogatepass'),
+                             dtype='<u4').astype(np.uint32)
+    return np.frombuffer(text, dtype=np.uint8)
+
+
+def _suffix_array(text: np.ndarray) -> np.ndarray:
+    """Sorts the suffixes of `text` by prefix doubling. Only the ranks of
+    the current round are kept."""
+    n = len(text)
+    suffixes = _radix_argsort(text)
+    rank = _dense_ranks(text[suffixes], suffixes)
+    k = 1
+    while n and rank[suffixes[-1]] < n - 1:
+        # Order the suffixes by the rank of the k characters after their
+        # first k: those with nothing there come first, and the rest
+        # follow the current order of the suffixes k later.
+        later = suffixes[suffixes >= k] - k
+        by_second = np.concatenate(
+            [np.arange(n - 1, max(n - k, 0) - 1, -1, dtype=later.dtype),
+             later])
+        # Then stably by the rank of their first k characters.
+        suffixes = by_second[_radix_argsort(rank[by_second])]
+        second = np.full(n, -1, dtype=np.int64)
+        second[:max(n - k, 0)] = rank[k:]
+        key = rank.astype(np.int64) * (n + 1) + (second + 1)
+        rank = _dense_ranks(key[suffixes], suffixes)
+        k *= 2
+    return suffixes
+
+
+def _radix_argsort(keys: np.ndarray) -> np.ndarray:
+    """Sorts nonnegative integers stably in linear time, returning the
+    order, by sorting on 16 bits at a time from the lowest. NumPy sorts
+    16-bit integers stably by counting.
+
+    >>> _radix_argsort(np.array([70000, 3, 70000, 2, 3])).tolist()
+    [3, 1, 4, 0, 2]
+    """
+    keys = keys.astype(np.int64)
+    order = np.arange(len(keys))
+    top = int(keys.max()) if len(keys) else 0
+    shift = 0
+    while True:
+        digits = ((keys[order] >> shift) & 0xFFFF).astype(np.uint16)
+        order = order[np.argsort(digits, kind='stable')]
+        shift += 16
+        if top >> shift == 0:
+            return order
+
+
+def _dense_ranks(sorted_keys: np.ndarray,
+                 suffixes: np.ndarray) -> np.ndarray:
+    """Numbers the suffixes 0, 1, 2, … in order of their sorted keys,
+    giving equal keys equal numbers."""
+    dense = np.zeros(len(sorted_keys), dtype=np.int32)
+    np.cumsum(sorted_keys[1:] != sorted_keys[:-1], out=dense[1:])
+    rank = np.empty_like(dense)
+    rank[suffixes] = dense
+    return rank
+
+
+def _block_minima(suffixes: np.ndarray) -> List[np.ndarray]:
+    """Builds a sparse table of minima over blocks of `_BLOCK` entries of
+    `suffixes`: entry i of level j is the smallest entry in the blocks
+    from i up to (but not including) i + 2ʲ.
+
+    >>> [level.tolist() for level in _block_minima(np.arange(256)[::-1])]
+    [[192, 128, 64, 0], [128, 64, 0], [0]]
+    """
+    n = len(suffixes)
+    whole = n - n % _BLOCK
+    blocks = suffixes[:whole].reshape(-1, _BLOCK).min(axis=1)
+    if whole < n:
+        blocks = np.append(blocks, suffixes[whole:].min())
+    levels = [blocks]
+    width = 1
+    while 2 * width <= len(blocks):
+        previous = levels[-1]
+        levels.append(np.minimum(previous[:-width], previous[width:]))
+        width *= 2
+    return levels
+
+
+def _lcp(text: np.ndarray, suffixes: np.ndarray) -> np.ndarray:
+    """Computes the LCP array by Kasai's algorithm. Going through the
+    suffixes from longest to shortest, each shares at least one less
+    character with the suffix before it in sorted order than the
+    previous one did, so the matching never goes back, and takes O(n)
+    time in all. The loop reads and writes NumPy arrays through
+    memoryviews, which is about as quick as Python lists and takes a
+    fraction of the memory."""
+    n = len(text)
+    # A code that no character has ends the text, so that matching
+    # stops there.
+    padded = np.empty(n + 1, dtype=np.int64)
+    padded[:n] = text
+    padded[n] = -1
+    codes = memoryview(padded)
+    # The suffix before each suffix in sorted order, or -1 for none.
+    before = np.full(n, -1, dtype=np.int64)
+    before[suffixes[1:]] = suffixes[:-1]
+    common = np.zeros(n, dtype=np.int64)
+    found = memoryview(common)
+    h = 0
+    for i, j in enumerate(memoryview(before)):
+        if j < 0:
+            h = 0
+            continue
+        while codes[i + h] == codes[j + h]:
+            h += 1
+        found[i] = h
+        if h:
+            h -= 1
+    return common[suffixes]
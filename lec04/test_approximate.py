@@ -0,0 +1,79 @@
+import random
+
+import pytest
+
+from approximate import Match, compile_approximate, str_index_approx
+from needle import compile_needle
+
+
+def edit_distance(a, b):
+    row = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        previous, row[0] = row[0], i
+        for j in range(1, len(b) + 1):
+            previous, row[j] = row[j], min(row[j] + 1, row[j - 1] + 1,
+                                           previous + (a[i - 1] != b[j - 1]))
+    return row[-1]
+
+
+def naive_find_all(needle, haystack, k):
+    for end in range(1, len(haystack) + 1):
+        distances = [edit_distance(needle, haystack[s:end])
+                     for s in range(end + 1)]
+        best = min(distances)
+        if best <= k:
+            yield Match(distances.index(best), end, best)
+
+
+def test_matches_naive_on_random_text():
+    rng = random.Random(230)
+    for _ in range(300):
+        alphabet = rng.choice(['ab', 'abc', 'acgt'])
+        haystack = ''.join(rng.choice(alphabet)
+                           for _ in range(rng.randrange(0, 25)))
+        needle = ''.join(rng.choice(alphabet)
+                         for _ in range(rng.randrange(1, 7)))
+        k = rng.randrange(0, 4)
+        assert (list(compile_approximate(needle, k).find_all(haystack))
+                == list(naive_find_all(needle, haystack, k)))
+
+
+def test_exact_when_k_is_zero():
+    rng = random.Random(231)
+    for _ in range(100):
+        haystack = bytes(rng.choice(b'ab') for _ in range(50))
+        needle = bytes(rng.choice(b'ab') for _ in range(rng.randrange(1, 5)))
+        found = [m.start
+                 for m in compile_approximate(needle, 0).find_all(haystack)]
+        assert found == list(compile_needle(needle).find_all(haystack))
+
+
+def test_long_needle_spans_many_words():
+    rng = random.Random(232)
+    needle = ''.join(rng.choice('acgt') for _ in range(150))
+    typo = needle[:40] + needle[41:100] + 'x' + needle[100:]
+    haystack = 'g' * 500 + typo + 'g' * 500
+    match = compile_approximate(needle, 2).index(haystack)
+    assert match == Match(500, 500 + len(typo), 2)
+    assert compile_approximate(needle, 1).index(haystack) is None
+
+
+def test_start_argument():
+    assert compile_approximate('abc', 0).index('abc abc', 1) == Match(4, 7, 0)
+    # The match may not start before `start`.
+    assert compile_approximate('abc', 1).index('abc abc', 1) == Match(1, 3, 1)
+
+
+def test_empty_needle_and_helpers():
+    assert list(compile_approximate('', 2).find_all('ab')) == [
+        Match(0, 0, 0), Match(1, 1, 0)]
+    assert str_index_approx('hello', 'say helo', 1) == 4
+    assert str_index_approx('hello', 'say hi', 1) is None
+    assert compile_approximate('x', 1) is compile_approximate('x', 1)
+
+
+def test_errors():
+    with pytest.raises(ValueError):
+        compile_approximate('abc', -1)
+    with pytest.raises(TypeError):
+        compile_approximate('abc', 1).index(b'abc')
@@ -0,0 +1,87 @@
+import random
+from fractions import Fraction
+
+from aquarium import Aquarium, Fish
+
+
+def _check(aq):
+    fish = aq.all_fish
+    weights = [f.weight_kg for f in fish]
+    if not fish:
+        assert aq.heaviest_fish() is None
+        assert aq.average_weight() is None
+        assert aq.all_heaviest_fish() == []
+        return
+    most = max(weights)
+    assert aq.heaviest_fish() is fish[weights.index(most)]
+    assert aq.all_heaviest_fish() == [f for f in fish if f.weight_kg == most]
+    order = sorted(range(len(fish)), key=lambda i: (-weights[i], i))
+    for k in (1, 3, len(fish) + 1):
+        assert aq.heaviest(k) == [fish[i] for i in order[:k]]
+    exact = sum(Fraction(w) for w in weights) / len(fish)
+    assert aq.average_weight() == float(exact)
+
+
+def test_aggregates_follow_changes():
+    rng = random.Random(230)
+    aq = Aquarium([Fish(str(i), rng.randrange(10)) for i in range(20)])
+    shared = Fish('shared', 5)
+    for step in range(500):
+        action = rng.random()
+        if action < 0.3:
+            aq.append(shared if rng.random() < 0.1
+                      else Fish(str(step), rng.randrange(10)))
+        elif action < 0.5 and aq.all_fish:
+            aq.remove(rng.choice(aq.all_fish))
+        elif aq.all_fish:
+            rng.choice(aq.all_fish).weight_kg = rng.randrange(10)
+        aq.increment_all_ages()
+        _check(aq)
+
+
+def test_fish_in_two_aquariums():
+    nemo = Fish('nemo', 1)
+    first, second = Aquarium([nemo]), Aquarium([Fish('dory', 2), nemo])
+    first.remove(nemo)
+    nemo.weight_kg = 3
+    assert second.heaviest_fish() is nemo
+    assert first.heaviest_fish() is None
+    assert second.average_weight() == 2.5
+
+
+def test_ageing_leaves_journal_empty():
+    aq = Aquarium([Fish(str(i), i) for i in range(100)])
+    for _ in range(50):
+        aq.increment_all_ages()
+    assert len(aq._journal) == 0
+    aq.all_fish[0].weight_kg = 200
+    assert len(aq._journal) == 1
+    assert aq.heaviest_fish() is aq.all_fish[0]
+    assert len(aq._journal) == 0
+
+
+def test_all_fish_changed_directly():
+    aq = Aquarium([Fish('nemo', 1)])
+    dory = Fish('dory', 2)
+    aq.all_fish.append(dory)
+    assert aq.heaviest_fish() is dory
+    assert aq.average_weight() == 1.5
+    dory.weight_kg = 0
+    del aq.all_fish[0]
+    assert aq.heaviest_fish() is dory
+    _check(aq)
+
+
+def test_average_weight_is_exact():
+    rng = random.Random(230)
+    aq = Aquarium([Fish('a', 1e16), Fish('b', 1.0)])
+    aq.remove(aq.all_fish[0])
+    assert aq.average_weight() == 1.0
+    for step in range(200):
+        heavy = Fish(str(step), rng.choice([1e300, 1e16, 2.0 ** 70]))
+        aq.append(heavy)
+        aq.all_fish[0].weight_kg = rng.choice([0.1, 1e-300, 3.0])
+        heavy.weight_kg = -heavy.weight_kg
+        aq.remove(heavy)
+        _check(aq)
+    assert aq.average_weight() == aq.all_fish[0].weight_kg
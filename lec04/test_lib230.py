@@ -0,0 +1,742 @@
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+import copy
+from enum import Enum, auto
+import importlib
+import io
+import json
+import math
+import pickle
+import random
+import sys
+from typing import List, Optional
+
+import attr
+import pytest
+
+import lib230
+from lib230 import (Change, ChangeJournal, Factory, RecordReader,
+                    RecordWriter, SharedTable, Table, decode_records,
+                    dirty_fields, encode_records, mark_clean, record)
+
+
+class Counted:
+    """A value that counts how many times it is hashed."""
+    hashes = 0
+
+    def __hash__(self):
+        Counted.hashes += 1
+        return 7
+
+
+@record(frozen=True)
+class Pair:
+    a: int
+    b: object = None
+
+
+@record(slots=True, frozen=True)
+class SlottedPair:
+    a: int
+    b: object = None
+
+
+@pytest.mark.parametrize('Pair', [Pair, SlottedPair])
+def test_frozen_records(Pair):
+    slots = Pair is SlottedPair
+    p = Pair(1, 'x')
+    assert Pair.from_tuple((1, 'x')) == p
+    assert Pair.from_tuple([1, 'x']).b == 'x'
+    assert hash(Pair.from_tuple((1, 'x'))) == hash(p)
+    assert pickle.loads(pickle.dumps(Pair.from_tuple((1, 'x')))) == p
+    with pytest.raises(attr.exceptions.FrozenInstanceError):
+        p.a = 2
+    with pytest.raises(TypeError):
+        Pair.from_tuple((1,))
+    assert hasattr(p, '__dict__') != slots
+
+
+def test_hash_caching_is_opt_in():
+    @record(frozen=True, cache_hash=True)
+    class Box:
+        item: Counted
+
+    box = Box.from_tuple((Counted(),))
+    Counted.hashes = 0
+    hash(box)
+    hash(box)
+    assert Counted.hashes == 1
+
+    @record(frozen=True)
+    class Uncached:
+        item: Counted
+
+    uncached = Uncached(Counted())
+    Counted.hashes = 0
+    hash(uncached)
+    hash(uncached)
+    assert Counted.hashes == 2
+    assert set(vars(Uncached.from_tuple((1,)))) == {'item'}
+
+
+def test_slots_without_frozen():
+    @record(slots=True)
+    class Fish:
+        name: str
+        weight_kg: float = 0
+
+    fish = Fish('Cleo')
+    fish.weight_kg = 2
+    assert fish == Fish('Cleo', 2)
+    with pytest.raises(AttributeError):
+        fish.colour = 'gold'
+    assert not hasattr(Fish, 'from_tuple')
+
+
+def test_other_options_still_pass_through():
+    @record(init=False)
+    class Counter:
+        count: int
+
+        def __init__(self):
+            self.count = 0
+
+    assert Counter().count == 0
+
+    @record(frozen=True, hash=False)
+    class ByIdentity:
+        items: list = Factory(list)
+
+    assert hash(ByIdentity()) != hash(ByIdentity())
+    assert ByIdentity.from_tuple(([1],)).items == [1]
+
+
+def test_field_names_do_not_clash():
+    @record(frozen=True, slots=True)
+    class Odd:
+        values: int
+        cls: int
+        _new: int
+
+    assert Odd.from_tuple((1, 2, 3)) == Odd(1, 2, 3)
+
+
+@record
+class Fish:
+    name: str
+    weight_kg: float
+    age_days: int = 0
+    alive: bool = True
+
+    def increment_age(self) -> None:
+        self.age_days += 1
+
+
+@record(slots=True, frozen=True)
+class Point:
+    x: int
+    y: int
+
+
+def test_table_columns_are_packed():
+    tank = Table(Fish, [Fish('A', 10, 1), Fish('B', 2.5, 2, False)])
+    assert tank.column('weight_kg').typecode == 'd'
+    assert tank.column('age_days').typecode == 'q'
+    assert tank.column('name') == ['A', 'B']
+    assert [f.alive for f in tank] == [True, False]
+    assert tank.record(1) == Fish('B', 2.5, 2, False)
+    assert type(tank.record(1)) is Fish
+
+
+def test_table_rows_behave_like_records():
+    tank = Fish.Table()
+    tank.append(Fish('A', 1))
+    tank.extend(Fish(name, 2) for name in 'BC')
+    assert len(tank) == 3
+    row = tank[-1]
+    assert isinstance(row, Fish)
+    row.increment_age()
+    row.weight_kg = 4
+    assert tank.column('age_days').tolist() == [0, 0, 1]
+    assert repr(row) == "Fish(name='C', weight_kg=4.0, age_days=1, alive=True)"
+    assert row == tank[2] and row != tank[1]
+    with pytest.raises(TypeError):
+        hash(row)
+    with pytest.raises(IndexError):
+        tank[3]
+    tank[0] = Fish('Z', 9)
+    assert tank.record(0) == Fish('Z', 9.0)
+
+
+def test_table_rows_compare_and_pickle_as_records():
+    fish = [Fish('A', 1), Fish('B', 2, 3)]
+    tank = Fish.Table(fish)
+    assert tank[0] == fish[0] and fish[0] == tank[0]
+    assert tank[0] != fish[1] and fish[1] != tank[0]
+    assert list(tank) == fish and fish == list(tank)
+    assert tank[0] != ('A', 1.0, 0, True)
+    copied = pickle.loads(pickle.dumps(tank[1]))
+    assert type(copied) is Fish and copied == fish[1]
+    assert type(copy.copy(tank[1])) is Fish
+
+
+def test_table_aggregates_and_filters():
+    tank = Fish.Table(Fish(str(i), i % 5, i) for i in range(20))
+    assert tank.sum('weight_kg') == 40
+    assert tank.mean('age_days') == 9.5
+    assert tank.min('weight_kg') == 0 and tank.max('weight_kg') == 4
+    assert tank.argmax('weight_kg') == 4
+    heavy = tank.where('weight_kg', lambda w: w >= 4)
+    assert [f.name for f in heavy] == ['4', '9', '14', '19']
+    assert len(tank[::2]) == 10 and tank[::2][1].name == '2'
+    assert Fish.Table().argmax('weight_kg') is None
+    with pytest.raises(ValueError):
+        Fish.Table().mean('weight_kg')
+    with pytest.raises(ValueError):
+        tank.select([True])
+
+
+def test_table_falls_back_to_lists():
+    tank = Fish.Table([Fish('A', 1, 2)])
+    tank.append(Fish('B', 1, 2.5))
+    tank.append(Fish('C', 1, 2 ** 70))
+    assert tank.column('age_days') == [2, 2.5, 2 ** 70]
+    tank.extend([Fish('D', 'heavy')])
+    assert tank[3].weight_kg == 'heavy' and tank[0].weight_kg == 1.0
+
+
+def test_table_of_frozen_records():
+    points = Point.Table([Point(1, 2), Point(3, 4)])
+    assert points[1] == Point.Table([Point(3, 4)])[0]
+    with pytest.raises(attr.exceptions.FrozenInstanceError):
+        points[0].x = 5
+    assert points.record(0) == Point(1, 2)
+    assert hash(points.record(0)) == hash(Point(1, 2))
+
+
+def test_table_to_numpy():
+    np = pytest.importorskip('numpy')
+    tank = Fish.Table([Fish('A', 1), Fish('B', 3)])
+    weights = tank.to_numpy('weight_kg')
+    assert weights.tolist() == [1.0, 3.0]
+    assert tank.to_numpy('alive').dtype == np.bool_
+    assert tank.select(weights > 2)[0].name == 'B'
+
+
+class Colour(Enum):
+    RED = auto()
+    GREEN = auto()
+
+
+@record
+class Inner:
+    colour: Colour
+    tags: List[str]
+
+
+@record(slots=True, frozen=True)
+class Everything:
+    i: int
+    f: float
+    b: bool
+    s: str
+    raw: bytes
+    inner: Inner
+    maybe: Optional[Inner]
+    numbers: List[Optional[int]]
+
+
+@record
+class Node:
+    value: int
+    next: Optional['Node'] = None
+
+
+def make_everything(rng):
+    def inner():
+        return Inner(rng.choice(list(Colour)),
+                     [rng.choice(['', 'x', 'é', '\U0001f41f'])
+                      for _ in range(rng.randrange(3))])
+    return Everything(rng.randrange(-2 ** 63, 2 ** 63), rng.random(),
+                      rng.random() < 0.5, 'fish' * rng.randrange(3),
+                      bytes(rng.randrange(256) for _ in range(3)), inner(),
+                      inner() if rng.random() < 0.5 else None,
+                      [rng.choice([None, 1, -7]) for _ in range(2)])
+
+
+def test_codec_round_trip():
+    rng = random.Random(230)
+    rows = [make_everything(rng) for _ in range(1000)]
+    buffer = io.BytesIO()
+    with RecordWriter(buffer, Everything, block_size=64) as writer:
+        writer.write_all(rows)
+    buffer.seek(0)
+    decoded = list(RecordReader(buffer, Everything))
+    assert decoded == rows
+    assert all(type(row.b) is bool for row in decoded)
+    assert decode_records(Everything, encode_records(Everything, [])) == []
+
+
+def test_codec_read_table(tmp_path):
+    path = tmp_path / 'everything.rec'
+    rng = random.Random(231)
+    rows = [make_everything(rng) for _ in range(100)]
+    with RecordWriter(path, Everything, block_size=30) as writer:
+        writer.write_all(rows)
+    with RecordReader(str(path), Everything) as reader:
+        table = reader.read_table()
+    assert table.column('i').tolist() == [row.i for row in rows]
+    assert table.column('inner') == [row.inner for row in rows]
+    assert [table.record(k) for k in range(len(table))] == rows
+
+
+def test_codec_recursive_records():
+    chain = Node(1, Node(2, Node(3)))
+    assert decode_records(Node, encode_records(Node, [chain, Node(4)])) == [
+        chain, Node(4)]
+
+
+def test_codec_rejects_mismatches():
+    data = encode_records(Node, [Node(1)])
+    with pytest.raises(ValueError):
+        decode_records(Inner, data)
+    with pytest.raises(ValueError):
+        decode_records(Node, data[:-1])
+    with pytest.raises(ValueError):
+        decode_records(Node, b'not a record file')
+
+    @record
+    class Untyped:
+        anything: object
+
+    with pytest.raises(TypeError):
+        encode_records(Untyped, [])
+
+
+# A module of records, for testing the code cache.
+SHAPES = """
+from lib230 import record
+
+@record(frozen=True)
+class Square:
+    side: float
+
+@record(slots=True)
+class Circle:
+    radius: float
+"""
+
+
+@pytest.fixture
+def import_shapes(monkeypatch, tmp_path):
+    """Gives a function that writes its argument as the module `shapes`
+    and imports it afresh, with its own code cache, returning the module
+    and the cache."""
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setattr(sys, 'dont_write_bytecode', False)
+    monkeypatch.delenv('LIB230_NO_CODE_CACHE', raising=False)
+
+    def import_shapes(source):
+        (tmp_path / 'shapes.py').write_text(source)
+        sys.modules.pop('shapes', None)
+        lib230._CODE_CACHES.pop('shapes', None)
+        importlib.invalidate_caches()
+        shapes = importlib.import_module('shapes')
+        return shapes, lib230._CODE_CACHES['shapes']
+
+    yield import_shapes
+    sys.modules.pop('shapes', None)
+    lib230._CODE_CACHES.pop('shapes', None)
+
+
+def test_code_cache_reused(import_shapes):
+    shapes, cache = import_shapes(SHAPES)
+    assert cache.misses and not cache.hits
+    cache.save()
+
+    shapes, cache = import_shapes(SHAPES)
+    assert cache.hits and not cache.misses
+    assert shapes.Square(2) == shapes.Square.from_tuple((2,))
+    assert shapes.Circle(1) != shapes.Circle(2)
+
+
+def test_code_cache_misses_changed_classes(import_shapes):
+    shapes, cache = import_shapes(SHAPES)
+    cache.save()
+
+    changed = SHAPES.replace('side: float', 'side: float\n    colour: str')
+    shapes, cache = import_shapes(changed)
+    assert cache.misses
+    assert shapes.Square(2, 'red').colour == 'red'
+    cache.save()
+    # Only the code that was used is kept.
+    assert len(lib230._CodeCache(cache.path).codes) == len(cache.used)
+
+
+def test_code_cache_ignores_bad_files(import_shapes):
+    shapes, cache = import_shapes(SHAPES)
+    with open(cache.path, 'wb') as file:
+        file.write(b'not a cache')
+    shapes, cache = import_shapes(SHAPES)
+    assert cache.misses and not cache.hits
+    assert shapes.Circle(1).radius == 1
+
+
+def test_code_cache_turned_off(import_shapes, monkeypatch):
+    monkeypatch.setenv('LIB230_NO_CODE_CACHE', '1')
+    shapes, cache = import_shapes(SHAPES)
+    assert cache is None
+    assert shapes.Square(1).side == 1
+
+
+@pytest.fixture
+def instrumentation():
+    """Turns instrumentation on for a test."""
+    lib230.enable_instrumentation(trace_memory=True)
+    yield
+    lib230.disable_instrumentation()
+    lib230.reset_metrics()
+
+
+def test_instrumentation_off_changes_nothing():
+    def f():
+        pass
+
+    @record(instrument=True)
+    class Quiet:
+        a: int
+
+        def method(self):
+            pass
+
+    assert lib230.instrumented(f) is f
+    assert '__del__' not in Quiet.__dict__
+    assert '__wrapped__' not in vars(Quiet.method)
+
+
+def test_instrumented_calls(instrumentation):
+    @record(instrument=True)
+    class Roll:
+        ids: List[int] = Factory(list)
+
+        def find(self, id):
+            return id in self.ids
+
+        @classmethod
+        def empty(cls):
+            return cls()
+
+    roll = Roll.empty()
+    roll.ids.extend(range(1000))
+    for i in range(5):
+        roll.find(i)
+    calls = lib230.metrics_snapshot()['calls']
+    prefix = __name__ + '.test_instrumented_calls.<locals>.Roll.'
+    find = calls[prefix + 'find']
+    assert find['calls'] == 5
+    assert find['buckets']['+Inf'] == 5
+    assert list(find['buckets'].values()) == sorted(find['buckets'].values())
+    assert calls[prefix + 'empty']['calls'] == 1
+    assert calls[prefix + '__init__']['calls'] == 1
+
+    lib230.disable_instrumentation()
+    roll.find(1)
+    assert lib230.metrics_snapshot()['calls'][prefix + 'find']['calls'] == 5
+
+
+def test_instrumented_memory(instrumentation):
+    @lib230.instrumented
+    def allocate(kept):
+        kept.append(list(range(10000)))
+
+    kept = []
+    allocate(kept)
+    snapshot = lib230.metrics_snapshot()
+    name = __name__ + '.test_instrumented_memory.<locals>.allocate'
+    assert snapshot['calls'][name]['allocated_bytes'] > 80000
+    assert snapshot['memory']['traced_bytes'] > 0
+
+
+def test_live_instances(instrumentation):
+    @record(slots=True, frozen=True, instrument=True)
+    class Dot:
+        x: int
+
+    class Subdot(Dot):
+        pass
+
+    name = __name__ + '.test_live_instances.<locals>.Dot'
+
+    def live():
+        return lib230.metrics_snapshot()['instances'][name]['live']
+
+    dots = [Dot(1), Dot.from_tuple((2,)), Subdot(3)]
+    assert live() == 2
+    dots.append(copy.copy(dots[0]))
+    assert live() == 3
+    table = Dot.Table(dots)
+    assert table[0].x == 1 and live() == 3
+    del dots[:2]
+    assert live() == 1
+    assert lib230.metrics_snapshot()['instances'][name]['created'] == 3
+
+
+def test_metrics_exports(instrumentation):
+    @lib230.instrumented
+    def work():
+        pass
+
+    work()
+    name = __name__ + '.test_metrics_exports.<locals>.work'
+    assert json.loads(lib230.metrics_json())['calls'][name]['calls'] == 1
+    text = lib230.metrics_prometheus()
+    assert '# TYPE lib230_call_seconds histogram' in text
+    assert 'lib230_call_seconds_count{{function="{}"}} 1'.format(name) in text
+    assert 'lib230_call_seconds_bucket{{function="{}",le="+Inf"}} 1'.format(
+        name) in text
+
+
+@record(frozen=True, intern=True)
+class InternedPair:
+    a: int
+    b: Optional[str] = None
+
+
+@record(slots=True, frozen=True, intern=2)
+class InternedSlottedPair:
+    a: int
+    b: Optional[str] = None
+
+
+@pytest.mark.parametrize('Pair', [InternedPair, InternedSlottedPair])
+def test_interning(Pair):
+    p = Pair(1, 'x')
+    assert Pair(1, b='x') is p
+    assert Pair.from_tuple((1, 'x')) is p
+    assert Pair(1) is Pair(1, None)
+    assert Pair(1) is not p and Pair(1) != p
+    assert copy.copy(p) is p and copy.deepcopy(p) is p
+    assert pickle.loads(pickle.dumps(p)) is p
+    assert attr.evolve(p, a=2) is Pair(2, 'x')
+    assert decode_records(Pair, encode_records(Pair, [p]))[0] is p
+
+    # Unhashable values can't be interned, but can still be stored.
+    assert Pair(1, []) is not Pair(1, [])
+    assert Pair(1, []) == Pair(1, [])
+
+
+def test_interning_keeps_exact_values():
+    @record(frozen=True, intern=True)
+    class Number:
+        x: float
+
+    assert Number(0.0) is Number(0.0)
+    assert math.copysign(1, Number(-0.0).x) == -1
+    assert Number(1) is not Number(1.0)
+    assert type(Number(1).x) is int and type(Number(1.0).x) is float
+    assert Number(True).x is True
+    assert Number(1j) is not Number(complex(-0.0, 1))
+
+
+def test_interning_forgets_unused_values():
+    interner = lib230._INTERNERS[InternedSlottedPair]
+    values = [InternedSlottedPair(i) for i in range(10)]
+    assert len(interner) >= 10
+    del values
+    # Only the two most recent values are kept alive.
+    assert len(interner) == 2
+    assert InternedSlottedPair(9) is InternedSlottedPair(9)
+
+
+def test_interning_subclasses_and_views():
+    class Labelled(InternedPair):
+        pass
+
+    assert Labelled(1, 'x') is not Labelled(1, 'x')
+    assert Labelled(1, 'x').b == 'x'
+    table = InternedPair.Table([InternedPair(1), InternedPair(2)])
+    assert table[1].a == 2
+    assert table.record(1) is InternedPair(2)
+
+
+def test_interning_needs_frozen_and_weakref():
+    with pytest.raises(ValueError):
+        @record(intern=True)
+        class Loose:
+            a: int
+    with pytest.raises(ValueError):
+        @record(slots=True, frozen=True, intern=True, weakref_slot=False)
+        class Unreferenceable:
+            a: int
+
+
+@record
+class Label:
+    text: str
+    data: bytes
+    n: int
+
+
+# SharedTable needs multiprocessing.shared_memory.
+needs_shared_memory = pytest.mark.skipif(sys.version_info < (3, 8),
+                                         reason='needs Python 3.8')
+
+
+@needs_shared_memory
+def test_shared_table():
+    fish = [Fish('Nemo', 1.5, 3), Fish('Dory', 2.5, 7, False), Fish('€', 2.5)]
+    with SharedTable.publish(Fish, fish) as tank:
+        assert [tank.record(i) for i in range(3)] == fish
+        assert list(tank) == fish
+        seen = SharedTable.attach(Fish, tank.name)
+        assert len(seen) == 3
+        assert [seen.record(i) for i in range(3)] == fish
+        assert seen[1].alive is False and seen[-1].name == '€'
+        assert seen.sum('weight_kg') == 6.5
+        assert seen.argmax('weight_kg') == 1
+        assert [f.name for f in seen.where('age_days', lambda a: a > 0)] == [
+            'Nemo', 'Dory']
+        assert seen[::-1].column('name') == ['€', 'Dory', 'Nemo']
+        assert seen[1:].column('age_days') == array('q', [7, 0])
+        assert seen.to_numpy('age_days').tolist() == [3, 7, 0]
+        with pytest.raises(TypeError):
+            seen[0].age_days = 4
+        with pytest.raises(TypeError):
+            seen[0].name = 'Marlin'
+        with pytest.raises(TypeError):
+            seen.append(fish[0])
+        with pytest.raises(ValueError):
+            seen.unlink()
+        seen.close()
+        seen.close()
+    with pytest.raises(FileNotFoundError):
+        SharedTable.attach(Fish, tank.name)
+
+
+@needs_shared_memory
+def test_shared_table_text():
+    labels = [Label('', b'', 0), Label('h\u00e9\U0001f41f', b'\0\xff', -1)]
+    with SharedTable.publish(Label, labels) as shared:
+        assert [shared.record(i) for i in range(2)] == labels
+        assert list(shared.column('data')) == [b'', b'\0\xff']
+    with SharedTable.publish(Label, []) as empty:
+        assert len(SharedTable.attach(Label, empty.name)) == 0
+
+
+@record
+class Maybe:
+    id: Optional[int]
+    name: Optional[str]
+    flag: Optional[bool] = None
+
+
+@needs_shared_memory
+def test_shared_table_optional_fields():
+    rows = [Maybe(1, None, True), Maybe(None, 'x'), Maybe(3, 'y', False)]
+    with SharedTable.publish(Maybe, rows) as shared:
+        assert [shared.record(i) for i in range(3)] == rows
+        assert list(shared.column('flag')) == [True, None, False]
+        assert shared[::2].column('id') == [1, 3]
+
+
+def _shared_total(table):
+    return table.sum('weight_kg'), len(table)
+
+
+def _shared_last(table):
+    return table[-1]
+
+
+@needs_shared_memory
+def test_shared_table_in_another_process():
+    fish = [Fish(str(i), i / 2) for i in range(1000)]
+    with SharedTable.publish(Fish, fish) as tank:
+        assert len(pickle.dumps(tank)) < 200
+        with ProcessPoolExecutor(1) as pool:
+            assert pool.submit(_shared_total, tank).result() == (
+                sum(f.weight_kg for f in fish), 1000)
+            assert pool.submit(_shared_last, tank).result() == fish[-1]
+        # The worker didn't remove the shared memory when it ended.
+        assert SharedTable.attach(Fish, tank.name)[999].name == '999'
+
+
+@needs_shared_memory
+def test_shared_table_mismatches():
+    with pytest.raises(TypeError):
+        SharedTable.publish(Inner, [])
+    with SharedTable.publish(Fish, [Fish('A', 1)]) as tank:
+        with pytest.raises(ValueError):
+            SharedTable.attach(Label, tank.name)
+
+
+@record(track_changes=True)
+class Tracked:
+    name: str
+    count: int = 0
+
+    def __attrs_post_init__(self):
+        self.count += 1
+
+
+@record(slots=True, track_changes=True)
+class SlottedTracked:
+    name: str
+    count: int = 0
+
+
+@pytest.mark.parametrize('Cls', [Tracked, SlottedTracked])
+def test_dirty_fields(Cls):
+    item = Cls('a')
+    assert dirty_fields(item) == set()
+    item.name = 'b'
+    item.count += 1
+    assert dirty_fields(item) == {'name', 'count'}
+    mark_clean(item)
+    assert dirty_fields(item) == set()
+    assert Cls('a') == Cls('a')
+
+
+def test_change_journal():
+    a, b = Tracked('a'), SlottedTracked('b')
+    journal = ChangeJournal([a, b])
+    other = ChangeJournal([a])
+    journal.watch(a)
+    a.count = 5
+    b.name = 'c'
+    assert journal.take() == [Change(a, 'count', 1, 5),
+                              Change(b, 'name', 'b', 'c')]
+    assert len(other) == 1
+    journal.unwatch(a)
+    a.count = 6
+    assert len(journal) == 0 and len(other) == 2
+    # Dropping a journal, or a record, forgets it.
+    del other
+    a.count = 7
+    del a
+    b.name = 'd'
+    assert [c.new for c in journal.take()] == ['d']
+
+
+def test_change_journal_fields():
+    a = Tracked('a')
+    counts = ChangeJournal([a], fields=['count'])
+    everything = ChangeJournal([a])
+    a.name = 'b'
+    a.count = 2
+    assert counts.take() == [Change(a, 'count', 1, 2)]
+    assert len(everything) == 2
+    # The other fields are still marked dirty.
+    assert dirty_fields(a) == {'name', 'count'}
+
+
+def test_change_tracking_limits():
+    with pytest.raises(TypeError):
+        ChangeJournal([Fish('A', 1)])
+    with pytest.raises(ValueError):
+        record(frozen=True, track_changes=True)(type('F', (), {}))
+
+    class SubTracked(Tracked):
+        pass
+    item = SubTracked('a')
+    item.count = 2
+    assert dirty_fields(item) == set()
@@ -0,0 +1,52 @@
+import random
+
+from multi_needle import compile_needles
+from needle import compile_needle
+
+
+def naive_matches(needles, haystack):
+    return sorted(((needle, start)
+                   for needle in set(needles)
+                   for start in compile_needle(needle).find_all(haystack)),
+                  key=lambda m: (m[1] + len(m[0]), -len(m[0])))
+
+
+def test_matches_naive_on_random_text():
+    rng = random.Random(230)
+    for _ in range(300):
+        alphabet = rng.choice(['ab', 'abc', 'acgt'])
+        needles = [''.join(rng.choice(alphabet)
+                           for _ in range(rng.randrange(1, 5)))
+                   for _ in range(rng.randrange(1, 12))]
+        haystack = ''.join(rng.choice(alphabet + 'x')
+                           for _ in range(rng.randrange(0, 80)))
+        automaton = compile_needles(needles)
+        expected = naive_matches(needles, haystack)
+        assert list(automaton.find_all(haystack)) == expected
+        assert automaton.count(haystack) == len(expected)
+        first = min(expected, key=lambda m: (m[1], -len(m[0])),
+                    default=None)
+        assert automaton.index(haystack) == first
+
+
+def test_reusable_across_documents():
+    automaton = compile_needles(['cat', 'dog', 'at'])
+    assert automaton.count('the cat sat') == 3
+    assert automaton.count('hot dog') == 1
+    assert automaton.index('nothing here') is None
+
+
+def test_many_needles_compact():
+    rng = random.Random(1)
+    needles = {''.join(rng.choice('abcdefghijklmnopqrstuvwxyz')
+                       for _ in range(rng.randrange(3, 9)))
+               for _ in range(20000)}
+    automaton = compile_needles(needles)
+    assert len(automaton) == len(needles)
+    assert automaton.n_states() <= sum(len(n) for n in needles) + 1
+    text = ' '.join(sorted(needles)[:50])
+    assert {m[0] for m in automaton.find_all(text)} >= set(sorted(needles)[:50])
+
+
+def test_no_needles():
+    assert list(compile_needles([]).find_all('abc')) == []
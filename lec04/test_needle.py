@@ -0,0 +1,48 @@
+import random
+
+import pytest
+
+from iteration import _matches_at
+from needle import compile_needle
+
+
+def naive_find_all(needle, haystack):
+    return [i for i in range(len(haystack))
+            if _matches_at(needle, haystack, i)]
+
+
+def test_matches_naive_on_random_text():
+    rng = random.Random(230)
+    for _ in range(500):
+        alphabet = rng.choice(['ab', 'abc', 'acgt', 'abcdefghij'])
+        haystack = ''.join(rng.choice(alphabet)
+                           for _ in range(rng.randrange(0, 60)))
+        needle = ''.join(rng.choice(alphabet)
+                         for _ in range(rng.randrange(0, 6)))
+        compiled = compile_needle(needle)
+        expected = naive_find_all(needle, haystack)
+        assert list(compiled.find_all(haystack)) == expected
+        assert compiled.count(haystack) == len(expected)
+        assert compiled.index(haystack) == (expected[0] if expected
+                                            else None)
+
+
+def test_bytes():
+    compiled = compile_needle(b'\x00\x01')
+    assert list(compiled.find_all(b'\x00\x01\x00\x01\x01')) == [0, 2]
+    with pytest.raises(TypeError):
+        compiled.index('\x00\x01')
+
+
+def test_start():
+    compiled = compile_needle('ab')
+    assert list(compiled.find_all('abcabcab', 1)) == [3, 6]
+    assert compiled.index('abcabcab', 7) is None
+
+
+def test_switches_to_kmp_on_repetitive_text():
+    # Horspool alone would take quadratic time here.
+    haystack = 'a' * 200000 + 'b'
+    needle = 'a' * 1000 + 'b'
+    assert compile_needle(needle).index(haystack) == 199000
+    assert compile_needle('a' * 1000).count('a' * 5000) == 4001
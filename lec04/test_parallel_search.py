@@ -0,0 +1,117 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import time
+
+import pytest
+
+from iteration import find_satisfies
+from parallel_search import find_all_satisfies, find_satisfies_parallel
+
+
+def is_special(x):
+    return x % 97 == 13 and x % 5 == 3
+
+
+def special_block(block):
+    return [is_special(x) for x in block]
+
+
+def test_first_matches_sequential_with_processes():
+    with ProcessPoolExecutor(2) as pool:
+        for haystack in [range(0), range(10), range(1, 5000),
+                         range(5000, 0, -3)]:
+            assert (find_satisfies_parallel(haystack, is_special,
+                                            chunk_size=64, executor=pool)
+                    == find_satisfies(haystack, is_special))
+
+
+def test_default_pool():
+    assert find_satisfies_parallel(range(1000), is_special) == 13
+
+
+def test_vectorized():
+    with ThreadPoolExecutor(4) as pool:
+        assert (find_satisfies_parallel(range(1, 5000), special_block,
+                                        chunk_size=50, executor=pool,
+                                        vectorized=True)
+                == find_satisfies(range(1, 5000), is_special))
+        assert (list(find_all_satisfies(range(5000), special_block,
+                                        chunk_size=50, executor=pool,
+                                        vectorized=True))
+                == [x for x in range(5000) if is_special(x)])
+
+
+def test_earliest_hit_wins_even_when_later_chunk_is_faster():
+    # The first chunk finishes last, but its hit still comes first.
+    def slow_start(x):
+        if x < 10:
+            time.sleep(0.01)
+        return x in (5, 50)
+
+    with ThreadPoolExecutor(4) as pool:
+        assert find_satisfies_parallel(range(100), slow_start,
+                                       chunk_size=10, executor=pool) == 5
+
+
+def test_cancels_chunks_after_hit():
+    checked = []
+
+    def record(x):
+        checked.append(x)
+        return x == 3
+
+    with ThreadPoolExecutor(1) as pool:
+        assert find_satisfies_parallel(range(10 ** 6), record,
+                                       chunk_size=10, executor=pool,
+                                       max_workers=1) == 3
+    assert len(checked) < 1000
+
+
+def test_error_after_hit_is_dropped():
+    # The chunk that raises finishes first, but the hit comes before it.
+    def fails_late(x):
+        if x < 10:
+            time.sleep(0.01)
+        return 1 / (x - 50) > 0 if x >= 50 else x == 9
+
+    assert find_satisfies(range(100), fails_late) == 9
+    with ThreadPoolExecutor(4) as pool:
+        for _ in range(5):
+            assert find_satisfies_parallel(range(100), fails_late,
+                                           chunk_size=10, executor=pool,
+                                           max_workers=4) == 9
+
+
+def test_error_before_hit_is_raised():
+    def fails_early(x):
+        return 1 / (x - 15) > 0 if x < 20 else x == 50
+
+    with ThreadPoolExecutor(4) as pool:
+        with pytest.raises(ZeroDivisionError):
+            find_satisfies_parallel(range(100), fails_early, chunk_size=10,
+                                    executor=pool, max_workers=4)
+
+
+def test_find_all_streams_and_stops_early():
+    with ThreadPoolExecutor(2) as pool:
+        found = find_all_satisfies(range(10 ** 9), lambda x: x % 7 == 0,
+                                   chunk_size=100, executor=pool)
+        assert [next(found) for _ in range(3)] == [0, 7, 14]
+        found.close()
+
+
+def test_with_list_haystack_and_processes():
+    haystack = list(range(300, 0, -1))
+    with ProcessPoolExecutor(2) as pool:
+        assert (list(find_all_satisfies(haystack, is_special, chunk_size=7,
+                                        executor=pool))
+                == [x for x in haystack if is_special(x)])
+
+
+def test_bad_chunk_size():
+    with ThreadPoolExecutor(1) as pool:
+        with pytest.raises(ValueError):
+            find_satisfies_parallel(range(10), is_special, chunk_size=0,
+                                    executor=pool)
+        with pytest.raises(ValueError):
+            find_satisfies_parallel(range(10), is_special, executor=pool,
+                                    max_workers=0)
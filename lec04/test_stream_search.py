@@ -0,0 +1,75 @@
+import io
+import mmap
+import random
+
+import pytest
+
+from needle import compile_needle
+from stream_search import stream_count, stream_find_all, stream_index
+
+
+def test_matches_in_memory_search_at_every_chunk_size():
+    rng = random.Random(230)
+    for _ in range(200):
+        haystack = bytes(rng.choice(b'ab')
+                         for _ in range(rng.randrange(0, 40)))
+        needle = bytes(rng.choice(b'ab') for _ in range(rng.randrange(0, 5)))
+        expected = list(compile_needle(needle).find_all(haystack))
+        for chunk_size in [1, 2, 3, 7, 100]:
+            assert list(stream_find_all(needle, io.BytesIO(haystack),
+                                        chunk_size)) == expected
+
+
+def test_file_path_bytes_and_str(tmp_path):
+    path = tmp_path / 'log.txt'
+    path.write_bytes(b'ERROR one\r\nok\r\nERROR two\r\n')
+    assert list(stream_find_all(b'ERROR', path, chunk_size=4)) == [0, 15]
+    assert list(stream_find_all('ERROR', str(path), chunk_size=4)) == [0, 15]
+    assert stream_count('\r\n', path, chunk_size=3) == 3
+
+
+def test_mmap(tmp_path):
+    path = tmp_path / 'big.bin'
+    path.write_bytes(b'x' * 10000 + b'needle' + b'x' * 10000)
+    with open(path, 'rb') as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        assert stream_index(b'needle', m, chunk_size=1000) == 10000
+        assert stream_index(b'needle', m, chunk_size=10003) == 10000
+
+
+def test_str_needle_counts_characters_across_split_code_points():
+    haystack = 'αβγ' * 50 + 'δ€'
+    data = haystack.encode('utf-8')
+    for chunk_size in [1, 2, 5]:
+        assert stream_index('γδ€', io.BytesIO(data), chunk_size) == 149
+        assert stream_index('γδ€', data, chunk_size) == 149
+    assert stream_index('δ', haystack.encode('utf-16'), 3,
+                        encoding='utf-16') == 150
+
+
+def test_text_stream():
+    assert list(stream_find_all('ab', io.StringIO('xabab'), 1)) == [1, 3]
+    with pytest.raises(TypeError):
+        list(stream_find_all(b'ab', io.StringIO('xabab')))
+
+
+def test_empty_needle():
+    assert list(stream_find_all(b'', b'abc', chunk_size=2)) == [0, 1, 2]
+    assert stream_index(b'', b'') is None
+
+
+def test_reads_lazily():
+    class Endless(io.RawIOBase):
+        def readable(self):
+            return True
+
+        def readinto(self, buffer):
+            buffer[:] = b'z' * len(buffer)
+            return len(buffer)
+
+    assert stream_index(b'zz', Endless(), chunk_size=16) == 0
+
+
+def test_bad_chunk_size():
+    with pytest.raises(ValueError):
+        stream_index(b'a', b'a', chunk_size=0)
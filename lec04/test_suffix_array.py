@@ -0,0 +1,92 @@
+import random
+
+import numpy as np
+import pytest
+
+from needle import compile_needle
+from suffix_array import SuffixIndex, build_index
+
+
+def naive_suffixes(haystack):
+    return sorted(range(len(haystack)), key=lambda i: haystack[i:])
+
+
+def naive_lcp(haystack, suffixes):
+    lcp = [0] * len(suffixes)
+    for j in range(1, len(suffixes)):
+        a, b = haystack[suffixes[j - 1]:], haystack[suffixes[j]:]
+        while lcp[j] < min(len(a), len(b)) and a[lcp[j]] == b[lcp[j]]:
+            lcp[j] += 1
+    return lcp
+
+
+def test_arrays_match_naive():
+    rng = random.Random(230)
+    for _ in range(300):
+        alphabet = rng.choice(['a', 'ab', 'acgt', 'αβ'])
+        haystack = ''.join(rng.choice(alphabet)
+                           for _ in range(rng.randrange(0, 50)))
+        index = build_index(haystack)
+        expected = naive_suffixes(haystack)
+        assert index.suffixes.tolist() == expected
+        assert index.lcp.tolist() == naive_lcp(haystack, expected)
+
+
+def test_queries_match_compiled_needle():
+    rng = random.Random(231)
+    for _ in range(100):
+        haystack = bytes(rng.choice(b'abc')
+                         for _ in range(rng.randrange(0, 80)))
+        index = build_index(haystack)
+        for _ in range(10):
+            needle = bytes(rng.choice(b'abc')
+                           for _ in range(rng.randrange(0, 5)))
+            compiled = compile_needle(needle)
+            assert list(index.find_all(needle)) == list(
+                compiled.find_all(haystack))
+            assert index.count(needle) == compiled.count(haystack)
+            assert index.index(needle) == compiled.index(haystack)
+
+
+def test_empty_haystack():
+    index = build_index('')
+    assert len(index) == 0
+    assert index.index('') is None
+    assert index.count('a') == 0
+    assert index.longest_repeat() == (0, 0)
+
+
+def test_type_mismatch():
+    with pytest.raises(TypeError):
+        build_index('abc').index(b'a')
+
+
+def test_save_and_mmap(tmp_path):
+    haystack = 'the quick brown fox jumps over the lazy dog ' * 50
+    build_index(haystack).save(tmp_path / 'index')
+    index = SuffixIndex.load(tmp_path / 'index')
+    assert isinstance(index.suffixes, np.memmap)
+    assert list(index.find_all('the lazy')) == list(
+        compile_needle('the lazy').find_all(haystack))
+    start, length = index.longest_repeat()
+    assert length == len(haystack) - 44
+    assert SuffixIndex.load(tmp_path / 'index', mmap=False).count('o') == 200
+
+
+def test_large_random_text():
+    rng = np.random.RandomState(230)
+    haystack = bytes(rng.randint(97, 101, size=200000).astype(np.uint8))
+    index = build_index(haystack)
+    assert (np.diff(index.suffixes[:1000]) != 0).all()
+    for needle in [b'abcd', b'dddddddd', haystack[1000:1020]]:
+        assert index.count(needle) == compile_needle(needle).count(haystack)
+
+
+def test_index_of_common_needles():
+    # Needles with many occurrences, so the range-minimum table is used.
+    rng = random.Random(232)
+    haystack = bytes(rng.choice(b'ab') for _ in range(5000))
+    index = build_index(haystack)
+    for _ in range(300):
+        needle = bytes(rng.choice(b'ab') for _ in range(rng.randrange(6)))
+        assert index.index(needle) == compile_needle(needle).index(haystack)
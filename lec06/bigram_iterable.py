@@ -32,7 +32,7 @@ def _bigrams_in(corpus: Iterable[str]) -> Iterable[_Bigram]:
 # but by defining our own __init__ we can choose to take no arguments
 # instead.
 
-@record(init=False)
+@record(init=False, instrument=True)
 class BigramModel:
     """A Markov model as a collection of bigrams."""
 
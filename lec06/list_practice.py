@@ -22,7 +22,7 @@ class Employee:
         return '{}({})'.format(self.name, self.id)
 
 
-@record(init=False)
+@record(init=False, instrument=True)
 class EmployeeRoll:
     _employees: List[Employee]
     # Invariant: No two employees have the same ID